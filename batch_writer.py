@@ -0,0 +1,105 @@
+import asyncio
+import logging
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """Write-behind buffer turning single-row inserts into ``executemany``.
+
+    :meth:`submit` queues a row and waits until it has been written, so
+    callers keep the usual "returns after the INSERT" semantics.  A batch is
+    flushed when it holds ``max_rows`` rows or ``max_delay`` seconds after
+    its first row, in one transaction on one pooled connection.  If the
+    batch fails, its rows are retried one by one so a single bad row only
+    fails its own caller.  ``after_flush(conn, rows)`` runs inside the same
+    transaction, e.g. to send notifications.
+    """
+
+    def __init__(self, db, query, max_rows=None, max_delay=None, after_flush=None):
+        self.db = db
+        self.query = query
+        self.max_rows = max_rows or Config.DB_BATCH_MAX_ROWS
+        self.max_delay = Config.DB_BATCH_MAX_DELAY if max_delay is None else max_delay
+        self.after_flush = after_flush
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.batches = 0
+        self.rows = 0
+
+    async def submit(self, row):
+        """Queue ``row`` and wait until it is committed."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future))
+        if len(self._pending) >= self.max_rows:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_flush)
+        await future
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._write(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, rows):
+        async with self.db.connection() as conn:
+            if not conn:
+                raise ConnectionError("database is not available")
+            async with conn.transaction():
+                await conn.executemany(self.query, rows)
+                if self.after_flush is not None:
+                    await self.after_flush(conn, rows)
+
+    async def _write(self, batch):
+        try:
+            await self._execute([row for row, _ in batch])
+        except Exception as exc:
+            if len(batch) == 1:
+                self._resolve(batch[0][1], exc)
+                return
+            logger.warning("Batch of %d rows failed (%s), retrying one by one", len(batch), exc)
+            for row, future in batch:
+                try:
+                    await self._execute([row])
+                except Exception as row_exc:
+                    self._resolve(future, row_exc)
+                else:
+                    self._count(1)
+                    self._resolve(future)
+        else:
+            self._count(len(batch))
+            for _, future in batch:
+                self._resolve(future)
+
+    def _count(self, rows):
+        self.batches += 1
+        self.rows += rows
+
+    @staticmethod
+    def _resolve(future, exc=None):
+        if future.done():
+            return
+        if exc is None:
+            future.set_result(None)
+        else:
+            future.set_exception(exc)
+
+    async def flush(self):
+        """Write everything queued so far and wait for in-flight batches."""
+        self._start_flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self):
+        return {"pending": len(self._pending), "batches": self.batches, "rows": self.rows}
@@ -0,0 +1,132 @@
+"""Compare JSON backends on realistic Tracker payloads.
+
+Run from the repository root::
+
+    python benchmarks/bench_json_codec.py
+
+For every available backend prints the time to encode the request body and
+decode the response of a typical call, and the saving per request compared
+to the standard library.
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_codec
+
+USER = {
+    "self": "https://api.tracker.yandex.net/v2/users/1234567890",
+    "id": "1234567890",
+    "display": "Иван Петров",
+    "login": "ivan.petrov",
+}
+
+
+def make_issue(n):
+    return {
+        "self": f"https://api.tracker.yandex.net/v2/issues/CRM-{n}",
+        "id": f"5f1c{n:020d}",
+        "key": f"CRM-{n}",
+        "version": 12,
+        "summary": f"Не загружается отчёт по продажам за квартал #{n}",
+        "description": (
+            "При открытии отчёта появляется ошибка 500, воспроизводится у всех "
+            "менеджеров отдела.\n\n---\n👤 Иван Петров\n📞 +79990000000\n🔗 @ivan"
+        ) * 2,
+        "telegramId": "123456789",
+        "type": {"self": "https://api.tracker.yandex.net/v2/issuetypes/2", "id": "2", "key": "task", "display": "Задача"},
+        "priority": {"self": "https://api.tracker.yandex.net/v2/priorities/3", "id": "3", "key": "normal", "display": "Средний"},
+        "queue": {"self": "https://api.tracker.yandex.net/v2/queues/CRM", "id": "4", "key": "CRM", "display": "CRM"},
+        "status": {"self": "https://api.tracker.yandex.net/v2/statuses/1", "id": "1", "key": "open", "display": "Открыт"},
+        "project": {"self": "https://api.tracker.yandex.net/v2/projects/4", "id": "4", "display": "CRM"},
+        "tags": ["Запрос"],
+        "67c0879c407b93717eac01e6--product": ["CRM"],
+        "createdBy": USER,
+        "updatedBy": USER,
+        "createdAt": "2024-10-01T09:15:42.123+0000",
+        "updatedAt": "2024-10-02T17:03:11.456+0000",
+        "votes": 0,
+        "favorite": False,
+    }
+
+
+def make_comment(n):
+    return {
+        "self": f"https://api.tracker.yandex.net/v2/issues/CRM-1/comments/{n}",
+        "id": n,
+        "longId": f"6a1b{n:020d}",
+        "text": "Проверили на стенде, ошибка в выгрузке. Исправим в следующем релизе.\n> цитата",
+        "createdBy": USER,
+        "updatedBy": USER,
+        "createdAt": "2024-10-02T10:00:00.000+0000",
+        "updatedAt": "2024-10-02T10:00:00.000+0000",
+        "version": 1,
+        "type": "standard",
+        "transport": "internal",
+        "attachments": [
+            {
+                "self": f"https://api.tracker.yandex.net/v2/attachments/{n}",
+                "id": str(n),
+                "fileName": "screenshot.png",
+            }
+        ],
+    }
+
+
+# (name, request body sent, response body received)
+SCENARIOS = [
+    (
+        "create issue",
+        {"summary": "Не загружается отчёт", "description": make_issue(1)["description"],
+         "queue": "CRM", "telegramId": "123456789", "tags": ["Запрос"], "attachmentIds": [1, 2, 3]},
+        make_issue(1),
+    ),
+    ("get issue", None, make_issue(2)),
+    (
+        "search 50 issues",
+        {"filter": {"queue": "CRM", "telegramId": "123456789"}},
+        [make_issue(n) for n in range(50)],
+    ),
+    ("get 20 comments", None, [make_comment(n) for n in range(20)]),
+    (
+        "webhook comment",
+        None,
+        {"event": "commentCreated", "issue": make_issue(3), "comment": make_comment(7)},
+    ),
+]
+
+
+def bench(dumps, loads, request, response_bytes, number):
+    def run():
+        if request is not None:
+            dumps(request)
+        loads(response_bytes)
+
+    return min(timeit.repeat(run, number=number, repeat=5)) / number
+
+
+def main():
+    available = {"json": True, "orjson": json_codec.orjson, "msgspec": json_codec.msgspec}
+    backends = [json_codec.get_codec(name) for name, module in available.items() if module]
+
+    print(f"Default backend: {json_codec.BACKEND}\n")
+    header = f"{'scenario':<18}{'bytes':>8}" + "".join(f"{b:>12}" for b, _, _ in backends)
+    print(header + f"{'saving':>12}")
+    for scenario, request, response in SCENARIOS:
+        response_bytes = json_codec.get_codec("json")[1](response)
+        timings = {
+            backend: bench(dumps, loads, request, response_bytes, 2000)
+            for backend, dumps, loads in backends
+        }
+        best = min(timings.values())
+        row = f"{scenario:<18}{len(response_bytes):>8}"
+        row += "".join(f"{timings[b] * 1e6:>10.1f}µs" for b, _, _ in backends)
+        row += f"{(timings['json'] - best) * 1e6:>10.1f}µs"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
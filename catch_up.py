@@ -0,0 +1,131 @@
+import asyncio
+import logging
+
+from config import Config
+from tracker_client import ATTACHMENT_COMMENT_TEXT, tracker_timestamp
+from webhook_server import (
+    COMMENT_CURSOR_KEY,
+    FAILED_COMMENT_PREFIX,
+    SIGNATURE_RE,
+    process_comment_event,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _is_bot_comment(comment) -> bool:
+    """Comments written by the bot itself; the user has seen them already."""
+    text = comment.get("text") or ""
+    return bool(SIGNATURE_RE.search(text)) or text.strip() == ATTACHMENT_COMMENT_TEXT
+
+
+async def _catch_up_issue(application, tracker, db, issue, since, failed_ids, semaphore):
+    async with semaphore:
+        comments = await tracker.get_issue_comments(issue["key"])
+        missed = sorted(
+            (
+                c for c in comments
+                if (c.get("createdAt") or "") > since or str(c.get("id")) in failed_ids
+            ),
+            key=lambda c: c.get("createdAt") or "",
+        )
+        # (createdAt, status, comment id) of every replayed comment
+        outcomes = []
+        for comment in missed:
+            if _is_bot_comment(comment):
+                continue
+            payload = {
+                "event": "commentCreated",
+                "issue": {
+                    "key": issue["key"],
+                    "summary": issue.get("summary", "Нет темы"),
+                    "telegramId": issue["telegramId"],
+                },
+                "comment": comment,
+            }
+            result = await process_comment_event(
+                application, tracker, payload, db, advance_cursor=False
+            )
+            outcomes.append(
+                (comment.get("createdAt") or "", result.get("status"), str(comment.get("id")))
+            )
+        return outcomes
+
+
+def _safe_cursor(since, outcomes, complete=True):
+    """Return the newest handled ``createdAt`` older than every failure.
+
+    Issues are processed in parallel, so a comment delivered on one issue
+    must not move the cursor past an older comment that failed on another.
+    If some issue could not be processed at all, the cursor stays.
+    """
+    if not complete:
+        return since
+    failed = [created for created, status, _ in outcomes if status == "error"]
+    limit = min(failed) if failed else None
+    handled = [
+        created for created, status, _ in outcomes
+        if status != "error" and (limit is None or created < limit)
+    ]
+    return max([since] + handled)
+
+
+async def catch_up_missed_comments(application, tracker, db, concurrency=None) -> int:
+    """Deliver comments created while the bot was not receiving webhooks.
+
+    Looks up queue issues with a ``telegramId`` updated since the creation
+    time of the last delivered comment and replays newer comments, as well
+    as comments whose delivery failed earlier, through
+    :func:`webhook_server.process_comment_event`, which also deduplicates
+    them against webhooks arriving meanwhile.  At most ``concurrency``
+    issues are processed at once.  Returns the number of delivered comments.
+    """
+    since = await db.get_sync_state(COMMENT_CURSOR_KEY)
+    if not since:
+        # First start: nothing to catch up, remember where we begin.
+        await db.advance_sync_state(COMMENT_CURSOR_KEY, tracker_timestamp())
+        return 0
+
+    failed = await db.get_sync_states(FAILED_COMMENT_PREFIX)
+    failed_ids = {key[len(FAILED_COMMENT_PREFIX):] for key in failed}
+
+    # An issue changed during the search may be returned twice
+    found = {}
+    async for batch in tracker.iter_issues_updated_since(
+        min([since, *failed.values()]), per_page=Config.ISSUE_SYNC_PAGE_SIZE
+    ):
+        found.update((issue["key"], issue) for issue in batch if issue.get("telegramId"))
+    issues = list(found.values())
+
+    semaphore = asyncio.Semaphore(concurrency or Config.CATCH_UP_CONCURRENCY)
+    results = await asyncio.gather(
+        *(
+            _catch_up_issue(application, tracker, db, issue, since, failed_ids, semaphore)
+            for issue in issues
+        ),
+        return_exceptions=True,
+    )
+    outcomes = []
+    complete = True
+    for issue, result in zip(issues, results):
+        if isinstance(result, Exception):
+            logger.error("Catch-up of %s failed: %s", issue["key"], result)
+            complete = False
+        else:
+            outcomes.extend(result)
+    cursor = _safe_cursor(since, outcomes, complete)
+    if cursor > since:
+        await db.advance_sync_state(COMMENT_CURSOR_KEY, cursor)
+    if complete:
+        # Comments that failed again were recorded anew by process_comment_event
+        still_failed = {cid for _, status, cid in outcomes if status == "error"}
+        await db.delete_sync_states(
+            f"{FAILED_COMMENT_PREFIX}{cid}" for cid in failed_ids - still_failed
+        )
+    delivered = sum(1 for _, status, _ in outcomes if status == "ok")
+    errors = sum(1 for _, status, _ in outcomes if status == "error")
+    logger.info(
+        "Catch-up: %d missed comments delivered from %d issues, %d failed",
+        delivered, len(issues), errors,
+    )
+    return delivered
@@ -1,8 +1,8 @@
-from dotenv import load_dotenv
-import os
-
-load_dotenv(override=True)
-
+from dotenv import load_dotenv
+import os
+
+load_dotenv(override=True)
+
 class Config:
     # Telegram
     BOT_TOKEN = os.getenv('BOT_TOKEN')
@@ -11,22 +11,79 @@ class Config:
     TELEGRAM_READ_TIMEOUT = float(os.getenv('TELEGRAM_READ_TIMEOUT', 60))
     TELEGRAM_CONNECT_TIMEOUT = float(os.getenv('TELEGRAM_CONNECT_TIMEOUT', 30))
     TELEGRAM_HTTP2 = os.getenv('TELEGRAM_HTTP2', '1') not in ('0', 'false', 'False')
-    
-    # Yandex Tracker
-    TRACKER_TOKEN = os.getenv('TRACKER_TOKEN')
+    # Self-hosted telegram-bot-api server, e.g. http://localhost:8081/bot and
+    # http://localhost:8081/file/bot; empty values use api.telegram.org.
+    # The file URL defaults to the same server: .../bot -> .../file/bot
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '').rstrip('/')
+    TELEGRAM_API_FILE_URL = os.getenv('TELEGRAM_API_FILE_URL') or (
+        TELEGRAM_API_URL[:-len('/bot')] + '/file/bot' if TELEGRAM_API_URL.endswith('/bot') else ''
+    )
+    # The server runs with --local and shares its file directory with the bot,
+    # so downloaded files are read from disk (also enabled by ``main.py --local``)
+    TELEGRAM_LOCAL_MODE = os.getenv('TELEGRAM_LOCAL_MODE', '0') not in ('0', 'false', 'False')
+    
+    # Yandex Tracker
+    TRACKER_TOKEN = os.getenv('TRACKER_TOKEN')
     TRACKER_ORG_ID = os.getenv('TRACKER_ORG_ID')
     TRACKER_QUEUE = os.getenv('TRACKER_QUEUE')  # Добавлено
     TRACKER_POOL_LIMIT = int(os.getenv('TRACKER_POOL_LIMIT', 20))
+    # Read endpoints whose identical concurrent requests share one HTTP call
+    TRACKER_COALESCE_ENDPOINTS = [
+        name.strip()
+        for name in os.getenv(
+            'TRACKER_COALESCE_ENDPOINTS', 'issue,comment,comments,search,file'
+        ).split(',')
+        if name.strip()
+    ]
+    # Client-side rate limits (requests per second) for each kind of traffic.
+    # They are lowered automatically on 429 responses and recover afterwards.
+    TRACKER_READ_RPS = float(os.getenv('TRACKER_READ_RPS', 20))
+    TRACKER_WRITE_RPS = float(os.getenv('TRACKER_WRITE_RPS', 5))
+    TRACKER_UPLOAD_RPS = float(os.getenv('TRACKER_UPLOAD_RPS', 5))
+    # Number of retries for requests rejected with 429 Too Many Requests
+    TRACKER_MAX_RETRIES = int(os.getenv('TRACKER_MAX_RETRIES', 3))
+    # Number of per-request timing records kept in memory
+    TRACKER_TRACE_BUFFER = int(os.getenv('TRACKER_TRACE_BUFFER', 1024))
+    # Requests slower than this many seconds are logged (0 disables the log)
+    TRACKER_SLOW_REQUEST = float(os.getenv('TRACKER_SLOW_REQUEST', 2))
 
     API_TOKEN = os.getenv('API_TOKEN')  # Добавлено
-
-    # Default values for Tracker issue creation
-    PROJECT = {
-        "self": "https://api.tracker.yandex.net/v2/projects/4",
-        "id": "4",
-        "display": "CRM",
-    }
-    # Default tags for created issues
+
+    # Interval (seconds) of the full reconciliation of the local issue mirror
+    ISSUE_RECONCILE_INTERVAL = float(os.getenv('ISSUE_RECONCILE_INTERVAL', 24 * 3600))
+    # Incremental sync of issues updated in TRACKER_QUEUE since the last pass
+    ISSUE_SYNC_INTERVAL = float(os.getenv('ISSUE_SYNC_INTERVAL', 60))
+    ISSUE_SYNC_PAGE_SIZE = int(os.getenv('ISSUE_SYNC_PAGE_SIZE', 100))
+    # A user's issue list is prefetched on activity once it is older than this
+    ISSUE_PREFETCH_STALE = float(os.getenv('ISSUE_PREFETCH_STALE', 300))
+    # Maximum number of background prefetches per minute for all users
+    ISSUE_PREFETCH_BUDGET = int(os.getenv('ISSUE_PREFETCH_BUDGET', 30))
+    # Issues shown per page of "My issues"
+    MY_ISSUES_PAGE_SIZE = int(os.getenv('MY_ISSUES_PAGE_SIZE', 8))
+    # Issues processed in parallel when replaying missed comments on startup
+    CATCH_UP_CONCURRENCY = int(os.getenv('CATCH_UP_CONCURRENCY', 5))
+    # Background issue creation: due jobs are polled every ISSUE_JOB_POLL_INTERVAL
+    # seconds, up to ISSUE_JOB_CONCURRENCY at a time, and leased for ISSUE_JOB_LEASE
+    # seconds; the lease is renewed every ISSUE_JOB_LEASE / 2 seconds while a job runs
+    ISSUE_JOB_POLL_INTERVAL = float(os.getenv('ISSUE_JOB_POLL_INTERVAL', 5))
+    ISSUE_JOB_CONCURRENCY = int(os.getenv('ISSUE_JOB_CONCURRENCY', 4))
+    ISSUE_JOB_LEASE = float(os.getenv('ISSUE_JOB_LEASE', 120))
+    # On shutdown running jobs get ISSUE_JOB_DRAIN_TIMEOUT seconds to finish
+    ISSUE_JOB_DRAIN_TIMEOUT = float(os.getenv('ISSUE_JOB_DRAIN_TIMEOUT', 30))
+    # A failed job is retried after ISSUE_JOB_RETRY_DELAY seconds, doubling each time
+    ISSUE_JOB_MAX_ATTEMPTS = int(os.getenv('ISSUE_JOB_MAX_ATTEMPTS', 5))
+    ISSUE_JOB_RETRY_DELAY = float(os.getenv('ISSUE_JOB_RETRY_DELAY', 5))
+
+    # JSON backend: auto (orjson → msgspec → stdlib), orjson, msgspec or json
+    JSON_CODEC = os.getenv('JSON_CODEC', 'auto')
+
+    # Default values for Tracker issue creation
+    PROJECT = {
+        "self": "https://api.tracker.yandex.net/v2/projects/4",
+        "id": "4",
+        "display": "CRM",
+    }
+    # Default tags for created issues
     DEFAULT_TAGS = ["Запрос"]
 
     # Custom field for product selection
@@ -35,20 +92,69 @@ class Config:
 
     # Maximum allowed file size for uploads (50 MB)
     MAX_FILE_SIZE = 50 * 1024 * 1024
-
-    
-    # PostgreSQL
-    DB_USER = os.getenv('DB_USER')
-    DB_PASSWORD = os.getenv('DB_PASSWORD')
-    DB_NAME = os.getenv('DB_NAME')
-    DB_HOST = os.getenv('DB_HOST')
-    DB_PORT = os.getenv('DB_PORT')
-    
-    # Для совместимости со старым кодом
-    DB_CONFIG = {
-        'user': DB_USER,
-        'password': DB_PASSWORD,
-        'database': DB_NAME,
-        'host': DB_HOST,
-        'port': DB_PORT
-    }
+    # An album is complete once no new item arrived for ALBUM_QUIET_PERIOD
+    # seconds, but never waits longer than ALBUM_MAX_WAIT after its first item
+    ALBUM_QUIET_PERIOD = float(os.getenv('ALBUM_QUIET_PERIOD', 0.7))
+    ALBUM_MAX_WAIT = float(os.getenv('ALBUM_MAX_WAIT', 5))
+    # A failed album file is retried ALBUM_UPLOAD_RETRIES times, waiting
+    # ALBUM_RETRY_DELAY seconds before the first retry and doubling after that
+    ALBUM_UPLOAD_RETRIES = int(os.getenv('ALBUM_UPLOAD_RETRIES', 2))
+    ALBUM_RETRY_DELAY = float(os.getenv('ALBUM_RETRY_DELAY', 1))
+    # Attachments up to this many bytes are downloaded into memory instead of
+    # a temporary file
+    UPLOAD_MEMORY_THRESHOLD = int(os.getenv('UPLOAD_MEMORY_THRESHOLD', 2 * 1024 * 1024))
+    # Files up to UPLOAD_CACHE_MAX_FILE_SIZE bytes are kept in memory for
+    # UPLOAD_CACHE_TTL seconds so a re-sent file is not downloaded again
+    UPLOAD_CACHE_SIZE = int(os.getenv('UPLOAD_CACHE_SIZE', 64))
+    UPLOAD_CACHE_TTL = float(os.getenv('UPLOAD_CACHE_TTL', 600))
+    UPLOAD_CACHE_MAX_FILE_SIZE = int(os.getenv('UPLOAD_CACHE_MAX_FILE_SIZE', 1024 * 1024))
+
+    
+    # PostgreSQL
+    DB_USER = os.getenv('DB_USER')
+    DB_PASSWORD = os.getenv('DB_PASSWORD')
+    DB_NAME = os.getenv('DB_NAME')
+    DB_HOST = os.getenv('DB_HOST')
+    DB_PORT = os.getenv('DB_PORT')
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+    # Seconds to wait for a free pool connection before giving up
+    DB_ACQUIRE_TIMEOUT = float(os.getenv('DB_ACQUIRE_TIMEOUT', 5))
+    # Prepared statements cached per connection (0 disables the cache)
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 100))
+    # Idle connections are closed after this many seconds (0 keeps them)
+    DB_MAX_INACTIVE_LIFETIME = float(os.getenv('DB_MAX_INACTIVE_LIFETIME', 300))
+    # Optional streaming replicas (comma-separated DSNs) serving user and issue reads
+    DB_REPLICA_DSNS = [
+        dsn.strip() for dsn in os.getenv('DB_REPLICA_DSNS', '').split(',') if dsn.strip()
+    ]
+    # Reads of a user go to the primary for this many seconds after a write
+    DB_REPLICA_STICKINESS = float(os.getenv('DB_REPLICA_STICKINESS', 5))
+    # A failed replica is skipped for this many seconds
+    DB_REPLICA_RETRY = float(os.getenv('DB_REPLICA_RETRY', 30))
+    # Database queries slower than this many seconds are logged (0 disables)
+    DB_SLOW_QUERY = float(os.getenv('DB_SLOW_QUERY', 0.2))
+    # In-process cache of Database.get_user results
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 300))
+    # Unregistered users are remembered for a shorter time
+    USER_CACHE_NEGATIVE_TTL = float(os.getenv('USER_CACHE_NEGATIVE_TTL', 30))
+    # Writes are announced with NOTIFY so other instances drop stale cache entries
+    DB_CACHE_NOTIFY = os.getenv('DB_CACHE_NOTIFY', '1') not in ('0', 'false', 'False')
+    DB_NOTIFY_CHANNEL = os.getenv('DB_NOTIFY_CHANNEL', 'bot_cache_invalidation')
+    # Buffered inserts are flushed after this many rows or seconds
+    DB_BATCH_MAX_ROWS = int(os.getenv('DB_BATCH_MAX_ROWS', 100))
+    DB_BATCH_MAX_DELAY = float(os.getenv('DB_BATCH_MAX_DELAY', 0.005))
+    # Conversation states and user/chat data are handed to the persistence
+    # every PERSISTENCE_INTERVAL seconds and written after PERSISTENCE_FLUSH_DELAY
+    PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', 10))
+    PERSISTENCE_FLUSH_DELAY = float(os.getenv('PERSISTENCE_FLUSH_DELAY', 0.5))
+    
+    # Для совместимости со старым кодом
+    DB_CONFIG = {
+        'user': DB_USER,
+        'password': DB_PASSWORD,
+        'database': DB_NAME,
+        'host': DB_HOST,
+        'port': DB_PORT
+    }
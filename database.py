@@ -1,101 +1,734 @@
+import asyncio
 import asyncpg
+import itertools
 import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from batch_writer import BatchWriter
+from cache import MISSING, TTLCache
 from config import Config
+from db_trace import QueryTimings
+from migrations import migrate
+import json_codec
+
+# ───────────────────────────── SQL‑запросы ─────────────────────────────
+# Все запросы вынесены в именованные константы: asyncpg кэширует подготовленные
+# выражения по тексту запроса, поэтому каждый из них разбирается и планируется
+# один раз на соединение.
+
+GET_USER = "SELECT first_name, last_name, phone_number FROM users WHERE user_id = $1"
+
+REGISTER_USER = """
+INSERT INTO users (user_id, first_name, last_name, phone_number)
+VALUES ($1, $2, $3, $4)
+ON CONFLICT (user_id) DO UPDATE
+SET first_name = EXCLUDED.first_name,
+    last_name = EXCLUDED.last_name,
+    phone_number = EXCLUDED.phone_number
+"""
+
+GET_USER_IDS = "SELECT user_id FROM users"
+
+# Задача могла попасть в зеркало раньше (синхронизация, вебхук).
+# updated_at — время записи в зеркало, tracker_updated_at — updatedAt
+# задачи в Tracker; он не откатывается назад (GREATEST пропускает NULL)
+INSERT_ISSUE = """
+INSERT INTO issues (user_id, tracker_id, summary, status, closed, tracker_updated_at)
+VALUES ($1, $2, $3, $4, $5, COALESCE($6::timestamptz, now()))
+ON CONFLICT (tracker_id) DO UPDATE
+SET user_id = EXCLUDED.user_id,
+    summary = COALESCE(EXCLUDED.summary, issues.summary),
+    status = COALESCE(EXCLUDED.status, issues.status),
+    tracker_updated_at = GREATEST(issues.tracker_updated_at, $6::timestamptz),
+    updated_at = now()
+"""
+
+GET_USER_ISSUES = "SELECT tracker_id FROM issues WHERE user_id = $1"
+
+# LIMIT NULL возвращает все строки
+# Страницы списка выбираются по ключу (tracker_updated_at, id)
+# строки-курсора: без OFFSET, который перебирает все пропущенные строки.
+# Время Tracker, а не updated_at: запись в зеркало без изменений в Tracker
+# (синхронизация, предзагрузка) не переставляет задачи между страницами
+GET_ACTIVE_USER_ISSUES = """
+SELECT id, tracker_id, summary, status FROM issues
+WHERE user_id = $1 AND NOT closed
+  AND ($3::int IS NULL OR (tracker_updated_at, id) <
+       (SELECT tracker_updated_at, id FROM issues WHERE id = $3 AND user_id = $1))
+ORDER BY tracker_updated_at DESC, id DESC
+LIMIT $2
+"""
+GET_ACTIVE_USER_ISSUES_BEFORE = """
+SELECT id, tracker_id, summary, status FROM issues
+WHERE user_id = $1 AND NOT closed
+  AND (tracker_updated_at, id) >
+      (SELECT tracker_updated_at, id FROM issues WHERE id = $3 AND user_id = $1)
+ORDER BY tracker_updated_at, id
+LIMIT $2
+"""
+
+UPDATE_ISSUE = """
+UPDATE issues
+SET summary = COALESCE($2, summary),
+    status = COALESCE($3, status),
+    closed = COALESCE($4, closed),
+    tracker_updated_at = GREATEST(tracker_updated_at, $5::timestamptz),
+    updated_at = now()
+WHERE tracker_id = $1
+"""
+
+REOPEN_ISSUE = """
+UPDATE issues
+SET summary = $2, status = $3, closed = FALSE,
+    tracker_updated_at = COALESCE($4::timestamptz, tracker_updated_at),
+    updated_at = now()
+WHERE tracker_id = $1
+"""
+
+# Задачи, изменённые в Tracker после $3 (начала запроса к Tracker), не
+# трогаем: их могли создать или изменить, пока шёл запрос.  Сравнивается
+# время Tracker, а не время записи: любая запись в зеркало (даже без
+# изменений) сдвигает updated_at
+CLOSE_MISSING_ISSUES = """
+UPDATE issues SET closed = TRUE, updated_at = now()
+WHERE user_id = $1 AND NOT closed AND tracker_id <> ALL($2::text[])
+  AND ($3::timestamptz IS NULL OR tracker_updated_at < $3)
+"""
+
+APPLY_ISSUE_CHANGES = """
+WITH data AS (
+    SELECT * FROM unnest(
+        $1::text[], $2::bigint[], $3::text[], $4::text[], $5::bool[],
+        $6::timestamptz[]
+    ) AS d(tracker_id, user_id, summary, status, closed, tracker_updated_at)
+), updated AS (
+    UPDATE issues AS i
+    SET summary = d.summary, status = d.status, closed = d.closed,
+        tracker_updated_at = COALESCE(d.tracker_updated_at, i.tracker_updated_at),
+        updated_at = now()
+    FROM data AS d
+    WHERE i.tracker_id = d.tracker_id
+    RETURNING i.tracker_id
+)
+INSERT INTO issues (user_id, tracker_id, summary, status, closed, tracker_updated_at)
+SELECT d.user_id, d.tracker_id, d.summary, d.status, d.closed,
+       COALESCE(d.tracker_updated_at, now())
+FROM data AS d
+WHERE d.user_id IS NOT NULL
+  AND d.tracker_id NOT IN (SELECT tracker_id FROM updated)
+ON CONFLICT (tracker_id) DO NOTHING
+"""
+
+GET_SYNC_STATE = "SELECT value FROM sync_state WHERE key = $1"
+
+SET_SYNC_STATE = """
+INSERT INTO sync_state (key, value) VALUES ($1, $2)
+ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+"""
+
+ADVANCE_SYNC_STATE = """
+INSERT INTO sync_state (key, value) VALUES ($1, $2)
+ON CONFLICT (key) DO UPDATE
+SET value = GREATEST(sync_state.value, EXCLUDED.value)
+"""
+
+GET_SYNC_STATES = "SELECT key, value FROM sync_state WHERE starts_with(key, $1)"
+
+DELETE_SYNC_STATES = "DELETE FROM sync_state WHERE key = ANY($1::text[])"
+
+# Ошибки, после которых чтение повторяется на основном сервере
+REPLICA_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+)
+
+# Внутри транзакции уведомление уходит только после COMMIT
+NOTIFY = "SELECT pg_notify($1, $2)"
+
 
 class Database:
     def __init__(self):
         self._pool = None
+        # Время запросов по именам SQL-констант и ожидание соединения из пула
+        self.timings = QueryTimings()
+        self.timings.name_queries(
+            {name: value for name, value in globals().items() if name.isupper() and isinstance(value, str)}
+        )
+        # user_id -> данные пользователя или None для незарегистрированных
+        self.user_cache = TTLCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL)
+        # Отдельное соединение для LISTEN и обработчики инвалидаций
+        self.instance_id = uuid.uuid4().hex
+        self._listener = None
+        self._listener_task = None
+        self._closing = False
+        self._invalidation_handlers = []
+        # Пулы реплик для чтения (None — реплика ещё не подключена)
+        # и пользователи, читающие с основного сервера
+        self._replica_dsns: list[str] = []
+        self._replicas = []
+        self._replica_rr = itertools.count()
+        self._replica_down_until: dict[int, float] = {}
+        self._replica_tasks: dict[int, asyncio.Task] = {}
+        self._recent_writers = TTLCache(
+            Config.USER_CACHE_SIZE or 10000, Config.DB_REPLICA_STICKINESS
+        )
+        # Новые задачи пишутся пачками: одна транзакция на много INSERT
+        self._issue_writer = BatchWriter(self, INSERT_ISSUE, after_flush=self._notify_new_issues)
+
+    @staticmethod
+    def _connect_kwargs():
+        return dict(
+            user=Config.DB_USER,
+            password=Config.DB_PASSWORD,
+            database=Config.DB_NAME,
+            host=Config.DB_HOST,
+            port=Config.DB_PORT,
+        )
+
+    async def _create_pool(self, **connect_kwargs):
+        return await asyncpg.create_pool(
+            **connect_kwargs,
+            min_size=Config.DB_POOL_MIN_SIZE,
+            max_size=Config.DB_POOL_MAX_SIZE,
+            statement_cache_size=Config.DB_STATEMENT_CACHE_SIZE,
+            max_inactive_connection_lifetime=Config.DB_MAX_INACTIVE_LIFETIME,
+            init=self._init_connection,
+            timeout=10  # Таймаут на подключение
+        )
 
     async def connect(self):
         """Подключение к базе данных с проверкой"""
         try:
             if not self._pool:
-                self._pool = await asyncpg.create_pool(
-                    user=Config.DB_USER,
-                    password=Config.DB_PASSWORD,
-                    database=Config.DB_NAME,
-                    host=Config.DB_HOST,
-                    port=Config.DB_PORT,
-                    min_size=1,  # Минимальное количество соединений
-                    max_size=10,  # Максимальное количество соединений
-                    timeout=10  # Таймаут на подключение
-                )
+                self._pool = await self._create_pool(**self._connect_kwargs())
                 logging.info("✅ Подключение к БД установлено")
+                await self._ensure_schema()
+                await self.start_listener()
+                await self._connect_replicas()
         except Exception as e:
             logging.error(f"❌ Ошибка подключения к БД: {e}")
-            self._pool = None
+            await self._discard_connections()
+
+    async def _discard_connections(self):
+        """Закрывает то, что успел открыть неудавшийся ``connect()``"""
+        pool, self._pool = self._pool, None
+        listener, self._listener = self._listener, None
+        try:
+            if listener is not None:
+                # Закрытие не должно запускать переподключение слушателя
+                listener.remove_termination_listener(self._on_listener_lost)
+                await listener.close()
+            if pool is not None:
+                await pool.close()
+        except Exception as exc:
+            logging.error("❌ Не удалось закрыть подключение к БД: %s", exc)
+
+    async def _connect_replicas(self):
+        """Создаёт пулы чтения для ``DB_REPLICA_DSNS``.
+
+        Недоступная реплика остаётся в списке без пула и подключается
+        повторно в фоне, не раньше чем через ``DB_REPLICA_RETRY`` секунд;
+        до тех пор её чтения идут на основной сервер.
+        """
+        self._replica_dsns = list(Config.DB_REPLICA_DSNS)
+        self._replicas = [None] * len(self._replica_dsns)
+        for index in range(len(self._replicas)):
+            await self._connect_replica(index)
+        connected = sum(1 for replica in self._replicas if replica is not None)
+        if connected:
+            logging.info("✅ Подключено реплик БД: %d из %d", connected, len(self._replicas))
+
+    async def _connect_replica(self, index: int):
+        """Создаёт пул реплики ``index``; возвращает его или ``None``"""
+        # Пока идёт подключение, другие чтения эту реплику пропускают
+        self._replica_down_until[index] = time.monotonic() + Config.DB_REPLICA_RETRY
+        try:
+            pool = await self._create_pool(dsn=self._replica_dsns[index])
+        except Exception as exc:
+            logging.error("❌ Реплика БД %d недоступна: %s", index, exc)
+            return None
+        if self._closing:
+            await pool.close()
+            return None
+        self._replicas[index] = pool
+        self._replica_down_until.pop(index, None)
+        return pool
+
+    def _reconnect_replica(self, index: int):
+        """Запускает фоновое подключение реплики ``index``, если оно ещё не идёт"""
+        task = self._replica_tasks.get(index)
+        if self._closing or (task and not task.done()):
+            return
+        self._replica_tasks[index] = asyncio.get_running_loop().create_task(
+            self._connect_replica(index)
+        )
+
+    async def _init_connection(self, conn):
+        conn.add_query_logger(self.timings.record_query)
+
+    async def _ensure_schema(self):
+        """Применяет недостающие миграции схемы"""
+        async with self.connection() as conn:
+            await migrate(conn)
 
     async def ensure_connection(self):
-        """Гарантирует, что подключение активно"""
+        """Гарантирует, что пул подключений создан; возвращает пул или ``None``"""
         if not self._pool:
             logging.warning("⚠️ Подключение к БД отсутствует. Повторное подключение...")
             await self.connect()
         if not self._pool:
             logging.error("❌ Не удалось восстановить подключение к БД")
             return None
-        return await self._pool.acquire()
+        return self._pool
+
+    @asynccontextmanager
+    async def connection(self, timeout: float | None = None):
+        """Выдаёт соединение из пула и возвращает его по выходе из блока.
+
+        Если свободного соединения нет дольше ``timeout`` секунд
+        (по умолчанию ``DB_ACQUIRE_TIMEOUT``), выбрасывается
+        ``asyncio.TimeoutError``.  Без подключения к БД выдаёт ``None``.
+        """
+        pool = await self.ensure_connection()
+        if pool is None:
+            yield None
+            return
+        async with self._acquire(pool, timeout) as conn:
+            yield conn
+
+    @asynccontextmanager
+    async def _acquire(self, pool, timeout: float | None = None):
+        timeout = Config.DB_ACQUIRE_TIMEOUT if timeout is None else timeout
+        started = time.perf_counter()
+        try:
+            conn = await pool.acquire(timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timings.record_pool_wait(time.perf_counter() - started, error=True)
+            logging.error("❌ Нет свободного соединения с БД за %.1f с", timeout)
+            raise
+        self.timings.record_pool_wait(time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            await pool.release(conn)
+
+    # ───────────────────────────── реплики ─────────────────────────────
+
+    def _wrote(self, *user_ids):
+        """Запоминает пользователей, чьи данные только что изменены.
+
+        Их чтения ``DB_REPLICA_STICKINESS`` секунд идут на основной сервер,
+        чтобы не увидеть устаревшие данные из-за задержки репликации.
+        """
+        if not self._replicas:
+            return
+        for user_id in user_ids:
+            if user_id is not None:
+                self._recent_writers.set(user_id, True)
+
+    def _pick_replica(self, user_id=None):
+        """Возвращает номер следующей доступной реплики или ``None``"""
+        if not self._replicas:
+            return None
+        if user_id is not None and self._recent_writers.get(user_id, False):
+            return None
+        now = time.monotonic()
+        for _ in range(len(self._replicas)):
+            index = next(self._replica_rr) % len(self._replicas)
+            if self._replica_down_until.get(index, 0) <= now:
+                return index
+        return None
+
+    async def _read(self, method: str, query: str, *args, user_id=None, default=None):
+        """Выполняет чтение на реплике, при её недоступности — на основном сервере"""
+        index = self._pick_replica(user_id)
+        replica = None
+        if index is not None:
+            replica = self._replicas[index]
+            if replica is None:
+                # Подключение может занять до таймаута пула: не ждём его
+                self._reconnect_replica(index)
+        if replica is not None:
+            try:
+                async with self._acquire(replica) as conn:
+                    return await getattr(conn, method)(query, *args)
+            except REPLICA_ERRORS as exc:
+                self._replica_down_until[index] = time.monotonic() + Config.DB_REPLICA_RETRY
+                logging.warning("⚠️ Реплика БД %d недоступна, читаем с основного сервера: %s", index, exc)
+        async with self.connection() as conn:
+            if not conn:
+                return default
+            return await getattr(conn, method)(query, *args)
+
+    def pool_stats(self):
+        """Размер пула и число свободных соединений"""
+        if not self._pool:
+            return {"size": 0, "idle": 0, "min_size": 0, "max_size": 0}
+        return {
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+        }
+
+    # ─────────────────── инвалидация кэшей между инстансами ───────────────────
+
+    def add_invalidation_handler(self, handler):
+        """Регистрирует ``handler(kind, payload)`` для уведомлений других инстансов.
+
+        ``kind`` — ``"user"`` (``payload["ids"]`` — user_id) или ``"issue"``
+        (``payload["keys"]`` — ключи задач, ``payload["user_id"]`` — владелец,
+        если известен, ``payload["synced"]`` — список задач владельца целиком
+        сверен с Tracker) или ``"all"`` после потери подписки.  Кэш
+        пользователей обновляется самим ``Database``.
+        """
+        self._invalidation_handlers.append(handler)
+
+    async def _notify(self, conn, kind: str, **data):
+        """Сообщает другим инстансам об изменении данных"""
+        if not Config.DB_CACHE_NOTIFY:
+            return
+        payload = json_codec.dumps({"origin": self.instance_id, "kind": kind, **data})
+        await conn.execute(NOTIFY, Config.DB_NOTIFY_CHANNEL, payload.decode())
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            message = json_codec.loads(payload)
+        except Exception as exc:
+            logging.warning("Некорректное уведомление %r: %s", payload, exc)
+            return
+        if message.get("origin") == self.instance_id:
+            return  # собственные записи уже учтены локально
+        kind = message.get("kind")
+        if kind == "user":
+            for user_id in message.get("ids") or []:
+                self.invalidate_user(user_id)
+        for handler in self._invalidation_handlers:
+            try:
+                handler(kind, message)
+            except Exception as exc:
+                logging.error("Ошибка обработчика инвалидации: %s", exc)
+
+    async def start_listener(self):
+        """Открывает выделенное соединение и подписывается на ``DB_NOTIFY_CHANNEL``"""
+        if not Config.DB_CACHE_NOTIFY or self._listener is not None:
+            return
+        try:
+            conn = await asyncpg.connect(**self._connect_kwargs())
+            await conn.add_listener(Config.DB_NOTIFY_CHANNEL, self._on_notification)
+            conn.add_termination_listener(self._on_listener_lost)
+        except Exception as exc:
+            logging.error("❌ Не удалось подписаться на уведомления БД: %s", exc)
+            self._schedule_listener_restart()
+            return
+        self._listener = conn
+        logging.info("✅ Подписка на канал %s", Config.DB_NOTIFY_CHANNEL)
+
+    def _on_listener_lost(self, connection):
+        self._listener = None
+        if self._closing:
+            return
+        logging.warning("⚠️ Соединение LISTEN потеряно, кэши сброшены")
+        # Пока подписки нет, уведомления теряются — не доверяем кэшу
+        self._invalidate_all()
+        self._schedule_listener_restart()
+
+    def _invalidate_all(self):
+        self.invalidate_user()
+        for handler in self._invalidation_handlers:
+            try:
+                handler("all", {})
+            except Exception as exc:
+                logging.error("Ошибка обработчика инвалидации: %s", exc)
+
+    def _schedule_listener_restart(self):
+        if self._closing or (self._listener_task and not self._listener_task.done()):
+            return
+        self._listener_task = asyncio.get_running_loop().create_task(self._restart_listener())
+
+    async def _restart_listener(self):
+        delay = 1
+        while not self._closing and self._listener is None:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+            try:
+                conn = await asyncpg.connect(**self._connect_kwargs())
+                await conn.add_listener(Config.DB_NOTIFY_CHANNEL, self._on_notification)
+                conn.add_termination_listener(self._on_listener_lost)
+            except Exception as exc:
+                logging.warning("Повторная подписка на уведомления не удалась: %s", exc)
+                continue
+            self._listener = conn
+            # За время разрыва могли пропустить уведомления
+            self._invalidate_all()
+            logging.info("✅ Подписка на канал %s восстановлена", Config.DB_NOTIFY_CHANNEL)
+
+    def query_stats(self):
+        """Гистограммы времени запросов, ожидание пула и его заполненность"""
+        return {**self.timings.summary(), "pool": self.pool_stats()}
 
     async def close(self):
-        """Закрывает соединение с БД"""
+        """Дописывает буферизованные строки и закрывает соединение с БД"""
+        if self._pool:
+            await self._issue_writer.flush()
+        self._closing = True
+        if self._listener_task:
+            self._listener_task.cancel()
+            self._listener_task = None
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+        for task in self._replica_tasks.values():
+            task.cancel()
+        self._replica_tasks.clear()
+        for replica in self._replicas:
+            if replica is not None:
+                await replica.close()
+        self._replicas = []
         if self._pool:
             await self._pool.close()
             logging.info("🔒 Подключение к БД закрыто")
             self._pool = None
 
     async def get_user(self, user_id: int):
-        """Получает информацию о пользователе по user_id."""
-        conn = await self.ensure_connection()
-        if not conn:
+        """Получает информацию о пользователе по user_id.
+
+        Результат, в том числе отсутствие пользователя, кэшируется в
+        ``user_cache``.
+        """
+        cached = self.user_cache.get(user_id)
+        if cached is not MISSING:
+            return dict(cached) if cached else None
+        user_data = await self._read("fetchrow", GET_USER, user_id, user_id=user_id, default=MISSING)
+        if user_data is MISSING:
             return None
-        try:
-            query = "SELECT first_name, last_name, phone_number FROM users WHERE user_id = $1"
-            user_data = await conn.fetchrow(query, user_id)
-            return dict(user_data) if user_data else None
-        finally:
-            await self._pool.release(conn)  # ✅ Правильное освобождение соединения
+        if user_data:
+            user = dict(user_data)
+            self.user_cache.set(user_id, user)
+            return dict(user)
+        self.user_cache.set(user_id, None, ttl=Config.USER_CACHE_NEGATIVE_TTL)
+        return None
+
+    def invalidate_user(self, user_id: int | None = None):
+        """Сбрасывает кэш пользователя, а без аргумента — весь кэш"""
+        if user_id is None:
+            self.user_cache.clear()
+        else:
+            self.user_cache.invalidate(user_id)
 
     async def register_user(self, user_id: int, first_name: str, last_name: str, phone_number: str):
         """Регистрирует пользователя в базе данных"""
-        conn = await self.ensure_connection()
-        if not conn:
-            return
-        try:
-            query = """
-            INSERT INTO users (user_id, first_name, last_name, phone_number)
-            VALUES ($1, $2, $3, $4)
-            ON CONFLICT (user_id) DO UPDATE
-            SET first_name = EXCLUDED.first_name,
-                last_name = EXCLUDED.last_name,
-                phone_number = EXCLUDED.phone_number
-            """
-            await conn.execute(query, user_id, first_name, last_name, phone_number)
-            logging.info(f"✅ Пользователь {user_id} зарегистрирован")
-        finally:
-            await self._pool.release(conn)
+        async with self.connection() as conn:
+            if not conn:
+                return
+            await conn.execute(REGISTER_USER, user_id, first_name, last_name, phone_number)
+            await self._notify(conn, "user", ids=[user_id])
+        self._wrote(user_id)
+        self.user_cache.set(
+            user_id,
+            {"first_name": first_name, "last_name": last_name, "phone_number": phone_number},
+        )
+        logging.info(f"✅ Пользователь {user_id} зарегистрирован")
+
+    async def create_issue(
+        self,
+        user_id: int,
+        tracker_id: str,
+        summary: str | None = None,
+        status: str | None = None,
+        closed: bool = False,
+        updated_at: datetime | None = None,
+    ):
+        """Сохраняет созданную задачу в базе данных.
 
-    async def create_issue(self, user_id: int, tracker_id: str):
-        """Сохраняет созданную задачу в базе данных"""
-        conn = await self.ensure_connection()
-        if not conn:
+        ``updated_at`` — время изменения задачи в Tracker.  Запись идёт
+        через буфер ``BatchWriter``; метод возвращается после фиксации
+        транзакции с этой строкой.
+        """
+        if not await self.ensure_connection():
             return
-        try:
-            query = """
-            INSERT INTO issues (user_id, tracker_id)
-            VALUES ($1, $2)
-            """
-            await conn.execute(query, user_id, tracker_id)
-            logging.info(f"✅ Задача {tracker_id} сохранена для пользователя {user_id}")
-        finally:
-            await self._pool.release(conn)
+        await self._issue_writer.submit(
+            (user_id, tracker_id, summary, status, closed, updated_at)
+        )
+        self._wrote(user_id)
+        logging.info(f"✅ Задача {tracker_id} сохранена для пользователя {user_id}")
+
+    async def _notify_new_issues(self, conn, rows):
+        await self._notify(conn, "issue", keys=[row[1] for row in rows])
 
     async def get_user_issues(self, user_id: int):
         """Получает список задач пользователя"""
-        conn = await self.ensure_connection()
-        if not conn:
-            return []
-        try:
-            query = "SELECT tracker_id FROM issues WHERE user_id = $1"
-            rows = await conn.fetch(query, user_id)
-            return [row["tracker_id"] for row in rows]
-        finally:
-            await self._pool.release(conn)
+        rows = await self._read("fetch", GET_USER_ISSUES, user_id, user_id=user_id, default=[])
+        return [row["tracker_id"] for row in rows]
+
+    async def get_active_user_issues(
+        self,
+        user_id: int,
+        limit: int | None = None,
+        after: int | None = None,
+        before: int | None = None,
+    ):
+        """Возвращает незакрытые задачи пользователя из локального зеркала.
+
+        Задачи отсортированы от недавно изменённых.  ``after`` и ``before`` —
+        ``id`` задачи-курсора: выбираются ``limit`` задач сразу после неё
+        или сразу перед ней (порядок при этом тот же).  Если курсора уже
+        нет в списке, возвращается пустой список.
+        """
+        if before is not None:
+            rows = await self._read(
+                "fetch", GET_ACTIVE_USER_ISSUES_BEFORE, user_id, limit, before,
+                user_id=user_id, default=[],
+            )
+            rows = list(reversed(rows))
+        else:
+            rows = await self._read(
+                "fetch", GET_ACTIVE_USER_ISSUES, user_id, limit, after,
+                user_id=user_id, default=[],
+            )
+        return [
+            {
+                "id": row["id"],
+                "key": row["tracker_id"],
+                "summary": row["summary"],
+                "status": row["status"],
+            }
+            for row in rows
+        ]
+
+    async def upsert_issue(
+        self,
+        tracker_id: str,
+        summary: str | None = None,
+        status: str | None = None,
+        closed: bool | None = None,
+        user_id: int | None = None,
+        updated_at: datetime | None = None,
+    ):
+        """Обновляет задачу в зеркале; ``None`` оставляет поле без изменений.
+
+        ``updated_at`` — время изменения задачи в Tracker.  Если задачи ещё
+        нет и известен ``user_id``, она добавляется.
+        """
+        async with self.connection() as conn:
+            if not conn:
+                return
+            result = await conn.execute(
+                UPDATE_ISSUE, tracker_id, summary, status, closed, updated_at
+            )
+            if result == "UPDATE 0":
+                if user_id is None:
+                    return
+                await conn.execute(
+                    INSERT_ISSUE, user_id, tracker_id, summary, status, bool(closed), updated_at
+                )
+            await self._notify(conn, "issue", keys=[tracker_id], user_id=user_id)
+        self._wrote(user_id)
+
+    async def sync_user_issues(
+        self, user_id: int, issues: list[dict], fetched_at: datetime | None = None
+    ):
+        """Приводит зеркало к списку активных задач пользователя из Tracker.
+
+        ``issues`` — строки вида ``{"key", "summary", "status"}`` и
+        необязательный ``"updated_at"`` (время изменения в Tracker); задачи
+        пользователя, которых нет в списке, помечаются закрытыми.  Если
+        передан ``fetched_at`` (момент начала запроса к Tracker), закрываются
+        только задачи, не менявшиеся в Tracker после него.
+        """
+        async with self.connection() as conn:
+            if not conn:
+                return
+            async with conn.transaction():
+                for issue in issues:
+                    updated_at = issue.get("updated_at")
+                    result = await conn.execute(
+                        REOPEN_ISSUE, issue["key"], issue["summary"], issue["status"], updated_at
+                    )
+                    if result == "UPDATE 0":
+                        await conn.execute(
+                            INSERT_ISSUE,
+                            user_id, issue["key"], issue["summary"], issue["status"], False,
+                            updated_at,
+                        )
+                await conn.execute(
+                    CLOSE_MISSING_ISSUES, user_id, [issue["key"] for issue in issues], fetched_at
+                )
+                await self._notify(
+                    conn, "issue",
+                    keys=[issue["key"] for issue in issues], user_id=user_id, synced=True,
+                )
+        self._wrote(user_id)
+
+    async def get_user_ids(self):
+        """Возвращает идентификаторы всех зарегистрированных пользователей"""
+        rows = await self._read("fetch", GET_USER_IDS, default=[])
+        return [row["user_id"] for row in rows]
+
+    async def get_sync_state(self, key: str):
+        """Возвращает сохранённое значение курсора синхронизации"""
+        async with self.connection() as conn:
+            if not conn:
+                return None
+            return await conn.fetchval(GET_SYNC_STATE, key)
+
+    async def advance_sync_state(self, key: str, value: str):
+        """Сохраняет курсор, если он больше сохранённого ранее"""
+        async with self.connection() as conn:
+            if not conn:
+                return
+            await conn.execute(ADVANCE_SYNC_STATE, key, value)
+
+    async def set_sync_state(self, key: str, value: str):
+        """Сохраняет значение ``key`` в ``sync_state``"""
+        async with self.connection() as conn:
+            if not conn:
+                return
+            await conn.execute(SET_SYNC_STATE, key, value)
+
+    async def get_sync_states(self, prefix: str) -> dict:
+        """Возвращает все значения ``sync_state``, чьи ключи начинаются с ``prefix``"""
+        async with self.connection() as conn:
+            if not conn:
+                return {}
+            rows = await conn.fetch(GET_SYNC_STATES, prefix)
+        return {row["key"]: row["value"] for row in rows}
+
+    async def delete_sync_states(self, keys):
+        """Удаляет ключи ``keys`` из ``sync_state``"""
+        keys = list(keys)
+        if not keys:
+            return
+        async with self.connection() as conn:
+            if not conn:
+                return
+            await conn.execute(DELETE_SYNC_STATES, keys)
+
+    async def apply_issue_changes(self, rows: list[dict], cursor_key: str, cursor: str):
+        """Записывает страницу изменений из Tracker и курсор одной транзакцией.
+
+        ``rows`` — строки вида ``{"key", "user_id", "summary", "status",
+        "closed", "updated_at"}``.  Существующие задачи обновляются, новые добавляются,
+        если известен ``user_id``.
+        """
+        async with self.connection() as conn:
+            if not conn:
+                return
+            async with conn.transaction():
+                await conn.execute(
+                    APPLY_ISSUE_CHANGES,
+                    [row["key"] for row in rows],
+                    [row["user_id"] for row in rows],
+                    [row["summary"] for row in rows],
+                    [row["status"] for row in rows],
+                    [row["closed"] for row in rows],
+                    [row.get("updated_at") for row in rows],
+                )
+                await conn.execute(SET_SYNC_STATE, cursor_key, cursor)
+                if rows:
+                    await self._notify(conn, "issue", keys=[row["key"] for row in rows])
+        self._wrote(*(row["user_id"] for row in rows))
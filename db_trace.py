@@ -0,0 +1,129 @@
+import logging
+import re
+
+from config import Config
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float("inf"))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def redact(value) -> str:
+    """Describe a query parameter without revealing its value."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, (str, bytes, list, tuple, dict)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+class _Histogram:
+    __slots__ = ("count", "errors", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS_MS)
+
+    def add(self, ms, error=False):
+        self.count += 1
+        self.errors += error
+        self.total += ms
+        self.max = max(self.max, ms)
+        for index, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[index] += 1
+                break
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": {
+                ("+Inf" if bound == float("inf") else str(bound)): n
+                for bound, n in zip(BUCKETS_MS, self.buckets)
+            },
+        }
+
+
+class QueryTimings:
+    """Per-statement latency histograms of ``Database`` queries.
+
+    Fed by asyncpg query loggers installed on every pooled connection, so
+    ``execute``, ``fetch*`` and ``executemany`` are all covered.  Statements
+    are labelled by the names given in :meth:`name_queries` (the SQL
+    constants of ``database``), other queries by their first words.  Time
+    spent waiting for a pool connection is tracked separately.  Queries
+    slower than ``slow_threshold`` seconds are logged with redacted
+    parameters.
+    """
+
+    def __init__(self, slow_threshold=None):
+        self.slow_threshold = (
+            Config.DB_SLOW_QUERY if slow_threshold is None else slow_threshold
+        )
+        self._names: dict[str, str] = {}
+        self._statements: dict[str, _Histogram] = {}
+        self._pool_wait = _Histogram()
+
+    def name_queries(self, queries: dict):
+        """Label queries: ``{"GET_USER": "SELECT ..."}``."""
+        for name, query in queries.items():
+            self._names[query] = name
+
+    def statement_name(self, query: str) -> str:
+        name = self._names.get(query)
+        if name is None:
+            name = _WHITESPACE_RE.sub(" ", query).strip()[:60]
+        return name
+
+    def record_query(self, record):
+        """asyncpg query logger callback receiving a ``LoggedQuery``."""
+        ms = record.elapsed * 1000
+        name = self.statement_name(record.query)
+        histogram = self._statements.get(name)
+        if histogram is None:
+            histogram = self._statements[name] = _Histogram()
+        histogram.add(ms, error=record.exception is not None)
+        if self.slow_threshold and record.elapsed >= self.slow_threshold:
+            args = record.args or ()
+            if isinstance(args, tuple):
+                params = [redact(arg) for arg in args]
+            else:
+                # executemany passes the whole iterable of argument rows
+                params = f"<{len(args)} rows>" if hasattr(args, "__len__") else "<rows>"
+            logger.warning(
+                "Slow query: %s",
+                json_codec.dumps(
+                    {"statement": name, "ms": round(ms, 2), "params": params}
+                ).decode(),
+            )
+
+    def record_pool_wait(self, seconds, error=False):
+        self._pool_wait.add(seconds * 1000, error=error)
+
+    def clear(self):
+        self._statements.clear()
+        self._pool_wait = _Histogram()
+
+    def summary(self):
+        """Return ``{"statements": {name: stats}, "pool_wait": stats}``.
+
+        Stats hold ``count``, ``errors``, ``avg`` and ``max`` in
+        milliseconds and per-bucket (non-cumulative) counts keyed by the
+        bucket's upper bound.
+        """
+        return {
+            "statements": {
+                name: histogram.snapshot() for name, histogram in self._statements.items()
+            },
+            "pool_wait": self._pool_wait.snapshot(),
+        }
@@ -238,6 +238,7 @@ def register_handlers(application):
         },
         fallbacks=[],
         name="registration_flow",
+        persistent=True,
     )
     application.add_handler(registration_conv)
 
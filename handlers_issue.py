@@ -1,15 +1,19 @@
 from __future__ import annotations
 
 import asyncio
+import io
 import logging
 import os
+import re
 import tempfile
 import html
 import time
-from collections import defaultdict
+import uuid
+from collections import Counter, defaultdict, deque
 from typing import Final, List, Dict
 from telegram.ext import ContextTypes, CallbackContext
 from config import Config
+from cache import MISSING, TTLCache
 
 from telegram import (
     Update,
@@ -31,7 +35,9 @@ from send_monitor import (
     safe_delete_message,
 )
 from database import Database
-from tracker_client import TrackerAPI
+from issue_jobs import IssueJobQueue
+from issue_mirror import MY_ISSUES_NEXT_PREFIX, MY_ISSUES_PREV_PREFIX
+from tracker_client import TrackerAPI, parse_tracker_timestamp, status_display
 from keyboards import (
     main_reply_keyboard,
     register_keyboard,
@@ -39,18 +45,22 @@ from keyboards import (
 from messages import (
     NO_ISSUES,
     ISSUES_LIST,
+    ISSUES_LIST_PAGE,
     ENTER_ISSUE_TITLE,
     TITLE_EMPTY,
     ENTER_ISSUE_DESCRIPTION,
     ASK_FOR_ATTACHMENTS,
     UNSUPPORTED_FILE,
-    FILES_UPLOADED,
+    FILES_RECEIVED,
     TELEGRAM_DOWNLOAD_FAILED,
     FILE_UPLOAD_FAILED,
-    ALBUM_FILE_FAILED,
+    ALBUM_ALL_FAILED,
+    ALBUM_PARTIAL_FAILED,
     FILE_TOO_LARGE,
     ISSUE_CREATED,
     ISSUE_CREATION_ERROR,
+    ISSUE_CREATING,
+    ISSUE_ALREADY_CREATING,
     COMMENT_PROMPT,
     NO_ISSUE_SELECTED,
     COMMENT_ADDED,
@@ -62,16 +72,93 @@ from handlers_common import check_rate_limit, show_main_reply_menu
 # ──────────────────────────── буфер медиа‑альбомов ─────────────────────────────
 
 _album_buffer: Dict[str, List[Message]] = defaultdict(list)  # media_group_id -> [Message]
+_album_last_seen: Dict[str, float] = {}  # media_group_id -> время последнего сообщения
+_album_full: Dict[str, asyncio.Event] = {}  # выставляется, когда альбом заполнен
+
+# Telegram присылает в альбоме не больше 10 элементов
+ALBUM_MAX_ITEMS: Final = 10
+# Интервалы между сообщениями одного альбома, с — для подбора ALBUM_QUIET_PERIOD
+album_arrival_gaps: deque = deque(maxlen=1000)
+
+
+def album_gap_stats() -> dict:
+    """Число наблюдений, медиана, p95 и максимум интервалов внутри альбомов."""
+    gaps = sorted(album_arrival_gaps)
+    if not gaps:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "count": len(gaps),
+        "p50": gaps[len(gaps) // 2],
+        "p95": gaps[min(len(gaps) - 1, int(len(gaps) * 0.95))],
+        "max": gaps[-1],
+    }
+
+
+# file_unique_id -> содержимое небольших недавно загруженных файлов
+_file_cache = TTLCache(Config.UPLOAD_CACHE_SIZE, Config.UPLOAD_CACHE_TTL)
+upload_counters: Counter = Counter(
+    reused_ids=0, cache_hits=0, local_reads=0, upload_bytes_saved=0, download_bytes_saved=0
+)
+
 
+async def upload_file(file, bot, tracker, uploaded: dict | None = None):
+    """Download a Telegram *file* and upload it to Tracker.
 
-async def upload_file(file, bot, tracker):
-    """Download a Telegram *file* and upload it to Tracker."""
+    ``uploaded`` maps ``file_unique_id`` to attachment ids already uploaded
+    for the same issue draft: a file sent again reuses its id, because a
+    temporary attachment can be attached to one issue only.  Small files
+    are also kept in ``_file_cache`` for ``UPLOAD_CACHE_TTL`` seconds, so a
+    repeated file (e.g. in a comment) skips the Telegram download.
+
+    With a local Bot API server (``bot.local_mode``) the file is read
+    directly from the server's disk.  Otherwise files up to
+    ``UPLOAD_MEMORY_THRESHOLD`` bytes are downloaded into memory and uploaded
+    from there; larger ones go through a temporary file.
+    """
+    unique_id = getattr(file, "file_unique_id", None)
+    if uploaded is not None and unique_id in uploaded:
+        upload_counters["reused_ids"] += 1
+        upload_counters["upload_bytes_saved"] += getattr(file, "file_size", 0) or 0
+        return uploaded[unique_id]
 
-    file_info = await bot.get_file(file.file_id)
     if getattr(file, "file_name", None):
         ext = os.path.splitext(file.file_name)[1] or ".jpg"
     else:
         ext = ".jpg"
+
+    # Одно имя вложения для всех путей загрузки: память, кэш, диск
+    name = getattr(file, "file_name", None) or f"{unique_id or 'file'}{ext}"
+    size = getattr(file, "file_size", None) or 0
+    content = _file_cache.get(unique_id) if unique_id else MISSING
+    if content is not MISSING:
+        upload_counters["cache_hits"] += 1
+        upload_counters["download_bytes_saved"] += len(content)
+        file_id = await tracker.upload_file(None, name, content=content)
+    else:
+        file_info = await bot.get_file(file.file_id)
+        local_path = _local_file_path(bot, file_info)
+        if local_path:
+            # Локальный Bot API уже сохранил файл на диск: отдаём его в
+            # Tracker напрямую, без копирования
+            upload_counters["local_reads"] += 1
+            file_id = await tracker.upload_file(local_path, name)
+        elif 0 < size <= Config.UPLOAD_MEMORY_THRESHOLD:
+            # Небольшие файлы (в основном фото) не касаются диска
+            buffer = io.BytesIO()
+            await file_info.download_to_memory(buffer)
+            content = buffer.getvalue()
+            if unique_id and 0 < len(content) <= Config.UPLOAD_CACHE_MAX_FILE_SIZE:
+                _file_cache.set(unique_id, content)
+            file_id = await tracker.upload_file(None, name, content=content)
+        else:
+            file_id = await _upload_via_temp_file(file_info, tracker, name, ext, unique_id)
+
+    if uploaded is not None and unique_id and file_id:
+        uploaded[unique_id] = file_id
+    return file_id
+
+
+async def _upload_via_temp_file(file_info, tracker, name: str, ext: str, unique_id):
     # Some albums may contain the same file multiple times which means
     # ``file_unique_id`` would be identical for each message.  In such
     # cases concurrent downloads would try to use the same path in ``/tmp``
@@ -82,26 +169,81 @@ async def upload_file(file, bot, tracker):
 
     await file_info.download_to_drive(temp_path)
     try:
-        file_id = await tracker.upload_file(
-            temp_path, getattr(file, "file_name", None)
-        )
+        if unique_id and 0 < os.path.getsize(temp_path) <= Config.UPLOAD_CACHE_MAX_FILE_SIZE:
+            with open(temp_path, "rb") as f:
+                _file_cache.set(unique_id, f.read())
+        return await tracker.upload_file(temp_path, name)
     finally:
         try:
             os.remove(temp_path)
         except OSError:
             logging.warning("Failed to remove temporary file %s", temp_path)
 
-    return file_id
+
+def _local_file_path(bot, file_info) -> str | None:
+    """Path of the file on disk when the bot talks to a local Bot API server."""
+    if getattr(bot, "local_mode", False) is not True:
+        return None
+    path = getattr(file_info, "file_path", None)
+    if isinstance(path, str) and os.path.isabs(path) and os.path.isfile(path):
+        return path
+    return None
+
+
+def upload_cache_stats() -> dict:
+    """Счётчики повторно использованных вложений и сэкономленных байтов."""
+    return {**upload_counters, "cache": _file_cache.stats()}
 
 # ═══════════════════════════ список задач ═════════════════════════════════════
 
+# callback_data кнопок листания: префикс + номер страницы + id задачи-курсора
+# (последней на предыдущей странице или первой на следующей)
+MY_ISSUES_PAGE_RE: Final = re.compile(r"^my_issues_(next|prev)_(\d+)_(\d+)$")
+
+
+def _page_cursor(data) -> tuple[int, int | None, int | None]:
+    """Разбирает callback_data кнопки листания: (страница, after, before)."""
+    match = MY_ISSUES_PAGE_RE.match(data) if isinstance(data, str) else None
+    if not match:
+        return 1, None, None
+    direction, page, issue_id = match.groups()
+    if direction == "next":
+        return int(page), int(issue_id), None
+    return int(page), None, int(issue_id)
+
+
+def _issues_page_markup(issues, page: int, has_prev: bool, has_next: bool) -> InlineKeyboardMarkup:
+    keyboard = [
+        [InlineKeyboardButton(f"{issue.get('key')}: {issue.get('summary') or 'Без описания'}",
+                              callback_data=f"issue_{issue['key']}")]
+        for issue in issues
+    ]
+    navigation = []
+    if has_prev and issues:
+        navigation.append(InlineKeyboardButton(
+            "◀️ Назад", callback_data=f"{MY_ISSUES_PREV_PREFIX}{page - 1}_{issues[0]['id']}"
+        ))
+    if has_next and issues:
+        navigation.append(InlineKeyboardButton(
+            "Вперёд ▶️", callback_data=f"{MY_ISSUES_NEXT_PREFIX}{page + 1}_{issues[-1]['id']}"
+        ))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("🔄 Главное меню", callback_data="main_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
+
 async def my_issues(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Отправляет список задач пользователя за исключением закрытых.
 
-    Функция работает и для inline-кнопок, и для текстовой команды.
+    Функция работает и для inline-кнопок, и для текстовой команды. Список
+    показывается по ``MY_ISSUES_PAGE_SIZE`` задач; кнопки листания несут
+    номер страницы и задачу-курсор в ``callback_data``.
     """
     logging.info("my_issues requested by %s", update.effective_user.id)
-    if update.callback_query:
+    query = update.callback_query
+    page, after, before = _page_cursor(query.data if query else None)
+    if query and after is None and before is None:
         allowed = await check_rate_limit(update, context, "_my_issues_ts", "получение списка задач")
         if not allowed:
             return
@@ -128,16 +270,32 @@ async def my_issues(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             await safe_delete_message(update.message)
         return
 
-    tracker: TrackerAPI = context.bot_data["tracker"]
-
-    issues = await tracker.get_active_issues_by_telegram_id(telegram_id)
-    keyboard = [
-        [InlineKeyboardButton(f"{issue.get('key')}: {issue.get('summary', 'Без описания')}",
-                              callback_data=f"issue_{issue['key']}")]
-        for issue in issues
-    ]
-    keyboard.append([InlineKeyboardButton("🔄 Главное меню", callback_data="main_menu")])
-    markup = InlineKeyboardMarkup(keyboard)
+    # Список берём из локального зеркала задач, без поиска в Tracker,
+    # по одной странице; лишняя строка показывает, есть ли страница дальше
+    page_size = Config.MY_ISSUES_PAGE_SIZE
+    if before is not None:
+        issues = await db.get_active_user_issues(
+            telegram_id, limit=page_size + 1, before=before
+        )
+        has_prev, has_next = len(issues) > page_size, True
+        issues = issues[-page_size:]
+    else:
+        issues = await db.get_active_user_issues(
+            telegram_id, limit=page_size + 1, after=after
+        )
+        has_prev, has_next = after is not None, len(issues) > page_size
+        issues = issues[:page_size]
+    if not issues and (after is not None or before is not None):
+        # Задача-курсор закрыта или страница опустела, пока список был открыт
+        issues = await db.get_active_user_issues(telegram_id, limit=page_size + 1)
+        has_prev, has_next = False, len(issues) > page_size
+        issues = issues[:page_size]
+    # Номер страницы из кнопки лишь подпись: первая страница всегда первая
+    page = max(page, 2) if has_prev else 1
+    markup = _issues_page_markup(issues, page, has_prev, has_next)
+    text = ISSUES_LIST
+    if has_prev or has_next:
+        text = ISSUES_LIST_PAGE.format(page=page)
 
     if not issues:
         if update.callback_query:
@@ -151,10 +309,11 @@ async def my_issues(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     if update.callback_query:
         await update.callback_query.answer()
-        await update.callback_query.edit_message_text(ISSUES_LIST, reply_markup=markup)
+        # Листание страниц редактирует то же сообщение
+        await update.callback_query.edit_message_text(text, reply_markup=markup)
         context.user_data["issues_list_message"] = update.callback_query.message
     elif update.message:
-        sent = await safe_reply_text(update.message, ISSUES_LIST, reply_markup=markup, context=context)
+        sent = await safe_reply_text(update.message, text, reply_markup=markup, context=context)
         context.user_data["issues_list_message"] = sent
     if update.message:
         await safe_delete_message(update.message)
@@ -234,6 +393,9 @@ async def process_issue_title(update: Update, context: CallbackContext):
         return IssueStates.waiting_for_title
 
     context.user_data["issue_title"] = title
+    # Ключ черновика живёт до принятия задачи в очередь и защищает
+    # от повторного создания той же задачи
+    context.user_data["draft_id"] = uuid.uuid4().hex
     await safe_reply_text(update.message, ENTER_ISSUE_DESCRIPTION,
         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔄 Отмена", callback_data="main_menu")]])
     , context=context)
@@ -263,15 +425,81 @@ async def ask_for_attachments(update: Update, context: CallbackContext):
         ])
     , context=context)
     context.user_data["attachments"] = []  # обнуляем список
+    context.user_data["uploaded_files"] = {}
+    context.user_data["pending_uploads"] = set()
+    context.user_data["files_accepted"] = 0
     return IssueStates.waiting_for_attachment
 
+# ─────────────────────────── фоновые загрузки ────────────────────────────────
+
+def _draft_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("📤 Создать задачу", callback_data="create_issue")],
+        [InlineKeyboardButton("🔄 Отмена", callback_data="main_menu")],
+    ])
+
+
+def _draft_uploads(user_data) -> tuple[list, set]:
+    """Возвращает ID загруженных вложений черновика и его незавершённые загрузки."""
+    attachments = user_data.setdefault("attachments", [])
+    pending = user_data.get("pending_uploads")
+    if not isinstance(pending, set):
+        # задачи живут только в памяти процесса
+        pending = user_data["pending_uploads"] = set()
+    return attachments, pending
+
+
+def _start_upload(context: CallbackContext, chat_id: int, upload, error_text: str) -> asyncio.Task:
+    """Запускает загрузку вложений черновика в фоне.
+
+    ``upload`` — корутина, возвращающая список ID файлов в Tracker; они
+    добавляются к вложениям того черновика, для которого загрузка начата.
+    При ошибке пользователь получает ``error_text``.
+    """
+    attachments, pending = _draft_uploads(context.user_data)
+
+    async def run():
+        try:
+            file_ids = await upload
+        except TelegramError:
+            text = TELEGRAM_DOWNLOAD_FAILED
+        except Exception as exc:
+            logging.exception("Ошибка загрузки вложения: %s", exc)
+            text = error_text
+        else:
+            # повторно присланный файл уже может быть среди вложений
+            attachments.extend(i for i in file_ids if i not in attachments)
+            return
+        await safe_send_message(
+            context.bot, chat_id=chat_id, text=text,
+            reply_markup=_draft_keyboard(), context=context,
+        )
+
+    task = asyncio.create_task(run())
+    pending.add(task)
+    task.add_done_callback(pending.discard)
+    return task
+
+
+def _accept_files(user_data, count: int) -> int:
+    """Учитывает ``count`` принятых файлов черновика и возвращает их общее число."""
+    user_data["files_accepted"] = user_data.get("files_accepted", 0) + count
+    return user_data["files_accepted"]
+
+
+async def _wait_for_uploads(user_data) -> None:
+    """Дожидается незавершённых загрузок черновика."""
+    pending = user_data.get("pending_uploads")
+    if isinstance(pending, set) and pending:
+        await asyncio.gather(*list(pending), return_exceptions=True)
+
+
 # ─────────────────────────── одиночный файл ──────────────────────────────────
 
 async def handle_attachment(update: Update, context: CallbackContext):
     """Обрабатывает одиночное фото/документ и загружает его в Tracker."""
     logging.info("handle_attachment from %s", update.effective_user.id)
     tracker: TrackerAPI = context.bot_data["tracker"]
-    attachments = context.user_data.get("attachments", [])
 
     file = update.message.photo[-1] if update.message.photo else update.message.document
     if not file:
@@ -281,31 +509,22 @@ async def handle_attachment(update: Update, context: CallbackContext):
         await safe_reply_text(update.message, FILE_TOO_LARGE, context=context)
         return IssueStates.waiting_for_attachment
 
-    try:
-        file_id = await upload_file(file, context.bot, tracker)
+    uploaded = context.user_data.setdefault("uploaded_files", {})
+
+    async def upload():
+        file_id = await upload_file(file, context.bot, tracker, uploaded)
         if not file_id:
             raise RuntimeError("upload_file вернул None")
+        return [file_id]
 
-        attachments.append(file_id)
-        context.user_data["attachments"] = attachments
-
-        await safe_reply_text(
-            update.message,
-            FILES_UPLOADED.format(count=len(attachments)),
-            reply_markup=InlineKeyboardMarkup(
-                [
-                    [InlineKeyboardButton("📤 Создать задачу", callback_data="create_issue")],
-                    [InlineKeyboardButton("🔄 Отмена", callback_data="main_menu")],
-                ]
-            ),
-            context=context,
-        )
-
-    except TelegramError:
-        await safe_reply_text(update.message, TELEGRAM_DOWNLOAD_FAILED, context=context)
-    except Exception as exc:
-        logging.exception("Ошибка загрузки вложения: %s", exc)
-        await safe_reply_text(update.message, FILE_UPLOAD_FAILED, context=context)
+    # Отвечаем сразу, файл догружается в фоне
+    _start_upload(context, update.message.chat_id, upload(), FILE_UPLOAD_FAILED)
+    await safe_reply_text(
+        update.message,
+        FILES_RECEIVED.format(count=_accept_files(context.user_data, 1)),
+        reply_markup=_draft_keyboard(),
+        context=context,
+    )
 
     return IssueStates.waiting_for_attachment
 
@@ -316,25 +535,84 @@ async def handle_photo_or_album(update: Update, context: CallbackContext):  # no
     logging.info("handle_photo_or_album from %s", update.effective_user.id)
     if update.message.media_group_id:
         gid = update.message.media_group_id
+        now = time.monotonic()
+        if gid in _album_last_seen:
+            album_arrival_gaps.append(now - _album_last_seen[gid])
+        _album_last_seen[gid] = now
         _album_buffer[gid].append(update.message)
         # запускаем отложенную обработку альбома только при первом фото
         if len(_album_buffer[gid]) == 1:
+            _album_full[gid] = asyncio.Event()
             asyncio.create_task(_process_album_later(gid, context))
+        elif len(_album_buffer[gid]) >= ALBUM_MAX_ITEMS and gid in _album_full:
+            _album_full[gid].set()
         return IssueStates.waiting_for_attachment
     else:
         # одиночное фото/документ
         return await handle_attachment(update, context)
 
+async def _wait_for_album(group_id: str) -> None:
+    """Ждёт, пока Telegram пришлёт все сообщения альбома.
+
+    Сбор заканчивается, когда ``ALBUM_QUIET_PERIOD`` секунд не приходит
+    новых сообщений, альбом набрал ``ALBUM_MAX_ITEMS`` элементов или прошло
+    ``ALBUM_MAX_WAIT`` секунд с первого сообщения.
+    """
+    started = time.monotonic()
+    full = _album_full.setdefault(group_id, asyncio.Event())
+    while not full.is_set():
+        now = time.monotonic()
+        deadline = min(
+            _album_last_seen.get(group_id, started) + Config.ALBUM_QUIET_PERIOD,
+            started + Config.ALBUM_MAX_WAIT,
+        )
+        if now >= deadline:
+            break
+        try:
+            await asyncio.wait_for(full.wait(), deadline - now)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _upload_with_retry(file, bot, tracker, uploaded: dict):
+    """Загружает один файл альбома, повторяя неудачные попытки с паузой."""
+    for attempt in range(Config.ALBUM_UPLOAD_RETRIES + 1):
+        try:
+            file_id = await upload_file(file, bot, tracker, uploaded)
+            if not file_id:
+                raise RuntimeError("upload_file вернул None")
+            return file_id
+        except Exception as exc:
+            if attempt == Config.ALBUM_UPLOAD_RETRIES:
+                raise
+            delay = Config.ALBUM_RETRY_DELAY * 2 ** attempt
+            logging.warning(
+                "album file %s: attempt %d failed, retrying in %.1fs: %s",
+                getattr(file, "file_unique_id", "?"), attempt + 1, delay, exc,
+            )
+            await asyncio.sleep(delay)
+
+
+def _album_item_name(number: int, file) -> str:
+    name = getattr(file, "file_name", None)
+    return f"№{number} ({name})" if name else f"№{number}"
+
+
 async def _process_album_later(group_id: str, context: CallbackContext):
-    """Ждёт 2 секунды, чтобы Telegram прислал все фото, затем загружает."""
-    logging.info("processing album %s", group_id)
-    await asyncio.sleep(2)
+    """Собирает альбом целиком (см. ``_wait_for_album``), затем загружает."""
+    started = time.monotonic()
+    await _wait_for_album(group_id)
+    _album_full.pop(group_id, None)
+    _album_last_seen.pop(group_id, None)
     messages = _album_buffer.pop(group_id, [])
+    logging.info(
+        "processing album %s: %d items after %.2fs",
+        group_id, len(messages), time.monotonic() - started,
+    )
     if not messages:
         return
 
     tracker: TrackerAPI = context.bot_data["tracker"]
-    attachments: List[int] = []
     chat_id = messages[0].chat_id
 
     files = []
@@ -352,32 +630,127 @@ async def _process_album_later(group_id: str, context: CallbackContext):
             return
         files.append(file)
 
-    try:
+    uploaded = context.user_data.setdefault("uploaded_files", {})
+
+    async def upload():
+        # Каждый файл загружается и повторяется отдельно; удачные остаются
+        # в черновике, даже если часть альбома не загрузилась
         results = await asyncio.gather(
-            *(upload_file(f, context.bot, tracker) for f in files)
+            *(_upload_with_retry(f, context.bot, tracker, uploaded) for f in files),
+            return_exceptions=True,
         )
-        attachments.extend([r for r in results if r])
-    except Exception as exc:
-        logging.exception("Ошибка загрузки из альбома: %s", exc)
-        await safe_send_message(context.bot, chat_id=chat_id, text=ALBUM_FILE_FAILED, context=context)
-        return  # прерываем весь альбом
-
-    # складываем ID вложений в user_data
-    context.user_data["attachments"] = context.user_data.get("attachments", []) + attachments
+        failed = [
+            _album_item_name(number, file)
+            for number, (file, result) in enumerate(zip(files, results), 1)
+            if isinstance(result, BaseException) or not result
+        ]
+        if failed:
+            logging.warning("album %s: %d of %d files failed", group_id, len(failed), len(files))
+            if len(failed) == len(files):
+                text = ALBUM_ALL_FAILED
+            else:
+                text = ALBUM_PARTIAL_FAILED.format(
+                    failed=len(failed), total=len(files), items=", ".join(failed)
+                )
+            await safe_send_message(
+                context.bot,
+                chat_id=chat_id,
+                text=text,
+                reply_markup=_draft_keyboard(),
+                context=context,
+            )
+        return [r for r in results if r and not isinstance(r, BaseException)]
 
+    _start_upload(context, chat_id, upload(), FILE_UPLOAD_FAILED)
     await safe_send_message(
         context.bot,
         chat_id=chat_id,
-        text=FILES_UPLOADED.format(count=len(attachments)),
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("📤 Создать задачу", callback_data="create_issue")],
-            [InlineKeyboardButton("🔄 Отмена", callback_data="main_menu")],
-        ]),
+        text=FILES_RECEIVED.format(count=_accept_files(context.user_data, len(files))),
+        reply_markup=_draft_keyboard(),
         context=context,
     )
 
 # ─────────────────────────── финальное подтверждение ─────────────────────────
 
+async def _issue_fields(db: Database, user, user_data) -> tuple[str, dict]:
+    """Собирает описание и поля задачи из черновика, дождавшись загрузок."""
+    description = user_data.get("issue_description", "")
+    # Ждём только загрузки, которые ещё не закончились
+    await _wait_for_uploads(user_data)
+    attachments = user_data.get("attachments", [])
+
+    user_info = await db.get_user(user.id) or {}
+    full_description = (
+        f"{description}\n\n---\n"
+        f"👤 {user.first_name} {user.last_name or ''}\n"
+        f"📞 {user_info.get('phone_number', 'неизвестно')}\n"
+        f"🔗 @{user.username or 'без username'}"
+    )
+
+    extra_fields = {
+        "telegramId": str(user.id),
+        "project": Config.PROJECT,
+        "tags": Config.DEFAULT_TAGS,
+        Config.PRODUCT_CUSTOM_FIELD: Config.PRODUCT_DEFAULT,
+    }
+    if attachments:
+        # При создании задачи вложения передаются через поле attachmentIds
+        extra_fields["attachmentIds"] = attachments
+    return full_description, extra_fields
+
+
+async def _submit_issue_job(update: Update, context: CallbackContext, jobs: IssueJobQueue):
+    """Ставит задачу в очередь; её создаёт фоновый обработчик.
+
+    Пользователь сразу получает сообщение «Создаём задачу…», которое
+    обработчик потом заменит ссылкой или ошибкой.  Если задачу не удалось
+    поставить в очередь, сообщение заменяется ошибкой, а черновик
+    сохраняется для повторной попытки.  Если этот черновик уже в очереди
+    (повторное нажатие), результат придёт в сообщение первой попытки.
+    """
+    query = update.callback_query
+    user = update.effective_user
+    title = context.user_data.get("issue_title")
+    message = await safe_reply_text(
+        query.message,
+        ISSUE_CREATING.format(summary=html.escape(title or "")),
+        parse_mode="HTML",
+        context=context,
+    )
+    db: Database = context.bot_data["db"]
+    # Черновики, начатые до появления draft_id, получают его здесь
+    draft_id = context.user_data.setdefault("draft_id", uuid.uuid4().hex)
+    try:
+        full_description, extra_fields = await _issue_fields(db, user, context.user_data)
+        submitted = await jobs.submit(
+            f"{user.id}:{draft_id}",
+            user.id,
+            query.message.chat_id,
+            message.message_id if message else None,
+            {"title": title, "description": full_description, "extra_fields": extra_fields},
+        )
+    except Exception as exc:
+        logging.error("failed to submit issue job for %s: %s", user.id, exc)
+        try:
+            if message is None:
+                raise ValueError("no message to edit")
+            await message.edit_text(ISSUE_CREATION_ERROR, reply_markup=_draft_keyboard())
+        except (TelegramError, ValueError):
+            await safe_reply_text(
+                query.message, ISSUE_CREATION_ERROR,
+                reply_markup=_draft_keyboard(), context=context,
+            )
+        return IssueStates.waiting_for_attachment
+
+    if not submitted and message is not None:
+        try:
+            await message.edit_text(ISSUE_ALREADY_CREATING)
+        except TelegramError as exc:
+            logging.warning("failed to edit duplicate issue message: %s", exc)
+    context.user_data.clear()
+    return ConversationHandler.END
+
+
 async def confirm_issue_creation(update: Update, context: CallbackContext):
     """Создаёт задачу в Tracker и сохраняет её в БД."""
     logging.info("confirm_issue_creation by %s", update.effective_user.id)
@@ -395,36 +768,27 @@ async def confirm_issue_creation(update: Update, context: CallbackContext):
     except TelegramError as exc:
         logging.warning("confirm_issue_creation: failed to clear markup: %s", exc)
     
+    jobs: IssueJobQueue | None = context.bot_data.get("issue_jobs")
+    if jobs is not None:
+        return await _submit_issue_job(update, context, jobs)
+
     db: Database = context.bot_data["db"]
     tracker: TrackerAPI = context.bot_data["tracker"]
     user = update.effective_user
-
     title = context.user_data.get("issue_title")
-    description = context.user_data.get("issue_description", "")
-    attachments = context.user_data.get("attachments", [])
-
-    user_info = await db.get_user(user.id) or {}
-    full_description = (
-        f"{description}\n\n---\n"
-        f"👤 {user.first_name} {user.last_name or ''}\n"
-        f"📞 {user_info.get('phone_number', 'неизвестно')}\n"
-        f"🔗 @{user.username or 'без username'}"
-    )
+    full_description, extra_fields = await _issue_fields(db, user, context.user_data)
 
-    extra_fields = {
-        "telegramId": str(user.id),
-        "project": Config.PROJECT,
-        "tags": Config.DEFAULT_TAGS,
-        Config.PRODUCT_CUSTOM_FIELD: Config.PRODUCT_DEFAULT,
-    }
-    if attachments:
-        # При создании задачи вложения передаются через поле attachmentIds
-        extra_fields["attachmentIds"] = attachments
     issue = await tracker.create_issue(title, full_description, extra_fields)
     if issue and "key" in issue:
-        await db.create_issue(user.id, issue["key"])
+        await db.create_issue(
+            user.id,
+            issue["key"],
+            summary=title,
+            status=status_display(issue.get("status")),
+            updated_at=parse_tracker_timestamp(issue.get("updatedAt")),
+        )
         logging.info("issue %s created for %s", issue['key'], user.id)
-        text = ISSUE_CREATED.format(issue_key=issue['key'], summary=html.escape(title))
+        text = ISSUE_CREATED.format(issue_key=issue['key'], summary=html.escape(title or ""))
         await safe_reply_text(
             query.message,
             text,
@@ -573,13 +937,14 @@ def register_handlers(app):
             CallbackQueryHandler(do_nothing, pattern="^main_menu$"),
         ],
         name="issue_flow",
+        persistent=True,
         per_chat=True,
     )
     app.add_handler(conv)
 
     # Мои задачи: поддержка и reply, и inline
     app.add_handler(MessageHandler(filters.Regex("^📂 Мои задачи$"), my_issues))
-    app.add_handler(CallbackQueryHandler(my_issues, pattern="^my_issues$"))
+    app.add_handler(CallbackQueryHandler(my_issues, pattern=r"^my_issues(_(next|prev)_\d+_\d+)?$"))
 
     # Общие ловцы альбомов и вложений (если нужны вне FSM)
     app.add_handler(MessageHandler(filters.PHOTO | filters.Document.ALL, handle_photo_or_album))
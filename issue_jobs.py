@@ -0,0 +1,282 @@
+"""Durable queue of issue creation jobs.
+
+``confirm_issue_creation`` only stores a job and answers the user with a
+"creating…" message; :class:`IssueJobQueue` creates the issue in Tracker and
+edits that message into the final link or an error.  Jobs live in the
+``issue_jobs`` table, so they survive restarts and any instance may run
+them.  A claimed job is leased for ``ISSUE_JOB_LEASE`` seconds and the lease
+is renewed while the job runs: if the instance dies meanwhile, the job
+becomes due again.  Every job carries an
+idempotency key which is also sent to Tracker as the issue's ``unique``
+field, so a retried job never creates a second issue.
+"""
+
+import asyncio
+import contextlib
+import html
+import logging
+
+from telegram.error import TelegramError
+
+from config import Config
+import json_codec
+from messages import ISSUE_CREATED, ISSUE_CREATION_ERROR
+from tracker_client import parse_tracker_timestamp, status_display
+
+logger = logging.getLogger(__name__)
+
+ENQUEUE_JOB = """
+INSERT INTO issue_jobs (idempotency_key, user_id, chat_id, message_id, payload)
+VALUES ($1, $2, $3, $4, $5::jsonb)
+ON CONFLICT (idempotency_key) DO NOTHING
+RETURNING id
+"""
+# Due jobs are leased by moving ``run_after`` forward; other instances skip
+# rows locked by a concurrent claim
+CLAIM_JOBS = """
+UPDATE issue_jobs
+SET attempts = attempts + 1,
+    run_after = now() + make_interval(secs => $1),
+    updated_at = now()
+WHERE id IN (
+    SELECT id FROM issue_jobs
+    WHERE status = 'pending' AND run_after <= now()
+    ORDER BY run_after
+    LIMIT $2
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id, idempotency_key, user_id, chat_id, message_id, payload, attempts
+"""
+COMPLETE_JOB = """
+UPDATE issue_jobs SET status = 'done', issue_key = $2, error = NULL, updated_at = now()
+WHERE id = $1
+"""
+# Renews the lease of a running job; a finished job is left alone
+EXTEND_LEASE = """
+UPDATE issue_jobs SET run_after = now() + make_interval(secs => $2), updated_at = now()
+WHERE id = $1 AND status = 'pending'
+"""
+RETRY_JOB = """
+UPDATE issue_jobs SET run_after = now() + make_interval(secs => $2), error = $3, updated_at = now()
+WHERE id = $1
+"""
+FAIL_JOB = """
+UPDATE issue_jobs SET status = 'failed', error = $2, updated_at = now()
+WHERE id = $1
+"""
+
+# Longest pause between two attempts of a job, in seconds
+MAX_BACKOFF = 300
+
+
+class IssueJobQueue:
+    """Stores issue creation jobs and runs them in the background.
+
+    :meth:`submit` wakes the worker of this instance immediately; jobs
+    submitted elsewhere or due for a retry are picked up every
+    ``poll_interval`` seconds.  A failed job is retried with exponential
+    backoff up to ``max_attempts`` times.
+    """
+
+    def __init__(
+        self,
+        db,
+        tracker,
+        bot,
+        poll_interval=None,
+        max_attempts=None,
+        lease=None,
+        concurrency=None,
+        retry_delay=None,
+    ):
+        self.db = db
+        self.tracker = tracker
+        self.bot = bot
+        self.poll_interval = Config.ISSUE_JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.max_attempts = max_attempts or Config.ISSUE_JOB_MAX_ATTEMPTS
+        self.lease = Config.ISSUE_JOB_LEASE if lease is None else lease
+        self.concurrency = concurrency or Config.ISSUE_JOB_CONCURRENCY
+        self.retry_delay = Config.ISSUE_JOB_RETRY_DELAY if retry_delay is None else retry_delay
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+        self._counts = {"submitted": 0, "duplicates": 0, "done": 0, "retried": 0, "failed": 0}
+        db.timings.name_queries({
+            "ENQUEUE_JOB": ENQUEUE_JOB,
+            "CLAIM_JOBS": CLAIM_JOBS,
+            "COMPLETE_JOB": COMPLETE_JOB,
+            "EXTEND_LEASE": EXTEND_LEASE,
+            "RETRY_JOB": RETRY_JOB,
+            "FAIL_JOB": FAIL_JOB,
+        })
+
+    async def submit(self, key: str, user_id: int, chat_id: int, message_id, payload: dict) -> bool:
+        """Store a job; return ``False`` if a job with ``key`` already exists.
+
+        ``payload`` holds ``title``, ``description`` and ``extra_fields`` of
+        the issue; ``message_id`` is the message edited with the result.
+        """
+        async with self.db.connection() as conn:
+            if not conn:
+                raise ConnectionError("database is not available")
+            job_id = await conn.fetchval(
+                ENQUEUE_JOB, key, user_id, chat_id, message_id,
+                json_codec.dumps(payload).decode(),
+            )
+        if job_id is None:
+            self._counts["duplicates"] += 1
+            logger.info("Issue job %s already submitted", key)
+            return False
+        self._counts["submitted"] += 1
+        self._wakeup.set()
+        return True
+
+    # ─────────────────────────── worker ────────────────────────────
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self, timeout=None) -> None:
+        """Stop claiming jobs and let the running ones finish.
+
+        After ``timeout`` seconds (``ISSUE_JOB_DRAIN_TIMEOUT``) the worker is
+        cancelled; its unfinished jobs are retried once their lease expires.
+        """
+        if self._task is None:
+            return
+        timeout = Config.ISSUE_JOB_DRAIN_TIMEOUT if timeout is None else timeout
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Issue jobs still running after %.0fs, cancelled", timeout)
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._stopping = False
+
+    async def run(self) -> None:
+        while not self._stopping:
+            # Cleared before claiming so a job submitted meanwhile is not missed
+            self._wakeup.clear()
+            try:
+                processed = await self.run_due()
+            except Exception as exc:
+                logger.error("Issue job claim failed: %s", exc)
+                processed = 0
+            if processed:
+                continue
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+
+    async def run_due(self) -> int:
+        """Claim due jobs, run them and return their number."""
+        async with self.db.connection() as conn:
+            if not conn:
+                return 0
+            jobs = await conn.fetch(CLAIM_JOBS, float(self.lease), self.concurrency)
+        await asyncio.gather(*(self._process(job) for job in jobs))
+        return len(jobs)
+
+    async def _process(self, job) -> None:
+        payload = json_codec.loads(job["payload"])
+        title = payload["title"]
+        try:
+            issue = await self._create_issue(job, payload)
+            await self._execute(COMPLETE_JOB, job["id"], issue["key"])
+        except Exception as exc:
+            await self._failed(job, exc)
+            return
+        self._counts["done"] += 1
+        logger.info("issue %s created for %s", issue["key"], job["user_id"])
+        await self._report(
+            job, ISSUE_CREATED.format(issue_key=issue["key"], summary=html.escape(title or ""))
+        )
+
+    async def _create_issue(self, job, payload) -> dict:
+        """Create the issue in Tracker and the mirror, keeping the job leased.
+
+        Tracker timeouts and 429 retries can make one attempt outlast the
+        lease; without renewal another instance would run the job twice.
+        """
+        keeper = asyncio.create_task(self._keep_lease(job["id"]))
+        try:
+            issue = await self.tracker.create_issue(
+                payload["title"],
+                payload["description"],
+                payload.get("extra_fields"),
+                unique=job["idempotency_key"],
+            )
+            if not issue or "key" not in issue:
+                raise ValueError(f"unexpected Tracker response: {issue!r}")
+            await self.db.create_issue(
+                job["user_id"],
+                issue["key"],
+                summary=payload["title"],
+                status=status_display(issue.get("status")),
+                updated_at=parse_tracker_timestamp(issue.get("updatedAt")),
+            )
+            return issue
+        finally:
+            keeper.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await keeper
+
+    async def _keep_lease(self, job_id) -> None:
+        # Renewed at half the lease, so one slow renewal does not lose it
+        while True:
+            await asyncio.sleep(self.lease / 2)
+            try:
+                await self._execute(EXTEND_LEASE, job_id, float(self.lease))
+            except Exception as exc:
+                logger.warning("Issue job %s: renewing the lease failed: %s", job_id, exc)
+
+    async def _failed(self, job, exc) -> None:
+        error = str(exc)[:1000]
+        if job["attempts"] >= self.max_attempts:
+            self._counts["failed"] += 1
+            logger.error(
+                "Issue job %s failed after %d attempts: %s",
+                job["idempotency_key"], job["attempts"], exc,
+            )
+            with contextlib.suppress(Exception):
+                await self._execute(FAIL_JOB, job["id"], error)
+            await self._report(job, ISSUE_CREATION_ERROR)
+            return
+        self._counts["retried"] += 1
+        delay = min(self.retry_delay * 2 ** (job["attempts"] - 1), MAX_BACKOFF)
+        logger.warning(
+            "Issue job %s attempt %d failed, retrying in %.0fs: %s",
+            job["idempotency_key"], job["attempts"], delay, exc,
+        )
+        # If this fails too, the lease expires and the job is retried anyway
+        with contextlib.suppress(Exception):
+            await self._execute(RETRY_JOB, job["id"], float(delay), error)
+
+    async def _execute(self, query, *args) -> None:
+        async with self.db.connection() as conn:
+            if not conn:
+                raise ConnectionError("database is not available")
+            await conn.execute(query, *args)
+
+    async def _report(self, job, text) -> None:
+        """Edit the "creating…" message, or send ``text`` if that fails."""
+        try:
+            if job["message_id"] is None:
+                raise ValueError("no message to edit")
+            await self.bot.edit_message_text(
+                text, chat_id=job["chat_id"], message_id=job["message_id"], parse_mode="HTML"
+            )
+            return
+        except (TelegramError, ValueError) as exc:
+            logger.warning("Issue job %s: editing message failed: %s", job["idempotency_key"], exc)
+        try:
+            await self.bot.send_message(job["chat_id"], text, parse_mode="HTML")
+        except TelegramError as exc:
+            logger.error("Issue job %s: reporting result failed: %s", job["idempotency_key"], exc)
+
+    def stats(self):
+        return dict(self._counts)
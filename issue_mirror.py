@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from config import Config
+from rate_limiter import TokenBucket
+from tracker_client import is_closed_status, parse_tracker_timestamp, status_display
+
+logger = logging.getLogger(__name__)
+
+# Callback data prefixes of the "My issues" page buttons (see handlers_issue).
+# Turning a page only reads the mirror, so it does not trigger a prefetch
+MY_ISSUES_NEXT_PREFIX = "my_issues_next_"
+MY_ISSUES_PREV_PREFIX = "my_issues_prev_"
+
+
+def mirror_row(issue: dict) -> dict:
+    """Return the fields of a Tracker issue kept in the local mirror."""
+    status = issue.get("status")
+    return {
+        "key": issue["key"],
+        "summary": issue.get("summary"),
+        "status": status_display(status),
+        "closed": is_closed_status(status),
+        "updated_at": parse_tracker_timestamp(issue.get("updatedAt")),
+    }
+
+
+def _telegram_user_id(issue: dict):
+    telegram_id = issue.get("telegramId")
+    try:
+        return int(telegram_id) if telegram_id else None
+    except (TypeError, ValueError):
+        return None
+
+
+async def reconcile_user(db, tracker, user_id: int) -> None:
+    """Bring the mirror of ``user_id`` in line with Tracker."""
+    # Issues written while the search is running must not be closed as missing
+    fetched_at = datetime.now(timezone.utc)
+    issues = await tracker.get_active_issues_by_telegram_id(user_id)
+    await db.sync_user_issues(user_id, [mirror_row(issue) for issue in issues], fetched_at)
+
+
+async def run_reconciliation(db, tracker, interval=None) -> None:
+    """Reconcile the mirror of every registered user forever.
+
+    The mirror is kept fresh by ``create_issue`` and the webhooks; this loop
+    only repairs drift, e.g. from webhooks lost while the bot was down.
+    A pass is spread evenly over ``interval``, so a restart does not fire
+    one Tracker search per user at once.
+    """
+    interval = interval or Config.ISSUE_RECONCILE_INTERVAL
+    while True:
+        try:
+            user_ids = await db.get_user_ids()
+        except Exception as exc:
+            logger.error("Issue mirror reconciliation could not list users: %s", exc)
+            await asyncio.sleep(interval)
+            continue
+        if not user_ids:
+            await asyncio.sleep(interval)
+            continue
+        step = interval / len(user_ids)
+        for user_id in user_ids:
+            await asyncio.sleep(step)
+            try:
+                await reconcile_user(db, tracker, user_id)
+            except Exception as exc:
+                logger.error("Issue mirror reconciliation failed for %s: %s", user_id, exc)
+        logger.info("Issue mirror reconciled for %d users", len(user_ids))
+
+
+SYNC_CURSOR_KEY = "issues_updated_at"
+
+
+async def sync_updated_issues(db, tracker, page_size=None) -> int:
+    """Copy issues changed since the stored cursor into the mirror.
+
+    Reads Tracker issues ordered by ``updatedAt`` with
+    :meth:`TrackerAPI.iter_issues_updated_since` and writes every page
+    together with the advanced cursor in one transaction, so an interrupted
+    pass resumes where it stopped.  The cursor is inclusive: issues sharing
+    the boundary timestamp are upserted again by the next pass.
+    Returns the number of processed issues.
+    """
+    page_size = page_size or Config.ISSUE_SYNC_PAGE_SIZE
+    cursor = await db.get_sync_state(SYNC_CURSOR_KEY)
+    processed = 0
+    async for issues in tracker.iter_issues_updated_since(cursor, per_page=page_size):
+        rows = [
+            {**mirror_row(issue), "user_id": _telegram_user_id(issue)}
+            for issue in issues
+        ]
+        cursor = max([cursor or ""] + [i.get("updatedAt") or "" for i in issues])
+        await db.apply_issue_changes(rows, SYNC_CURSOR_KEY, cursor)
+        processed += len(issues)
+    return processed
+
+
+async def run_incremental_sync(db, tracker, interval=None) -> None:
+    """Run :func:`sync_updated_issues` every ``interval`` seconds forever."""
+    interval = interval or Config.ISSUE_SYNC_INTERVAL
+    while True:
+        try:
+            processed = await sync_updated_issues(db, tracker)
+            if processed:
+                logger.info("Issue sync: %d changed issues applied", processed)
+        except Exception as exc:
+            logger.error("Issue sync failed: %s", exc)
+        await asyncio.sleep(interval)
+
+
+class IssuePrefetcher:
+    """Refresh the mirror of users who are interacting with the bot.
+
+    Every update of a user whose issue list is older than ``stale_after``
+    seconds schedules a background :func:`reconcile_user`, so "My issues"
+    opened a moment later is served from fresh data.  Prefetches run one
+    at a time and at most ``budget`` per minute for all users; when the
+    budget is spent the update is simply not prefetched.
+    """
+
+    def __init__(self, db, tracker, stale_after=None, budget=None, clock=time.monotonic):
+        self.db = db
+        self.tracker = tracker
+        self.stale_after = Config.ISSUE_PREFETCH_STALE if stale_after is None else stale_after
+        budget = budget or Config.ISSUE_PREFETCH_BUDGET
+        self._budget = TokenBucket("prefetch", budget / 60, capacity=budget, clock=clock)
+        self._clock = clock
+        self._refreshed: dict[int, float] = {}
+        self._pending: set[int] = set()
+        # Strong references: the event loop keeps only weak ones to tasks
+        self._tasks: set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+        self.prefetched = 0
+        self.skipped = 0
+
+    def is_fresh(self, user_id: int) -> bool:
+        refreshed = self._refreshed.get(user_id)
+        return refreshed is not None and self._clock() - refreshed < self.stale_after
+
+    def schedule(self, user_id: int):
+        """Start a background refresh of ``user_id`` if it is due.
+
+        Returns the created task or ``None`` when nothing was scheduled.
+        """
+        if user_id in self._pending or self.is_fresh(user_id):
+            return None
+        if not self._budget.try_reserve():
+            self.skipped += 1
+            return None
+        self._pending.add(user_id)
+        task = asyncio.create_task(self._prefetch(user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _prefetch(self, user_id: int) -> None:
+        try:
+            async with self._lock:
+                if not await self.db.get_user(user_id):
+                    # Unregistered users have no issues to show
+                    self._refreshed[user_id] = self._clock()
+                    return
+                await reconcile_user(self.db, self.tracker, user_id)
+                self._refreshed[user_id] = self._clock()
+                self.prefetched += 1
+        except Exception as exc:
+            logger.warning("Issue prefetch failed for %s: %s", user_id, exc)
+        finally:
+            self._pending.discard(user_id)
+            self._forget_expired()
+
+    def _forget_expired(self):
+        now = self._clock()
+        expired = [u for u, t in self._refreshed.items() if now - t >= self.stale_after]
+        for user_id in expired:
+            del self._refreshed[user_id]
+
+    def on_invalidation(self, kind: str, payload: dict) -> None:
+        """Handler for :meth:`Database.add_invalidation_handler`.
+
+        Another instance that has just reconciled a user's issues makes a
+        prefetch of the same user here redundant.
+        """
+        user_id = payload.get("user_id")
+        if kind == "issue" and payload.get("synced") and user_id is not None:
+            self._refreshed[user_id] = self._clock()
+
+    def stats(self):
+        return {
+            "tracked": len(self._refreshed),
+            "pending": len(self._pending),
+            "prefetched": self.prefetched,
+            "skipped": self.skipped,
+        }
+
+
+async def prefetch_on_activity(update, context) -> None:
+    """``TypeHandler`` callback scheduling a prefetch for the update's user.
+
+    Page turns of "My issues" are skipped: a reconcile in the middle of
+    paging would reorder the rows the page buttons point at."""
+    prefetcher = context.bot_data.get("prefetcher")
+    user = update.effective_user if update else None
+    query = update.callback_query if update else None
+    data = query.data if query is not None else None
+    if isinstance(data, str) and data.startswith((MY_ISSUES_NEXT_PREFIX, MY_ISSUES_PREV_PREFIX)):
+        return
+    if prefetcher is not None and user is not None:
+        prefetcher.schedule(user.id)
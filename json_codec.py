@@ -0,0 +1,55 @@
+"""JSON encoding shared by the Tracker client, webhook routes and n8n client.
+
+The fastest available backend is used: ``orjson``, then ``msgspec`` and
+finally the standard library.  ``JSON_CODEC`` forces a specific one.
+``dumps`` always returns UTF-8 ``bytes`` ready to be sent as a request body.
+"""
+
+import json
+import logging
+
+from config import Config
+
+try:  # pragma: no cover - depends on installed extras
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:  # pragma: no cover - depends on installed extras
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+
+
+def _stdlib_dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _stdlib_loads(data):
+    return json.loads(data)
+
+
+def _orjson_dumps(obj) -> bytes:
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _msgspec_codec():
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+    return encoder.encode, decoder.decode
+
+
+def get_codec(name="auto"):
+    """Return ``(backend_name, dumps, loads)`` for the requested backend."""
+    if name in ("auto", "orjson") and orjson is not None:
+        return "orjson", _orjson_dumps, orjson.loads
+    if name in ("auto", "msgspec") and msgspec is not None:
+        return ("msgspec", *_msgspec_codec())
+    if name not in ("auto", "json"):
+        logger.warning("JSON codec %s is not installed, using stdlib json", name)
+    return "json", _stdlib_dumps, _stdlib_loads
+
+
+BACKEND, dumps, loads = get_codec(Config.JSON_CODEC)
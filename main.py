@@ -8,7 +8,8 @@ import os
 import nest_asyncio
 import uvicorn
 from fastapi import FastAPI
-from telegram.ext import Application, ContextTypes
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
 from dotenv import load_dotenv
 from httpx import Limits
 from telegram.request import HTTPXRequest
@@ -20,8 +21,17 @@ import contextlib
 from config import Config
 from send_monitor import wait_pending_deletes
 from database import Database
+from persistence import PostgresPersistence
 from tracker_client import TrackerAPI
 from webhook_server import setup_webhook_routes
+from issue_mirror import (
+    IssuePrefetcher,
+    prefetch_on_activity,
+    run_incremental_sync,
+    run_reconciliation,
+)
+from catch_up import catch_up_missed_comments
+from issue_jobs import IssueJobQueue
 from messages import TELEGRAM_ERROR
 
 # Импорт регистраторов хендлеров
@@ -68,14 +78,38 @@ async def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--port", type=int, default=8000)
     parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        default=Config.TELEGRAM_LOCAL_MODE,
+        help="локальный сервер Bot API: файлы читаются прямо с его диска",
+    )
     args = parser.parse_args()
 
     logging.info("🔎 Запуск бота...")
 
+    # Подключение к БД откроется ниже; состояние диалогов PTB загрузит
+    # через persistence во время application.initialize()
+    db = Database()
+
     # ───── создаём Telegram‑Application ─────
+    builder = ApplicationBuilder().token(BOT_TOKEN)
+    if Config.TELEGRAM_API_URL:
+        # Собственный сервер telegram-bot-api вместо api.telegram.org;
+        # файлы без TELEGRAM_API_FILE_URL качались бы с api.telegram.org
+        if not Config.TELEGRAM_API_FILE_URL:
+            raise SystemExit(
+                "TELEGRAM_API_FILE_URL не задан и не выводится из TELEGRAM_API_URL "
+                "(ожидается адрес вида http://host:8081/bot)"
+            )
+        builder = builder.base_url(Config.TELEGRAM_API_URL)
+        builder = builder.base_file_url(Config.TELEGRAM_API_FILE_URL)
+    if args.local:
+        builder = builder.local_mode(True)
+        logging.info("📁 Локальный Bot API: файлы читаются с диска")
     application = (
-        ApplicationBuilder()
-        .token(BOT_TOKEN)
+        builder
+        .persistence(PostgresPersistence(db))
         .request(
             HTTPXRequest(
                 connection_pool_size=Config.TELEGRAM_POOL_SIZE,
@@ -96,7 +130,6 @@ async def main() -> None:
     application.add_error_handler(error_handler)
 
     # ───── подключаемся к БД ─────
-    db = Database()
     await db.connect()
     if not db._pool:
         logging.error("❌ Не удалось подключиться к PostgreSQL – выход")
@@ -114,13 +147,21 @@ async def main() -> None:
     # Делаем tracker и db доступными во всех хендлерах
     application.bot_data["tracker"] = tracker
     application.bot_data["db"] = db
+    prefetcher = IssuePrefetcher(db, tracker)
+    # Списки, уже сверенные другим инстансом, повторно не запрашиваем
+    db.add_invalidation_handler(prefetcher.on_invalidation)
+    application.bot_data["prefetcher"] = prefetcher
+    issue_jobs = IssueJobQueue(db, tracker, application.bot)
+    application.bot_data["issue_jobs"] = issue_jobs
 
     # ───── регистрируем хендлеры ─────
+    # Группа -1 видит все апдейты раньше остальных хендлеров
+    application.add_handler(TypeHandler(Update, prefetch_on_activity), group=-1)
     register_common_handlers(application)
     register_issue_handlers(application)
 
     # ───── FastAPI маршруты вебхука ─────
-    setup_webhook_routes(fastapi_app, application, tracker)
+    setup_webhook_routes(fastapi_app, application, tracker, db)
 
     logging.info("🤖 Бот (polling) и FastAPI‑webhook стартуют…")
 
@@ -133,6 +174,16 @@ async def main() -> None:
         await application.updater.start_polling()
         logging.info("✅ Бот запущен и ожидает события")
 
+        # Периодическая сверка локального зеркала задач с Tracker
+        reconcile_task = asyncio.create_task(run_reconciliation(db, tracker))
+        sync_task = asyncio.create_task(run_incremental_sync(db, tracker))
+        # Доставляем комментарии, пропущенные пока бот был остановлен
+        catch_up_task = asyncio.create_task(
+            catch_up_missed_comments(application, tracker, db)
+        )
+        # Задачи создаются в фоне из очереди issue_jobs
+        issue_jobs.start()
+
         server, server_task = await start_webhook_server(args.host, args.port)
         await server_task
         logging.info("✅ FastAPI сервер завершил работу")
@@ -141,6 +192,9 @@ async def main() -> None:
     finally:
         await application.updater.stop()
         logging.info("✅ Бот остановлен")
+        # Фоновые задачи редактируют сообщения через application.bot:
+        # дожидаемся их до остановки приложения
+        await issue_jobs.stop()
         await application.stop()
         await application.shutdown()
         if 'server' in locals():
@@ -150,6 +204,12 @@ async def main() -> None:
             with contextlib.suppress(Exception, asyncio.CancelledError, KeyboardInterrupt):
                 await server_task
             logging.info("✅ FastAPI сервер остановлен")
+        for name in ('reconcile_task', 'sync_task', 'catch_up_task'):
+            task = locals().get(name)
+            if task is not None:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
         await wait_pending_deletes()
         await tracker.close()
         await db.close()
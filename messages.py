@@ -17,16 +17,22 @@ TITLE_EMPTY = "❌ Заголовок не может быть пустым. П
 ENTER_ISSUE_DESCRIPTION = "📝 Введите описание задачи (или отправьте /skip):"
 ASK_FOR_ATTACHMENTS = "📎 Прикрепите фото или файл или нажмите 📤 Создать задачу:"
 UNSUPPORTED_FILE = "❌ Поддерживаются только фото или документы."
-FILES_UPLOADED = "📎 Загружено файлов: {count}. Добавьте ещё или нажмите 📤 Создать задачу."
+FILES_RECEIVED = "📎 Принято файлов: {count}. Добавьте ещё или нажмите 📤 Создать задачу."
 TELEGRAM_DOWNLOAD_FAILED = "❌ Не удалось получить файл из Telegram. Попробуйте снова."
 FILE_UPLOAD_FAILED = "❌ Не удалось загрузить файл. Попробуйте ещё раз…"
 FILE_TOO_LARGE = "❌ Размер файла превышает 50МБ."
-ALBUM_FILE_FAILED = "❌ Не удалось загрузить одно из фото. Отправьте альбом снова."
+ALBUM_PARTIAL_FAILED = (
+    "⚠️ Не удалось загрузить {failed} из {total} файлов альбома: {items}. "
+    "Остальные прикреплены — отправьте недостающие ещё раз."
+)
+ALBUM_ALL_FAILED = "❌ Не удалось загрузить ни одного файла альбома. Отправьте альбом ещё раз."
 
 ISSUE_CREATED = (
     "✅ Задача <a href='https://tracker.yandex.ru/{issue_key}'>{summary}</a> успешно создана!"
 )
 ISSUE_CREATION_ERROR = "❌ Ошибка при создании задачи. Попробуйте позже."
+ISSUE_CREATING = "⏳ Создаём задачу «{summary}»…"
+ISSUE_ALREADY_CREATING = "⏳ Эта задача уже создаётся — результат придёт в сообщение выше."
 
 COMMENT_PROMPT = "📝 Напишите комментарий или прикрепите файл…"
 NO_ISSUE_SELECTED = "❌ Сначала выберите задачу в списке."
@@ -36,6 +42,7 @@ COMMENT_ADDED = (
 
 NO_ISSUES = "📭 У вас нет задач."
 ISSUES_LIST = "📂 Ваши задачи:"
+ISSUES_LIST_PAGE = "📂 Ваши задачи, страница {page}:"
 
 TELEGRAM_ERROR = "⚠️ Ошибка связи с Telegram. Попробуйте ещё раз."
 
@@ -0,0 +1,198 @@
+"""Versioned schema migrations applied by ``Database.connect``.
+
+Each migration is a ``(version, name, statements)`` tuple.  Pending
+migrations run in version order, each in its own transaction, and are
+recorded in ``schema_migrations``.  A Postgres advisory lock serialises
+instances starting at the same time.  Append new migrations to the end of
+:data:`MIGRATIONS`; never edit one that has been released.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key of the advisory lock held while migrating
+LOCK_KEY = 7_320_461_003
+
+MIGRATIONS = [
+    (
+        1,
+        "initial schema",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                user_id BIGINT PRIMARY KEY,
+                first_name TEXT,
+                last_name TEXT,
+                phone_number TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS issues (
+                id SERIAL PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                tracker_id TEXT NOT NULL
+            )
+            """,
+        ],
+    ),
+    (
+        2,
+        "issue mirror and sync cursors",
+        [
+            """
+            ALTER TABLE issues
+                ADD COLUMN IF NOT EXISTS summary TEXT,
+                ADD COLUMN IF NOT EXISTS status TEXT,
+                ADD COLUMN IF NOT EXISTS closed BOOLEAN NOT NULL DEFAULT FALSE,
+                ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+            """,
+        ],
+    ),
+    (
+        3,
+        "issue indexes",
+        [
+            # Older deployments could store an issue twice; keep a single row
+            """
+            DELETE FROM issues AS a USING issues AS b
+            WHERE a.tracker_id = b.tracker_id AND a.ctid < b.ctid
+            """,
+            "CREATE UNIQUE INDEX IF NOT EXISTS issues_tracker_id_key ON issues (tracker_id)",
+            "CREATE INDEX IF NOT EXISTS issues_user_id_idx ON issues (user_id)",
+            # "My issues": active issues of a user, newest first
+            """
+            CREATE INDEX IF NOT EXISTS issues_user_active_idx
+            ON issues (user_id, updated_at DESC) WHERE NOT closed
+            """,
+        ],
+    ),
+    (
+        4,
+        "bot persistence",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS bot_user_data (
+                user_id BIGINT PRIMARY KEY,
+                data JSONB NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS bot_chat_data (
+                chat_id BIGINT PRIMARY KEY,
+                data JSONB NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS bot_conversations (
+                name TEXT NOT NULL,
+                key TEXT NOT NULL,
+                state JSONB NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (name, key)
+            )
+            """,
+        ],
+    ),
+    (
+        5,
+        "issue creation jobs",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS issue_jobs (
+                id BIGSERIAL PRIMARY KEY,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                user_id BIGINT NOT NULL,
+                chat_id BIGINT NOT NULL,
+                message_id BIGINT,
+                payload JSONB NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                issue_key TEXT,
+                error TEXT,
+                run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS issue_jobs_due_idx
+            ON issue_jobs (run_after) WHERE status = 'pending'
+            """,
+        ],
+    ),
+    (
+        6,
+        "tracker update time of issues",
+        [
+            # updated_at is the local write time; this is updatedAt from Tracker
+            "ALTER TABLE issues ADD COLUMN IF NOT EXISTS tracker_updated_at TIMESTAMPTZ",
+            # Best guess until the next sync brings the Tracker value
+            "UPDATE issues SET tracker_updated_at = updated_at WHERE tracker_updated_at IS NULL",
+            """
+            ALTER TABLE issues
+                ALTER COLUMN tracker_updated_at SET DEFAULT now(),
+                ALTER COLUMN tracker_updated_at SET NOT NULL
+            """,
+        ],
+    ),
+    (
+        7,
+        "my issues index on tracker time",
+        [
+            # "My issues" pages by (tracker_updated_at, id), newest first
+            "DROP INDEX IF EXISTS issues_user_active_idx",
+            """
+            CREATE INDEX IF NOT EXISTS issues_user_active_idx
+            ON issues (user_id, tracker_updated_at DESC, id DESC) WHERE NOT closed
+            """,
+        ],
+    ),
+]
+
+
+async def applied_versions(conn) -> set:
+    rows = await conn.fetch("SELECT version FROM schema_migrations")
+    return {row["version"] for row in rows}
+
+
+async def migrate(conn, migrations=None) -> list:
+    """Apply pending ``migrations`` on ``conn``; return the applied versions."""
+    migrations = MIGRATIONS if migrations is None else migrations
+    await conn.execute("SELECT pg_advisory_lock($1)", LOCK_KEY)
+    try:
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """
+        )
+        done = await applied_versions(conn)
+        applied = []
+        for version, name, statements in sorted(migrations, key=lambda m: m[0]):
+            if version in done:
+                continue
+            async with conn.transaction():
+                for statement in statements:
+                    await conn.execute(statement)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                    version,
+                    name,
+                )
+            logger.info("Migration %d applied: %s", version, name)
+            applied.append(version)
+        return applied
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", LOCK_KEY)
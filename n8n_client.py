@@ -1,12 +1,16 @@
 import aiohttp
 import os
 
+import json_codec
+
 N8N_BASE_URL = os.getenv("N8N_BASE_URL")  # например, http://localhost:5678
 N8N_MESSAGE_WEBHOOK_URL = os.getenv(
     "N8N_MESSAGE_WEBHOOK_URL",
     "https://n8n.mxmit.ru/webhook-test/e6827a5f-d5d6-4d90-af48-d39186ea03e5",
 )
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+
 async def n8n_create_issue(title, description, telegram_id, attachments=None):
     url = f"{N8N_BASE_URL}/n8n/create_issue"
     payload = {
@@ -16,10 +20,10 @@ async def n8n_create_issue(title, description, telegram_id, attachments=None):
         "attachments": attachments or [],
     }
     async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload) as resp:
+        async with session.post(url, data=json_codec.dumps(payload), headers=JSON_HEADERS) as resp:
             if resp.status != 200:
                 raise Exception(await resp.text())
-            return await resp.json()
+            return await resp.json(loads=json_codec.loads)
 
 
 async def n8n_forward_message(message: str, user_id: int, chat_id: int, session_id: str):
@@ -34,11 +38,13 @@ async def n8n_forward_message(message: str, user_id: int, chat_id: int, session_
         "session_id": session_id,
     }
     async with aiohttp.ClientSession() as session:
-        async with session.post(N8N_MESSAGE_WEBHOOK_URL, json=payload) as resp:
+        async with session.post(
+            N8N_MESSAGE_WEBHOOK_URL, data=json_codec.dumps(payload), headers=JSON_HEADERS
+        ) as resp:
             if resp.status != 200:
                 raise Exception(await resp.text())
             try:
-                return await resp.json()
+                return await resp.json(loads=json_codec.loads)
             except Exception:
                 return await resp.text()
 
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+from enum import Enum
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from config import Config
+import json_codec
+import states
+
+logger = logging.getLogger(__name__)
+
+UPSERT_USER_DATA = """
+INSERT INTO bot_user_data (user_id, data) VALUES ($1, $2::jsonb)
+ON CONFLICT (user_id) DO UPDATE SET data = EXCLUDED.data, updated_at = now()
+"""
+UPSERT_CHAT_DATA = """
+INSERT INTO bot_chat_data (chat_id, data) VALUES ($1, $2::jsonb)
+ON CONFLICT (chat_id) DO UPDATE SET data = EXCLUDED.data, updated_at = now()
+"""
+UPSERT_CONVERSATION = """
+INSERT INTO bot_conversations (name, key, state) VALUES ($1, $2, $3::jsonb)
+ON CONFLICT (name, key) DO UPDATE SET state = EXCLUDED.state, updated_at = now()
+"""
+DELETE_USER_DATA = "DELETE FROM bot_user_data WHERE user_id = ANY($1::bigint[])"
+DELETE_CHAT_DATA = "DELETE FROM bot_chat_data WHERE chat_id = ANY($1::bigint[])"
+DELETE_CONVERSATION = "DELETE FROM bot_conversations WHERE name = $1 AND key = $2"
+
+# Conversation states are members of the enums in ``states``
+_STATE_ENUMS = {
+    name: value
+    for name, value in vars(states).items()
+    if isinstance(value, type) and issubclass(value, Enum) and value is not Enum
+}
+
+
+def compact(data: dict) -> dict:
+    """Return the JSON-serialisable part of ``data``.
+
+    Runtime objects such as sent ``Message`` instances are dropped; they are
+    only useful while the process is alive.
+    """
+    result = {}
+    for key, value in data.items():
+        try:
+            json_codec.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        result[str(key)] = value
+    return result
+
+
+def encode_state(state):
+    if isinstance(state, Enum):
+        return {"enum": type(state).__name__, "name": state.name}
+    return state
+
+
+def decode_state(value):
+    if isinstance(value, dict) and "enum" in value:
+        return _STATE_ENUMS[value["enum"]][value["name"]]
+    return value
+
+
+class PostgresPersistence(BasePersistence):
+    """Stores conversation states, ``user_data`` and ``chat_data`` in Postgres.
+
+    PTB hands over changed entries every ``update_interval`` seconds; they
+    are kept in memory and written together shortly afterwards with one
+    ``executemany`` per table in a single transaction, so handling an update
+    never waits for the database.  Only the :func:`compact` part of the
+    data is stored; ``bot_data`` and callback data are not persisted.
+    """
+
+    def __init__(self, db, update_interval=None, flush_delay=None):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, callback_data=False),
+            update_interval=Config.PERSISTENCE_INTERVAL if update_interval is None else update_interval,
+        )
+        self.db = db
+        self.flush_delay = Config.PERSISTENCE_FLUSH_DELAY if flush_delay is None else flush_delay
+        # id -> compact data, or None for a deleted entry
+        self._users: dict[int, dict | None] = {}
+        self._chats: dict[int, dict | None] = {}
+        self._conversations: dict[tuple[str, str], object] = {}
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+
+    # ─────────────────────────── loading ───────────────────────────
+
+    async def _load(self, query, *args):
+        async with self.db.connection() as conn:
+            if not conn:
+                return []
+            return await conn.fetch(query, *args)
+
+    async def get_user_data(self):
+        rows = await self._load("SELECT user_id, data FROM bot_user_data")
+        return {row["user_id"]: json_codec.loads(row["data"]) for row in rows}
+
+    async def get_chat_data(self):
+        rows = await self._load("SELECT chat_id, data FROM bot_chat_data")
+        return {row["chat_id"]: json_codec.loads(row["data"]) for row in rows}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        rows = await self._load("SELECT key, state FROM bot_conversations WHERE name = $1", name)
+        return {
+            tuple(json_codec.loads(row["key"])): decode_state(json_codec.loads(row["state"]))
+            for row in rows
+        }
+
+    # ─────────────────────────── buffering ─────────────────────────
+
+    async def update_user_data(self, user_id, data):
+        self._users[user_id] = compact(data)
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id, data):
+        self._chats[chat_id] = compact(data)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id):
+        self._users[user_id] = None
+        self._schedule_flush()
+
+    async def drop_chat_data(self, chat_id):
+        self._chats[chat_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name, key, new_state):
+        conversation_key = json_codec.dumps(list(key)).decode()
+        self._conversations[(name, conversation_key)] = new_state
+        self._schedule_flush()
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self._write()
+        except Exception as exc:
+            logger.error("Persisting bot state failed: %s", exc)
+
+    # ─────────────────────────── writing ───────────────────────────
+
+    @staticmethod
+    def _split(pending):
+        upserts = [(key, json_codec.dumps(data).decode()) for key, data in pending.items() if data]
+        deletes = [key for key, data in pending.items() if not data]
+        return upserts, deletes
+
+    async def _write(self):
+        async with self._flush_lock:
+            users, self._users = self._users, {}
+            chats, self._chats = self._chats, {}
+            conversations, self._conversations = self._conversations, {}
+            if not (users or chats or conversations):
+                return
+            try:
+                async with self.db.connection() as conn:
+                    if not conn:
+                        raise ConnectionError("database is not available")
+                    async with conn.transaction():
+                        for pending, upsert, delete in (
+                            (users, UPSERT_USER_DATA, DELETE_USER_DATA),
+                            (chats, UPSERT_CHAT_DATA, DELETE_CHAT_DATA),
+                        ):
+                            upserts, deletes = self._split(pending)
+                            if upserts:
+                                await conn.executemany(upsert, upserts)
+                            if deletes:
+                                await conn.execute(delete, deletes)
+                        states_rows = [
+                            (name, key, json_codec.dumps(encode_state(state)).decode())
+                            for (name, key), state in conversations.items()
+                            if state is not None
+                        ]
+                        if states_rows:
+                            await conn.executemany(UPSERT_CONVERSATION, states_rows)
+                        ended = [key for key, state in conversations.items() if state is None]
+                        if ended:
+                            await conn.executemany(DELETE_CONVERSATION, ended)
+            except Exception:
+                # Keep the changes for the next attempt unless newer ones arrived
+                self._users = {**users, **self._users}
+                self._chats = {**chats, **self._chats}
+                self._conversations = {**conversations, **self._conversations}
+                raise
+
+    async def flush(self):
+        """Write all buffered changes; called by PTB on shutdown."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._write()
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Longest pause taken from a Retry-After header, in seconds
+MAX_RETRY_AFTER = 300.0
+
+
+def parse_retry_after(value):
+    """Return ``Retry-After`` header value in seconds or ``None``.
+
+    Both forms allowed by RFC 9110 are supported: delay seconds and
+    an HTTP date.  The result is capped at ``MAX_RETRY_AFTER`` so a bogus
+    header (``inf``, a date years ahead) cannot stall the bucket.
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    if math.isnan(seconds):
+        return None
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
+
+
+class TokenBucket:
+    """Adaptive token bucket shared by all coroutines using it.
+
+    Tokens are reserved synchronously, so concurrent callers queue up in
+    arrival order without a lock: a negative balance is the debt of callers
+    already waiting.  A 429 response halves the rate (down to ``min_rate``)
+    and blocks the bucket for ``Retry-After`` seconds; every successful
+    response restores a small share of the configured rate.
+    """
+
+    RECOVERY_STEP = 0.05
+
+    def __init__(self, name, rate, capacity=None, min_rate=None, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.name = name
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.min_rate = float(min_rate or self.max_rate / 10)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self.throttled = 0
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Take one token and return how long the caller has to wait."""
+        now = self._clock()
+        self._refill(now)
+        self._tokens -= 1
+        delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        return max(delay, self._blocked_until - now)
+
+    def try_reserve(self):
+        """Take one token only if it is available right now."""
+        now = self._clock()
+        self._refill(now)
+        if self._tokens < 1 or self._blocked_until > now:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def acquire(self):
+        """Wait until a request may be sent.
+
+        The token is taken once, but a 429 seen while waiting blocks the
+        bucket again, so the block is re-checked after every sleep.
+        """
+        delay = self.reserve()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._blocked_until - self._clock()
+
+    def throttle(self, retry_after=None):
+        """Slow the bucket down after the server answered 429."""
+        now = self._clock()
+        self._refill(now)
+        self.throttled += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        pause = retry_after if retry_after is not None else 1 / self.rate
+        self._blocked_until = max(self._blocked_until, now + pause)
+        # Drop the burst allowance so waiters resume at the reduced rate
+        self._tokens = min(self._tokens, 0.0)
+        logger.warning(
+            "Tracker rate limit hit (%s): rate lowered to %.2f rps, pause %.2fs",
+            self.name,
+            self.rate,
+            pause,
+        )
+
+    def succeed(self):
+        """Gradually restore the configured rate after successful calls."""
+        if self.rate < self.max_rate:
+            now = self._clock()
+            self._refill(now)
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.RECOVERY_STEP)
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "max_rate": self.max_rate,
+            "throttled": self.throttled,
+        }
@@ -0,0 +1,52 @@
+import os
+import sys
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(os.path.dirname(__file__))
+
+import pytest
+import pytest_asyncio
+
+from fake_tracker import FakeTracker
+from tracker_client import TrackerAPI
+
+
+@pytest.fixture
+def make_db():
+    """Factory of ``Database`` mocks whose ``connection()`` yields ``conn``."""
+
+    def factory(conn):
+        db = MagicMock()
+
+        @asynccontextmanager
+        async def connection():
+            yield conn
+
+        db.connection = connection
+        db.create_issue = AsyncMock()
+        return db
+
+    return factory
+
+
+@pytest_asyncio.fixture
+async def fake_tracker():
+    """Running :class:`FakeTracker` without latency or injected errors."""
+    fake = FakeTracker(seed=0)
+    await fake.start()
+    try:
+        yield fake
+    finally:
+        await fake.close()
+
+
+@pytest_asyncio.fixture
+async def tracker_api(fake_tracker):
+    """Real ``TrackerAPI`` talking to ``fake_tracker``."""
+    api = TrackerAPI(fake_tracker.url, "TOKEN", org_id="ORG", queue="CRM")
+    try:
+        yield api
+    finally:
+        await api.close()
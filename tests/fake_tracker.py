@@ -0,0 +1,304 @@
+"""In-process stand-in for the Yandex Tracker API.
+
+Implements the endpoints used by ``TrackerAPI`` and the webhook server so the
+real client, its connection pool and multipart uploads can be exercised and
+benchmarked offline.  Latency, random errors and 429 responses are
+configurable at runtime::
+
+    fake = FakeTracker(latency=0.01, error_rate=0.05, rate_limit=50)
+    await fake.start()
+    api = TrackerAPI(fake.url, "TOKEN", queue="CRM")
+
+It can also be started standalone for manual load tests::
+
+    python tests/fake_tracker.py --port 8081 --latency 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from datetime import datetime, timezone
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "+0000"
+
+
+class FakeTracker:
+    """aiohttp application emulating the Tracker endpoints the bot uses.
+
+    Parameters
+    ----------
+    latency : float
+        Delay in seconds added to every request.
+    error_rate : float
+        Probability of answering ``500`` instead of handling a request.
+    rate_limit : int | None
+        Maximum number of requests per second; excess requests get ``429``
+        with a ``Retry-After`` header.
+    queue : str
+        Queue used for generated issue keys.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, rate_limit=None, queue="CRM", seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.queue = queue
+        self.issues: dict[str, dict] = {}
+        self.comments: dict[str, list[dict]] = {}
+        self.attachments: dict[str, dict] = {}
+        self.requests: list[tuple[str, str]] = []
+        self._failures: list[int] = []
+        self._window: list[float] = []
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._server: TestServer | None = None
+        self.app = self._build_app()
+
+    # ─────────────────────────── lifecycle ────────────────────────────
+
+    async def start(self, port=None):
+        self._server = TestServer(self.app, port=port)
+        await self._server.start_server()
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            await self._server.close()
+            self._server = None
+
+    @property
+    def url(self) -> str:
+        return str(self._server.make_url("")).rstrip("/")
+
+    def fail_next(self, status=500, count=1):
+        """Answer the next ``count`` requests with ``status``."""
+        self._failures.extend([status] * count)
+
+    # ─────────────────────────── fault injection ───────────────────────
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests.append((request.method, request.path))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if not request.headers.get("Authorization", "").startswith("OAuth "):
+            return web.json_response({"errorMessages": ["Unauthorized"]}, status=401)
+        if self._failures:
+            status = self._failures.pop(0)
+            headers = {"Retry-After": "0"} if status == 429 else None
+            return web.json_response({"errorMessages": ["injected"]}, status=status, headers=headers)
+        if self.rate_limit:
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 1]
+            if len(self._window) >= self.rate_limit:
+                retry_after = max(0.0, 1 - (now - self._window[0]))
+                return web.json_response(
+                    {"errorMessages": ["Too many requests"]},
+                    status=429,
+                    headers={"Retry-After": f"{retry_after:.3f}"},
+                )
+            self._window.append(now)
+        if self.error_rate and self._random.random() < self.error_rate:
+            return web.json_response({"errorMessages": ["random failure"]}, status=500)
+        return await handler(request)
+
+    # ─────────────────────────── handlers ──────────────────────────────
+
+    def _build_app(self):
+        app = web.Application(middlewares=[self._middleware], client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v2/issues/", self.create_issue)
+        app.router.add_post("/v2/issues/_search", self.search_issues)
+        app.router.add_get("/v2/issues/{key}", self.get_issue)
+        app.router.add_get("/v2/issues/{key}/comments", self.list_comments)
+        app.router.add_post("/v2/issues/{key}/comments", self.add_comment)
+        app.router.add_get("/v2/issues/{key}/comments/{comment_id}", self.get_comment)
+        app.router.add_post("/v2/attachments", self.upload_attachment)
+        app.router.add_post("/v2/attachments/", self.upload_attachment)
+        app.router.add_get("/v2/attachments/{attachment_id}/download", self.download_attachment)
+        return app
+
+    def _self_url(self, request, path):
+        return f"{request.scheme}://{request.host}{path}"
+
+    def _attachment_info(self, request, attachment_id):
+        att = self.attachments[attachment_id]
+        return {
+            "id": attachment_id,
+            "name": att["name"],
+            "mimetype": att["mimetype"],
+            "size": len(att["content"]),
+            "self": self._self_url(request, f"/v2/attachments/{attachment_id}"),
+            "content": self._self_url(request, f"/v2/attachments/{attachment_id}/download"),
+        }
+
+    async def create_issue(self, request):
+        data = await request.json()
+        if not data.get("summary"):
+            return web.json_response({"errorMessages": ["summary is required"]}, status=422)
+        unique = data.get("unique")
+        if unique and any(i.get("unique") == unique for i in self.issues.values()):
+            return web.json_response({"errorMessages": ["Issue already exists"]}, status=409)
+        key = f"{data.get('queue') or self.queue}-{next(self._ids)}"
+        now = _now()
+        issue = {
+            **{k: v for k, v in data.items() if k != "attachmentIds"},
+            "key": key,
+            "id": key,
+            "queue": {"key": data.get("queue") or self.queue},
+            "status": {"key": "open", "display": "Открыт"},
+            "createdAt": now,
+            "updatedAt": now,
+            "attachments": [
+                self._attachment_info(request, str(a))
+                for a in data.get("attachmentIds", [])
+                if str(a) in self.attachments
+            ],
+        }
+        self.issues[key] = issue
+        self.comments[key] = []
+        return web.json_response(issue, status=201)
+
+    async def get_issue(self, request):
+        issue = self.issues.get(request.match_info["key"])
+        if issue is None:
+            return web.json_response({"errorMessages": ["Issue not found"]}, status=404)
+        return web.json_response(issue)
+
+    async def search_issues(self, request):
+        data = await request.json()
+        filters = data.get("filter") or {}
+        result = []
+        for issue in self.issues.values():
+            queue = filters.get("queue")
+            if queue and issue["queue"]["key"] != queue:
+                continue
+            if not all(
+                self._matches(issue.get(field), value)
+                for field, value in filters.items()
+                if field != "queue"
+            ):
+                continue
+            result.append(issue)
+        order = data.get("order")
+        if order:
+            field = order.lstrip("+-")
+            result.sort(key=lambda i: str(i.get(field) or ""), reverse=order.startswith("-"))
+        if "perPage" in request.query:
+            per_page = int(request.query["perPage"])
+            page = int(request.query.get("page", 1))
+            result = result[(page - 1) * per_page:page * per_page]
+        return web.json_response(result)
+
+    @staticmethod
+    def _matches(actual, expected):
+        if isinstance(expected, dict):
+            # Range filter like {"from": ..., "to": ...} on timestamps
+            actual = str(actual or "")
+            return (
+                ("from" not in expected or actual >= expected["from"])
+                and ("to" not in expected or actual <= expected["to"])
+            )
+        return str(actual) == str(expected)
+
+    def touch(self, key, **fields):
+        """Update an issue server-side, e.g. to emulate a status change."""
+        self.issues[key].update(fields, updatedAt=_now())
+
+    async def list_comments(self, request):
+        key = request.match_info["key"]
+        if key not in self.issues:
+            return web.json_response({"errorMessages": ["Issue not found"]}, status=404)
+        expand = request.query.get("expand") == "attachments"
+        comments = self.comments[key]
+        if "id" in request.query:
+            # Keyset pagination: the page starts after the given comment
+            ids = [str(c["id"]) for c in comments]
+            after = request.query["id"]
+            comments = comments[ids.index(after) + 1:] if after in ids else []
+        if "perPage" in request.query:
+            comments = comments[:int(request.query["perPage"])]
+        return web.json_response([self._render_comment(request, c, expand) for c in comments])
+
+    async def add_comment(self, request):
+        key = request.match_info["key"]
+        if key not in self.issues:
+            return web.json_response({"errorMessages": ["Issue not found"]}, status=404)
+        data = await request.json()
+        comment = {
+            "id": next(self._ids),
+            "text": data.get("text", ""),
+            "createdAt": _now(),
+            "createdBy": {"display": "Bot", "login": "bot"},
+            "attachmentIds": [
+                str(a) for a in data.get("attachmentIds") or data.get("attachments") or []
+            ],
+        }
+        self.comments[key].append(comment)
+        self.issues[key]["updatedAt"] = comment["createdAt"]
+        return web.json_response(self._render_comment(request, comment, False), status=201)
+
+    async def get_comment(self, request):
+        key = request.match_info["key"]
+        comment_id = request.match_info["comment_id"]
+        for comment in self.comments.get(key, []):
+            if str(comment["id"]) == comment_id:
+                expand = request.query.get("expand") == "attachments"
+                return web.json_response(self._render_comment(request, comment, expand))
+        return web.json_response({"errorMessages": ["Comment not found"]}, status=404)
+
+    def _render_comment(self, request, comment, expand):
+        rendered = {k: v for k, v in comment.items() if k != "attachmentIds"}
+        if expand:
+            rendered["attachments"] = [
+                {
+                    "id": a,
+                    "fileName": self.attachments[a]["name"],
+                    "urls": {
+                        "download": self._self_url(request, f"/v2/attachments/{a}/download")
+                    },
+                }
+                for a in comment["attachmentIds"]
+                if a in self.attachments
+            ]
+        return rendered
+
+    async def upload_attachment(self, request):
+        reader = await request.multipart()
+        part = await reader.next()
+        if part is None or part.name != "file":
+            return web.json_response({"errorMessages": ["file is required"]}, status=400)
+        content = await part.read()
+        attachment_id = str(next(self._ids))
+        self.attachments[attachment_id] = {
+            "name": part.filename or "file",
+            "mimetype": part.headers.get("Content-Type", "application/octet-stream"),
+            "content": bytes(content),
+        }
+        return web.json_response(self._attachment_info(request, attachment_id), status=201)
+
+    async def download_attachment(self, request):
+        att = self.attachments.get(request.match_info["attachment_id"])
+        if att is None:
+            return web.json_response({"errorMessages": ["Attachment not found"]}, status=404)
+        return web.Response(body=att["content"], content_type=att["mimetype"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=None)
+    args = parser.parse_args()
+    fake = FakeTracker(args.latency, args.error_rate, args.rate_limit)
+    web.run_app(fake.app, host=args.host, port=args.port)
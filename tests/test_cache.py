@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from cache import MISSING, TTLCache
+
+
+def test_entries_expire_and_lru_is_evicted():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", None, ttl=1)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    now[0] = 2
+    assert cache.get("b") is MISSING
+
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    # "b" was the least recently used entry
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    now[0] = 20
+    assert cache.get("a") is MISSING
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+import webhook_server
+from catch_up import catch_up_missed_comments
+from tracker_client import tracker_timestamp
+from webhook_server import COMMENT_CURSOR_KEY, FAILED_COMMENT_PREFIX, process_comment_event
+
+
+def make_db(state):
+    db = MagicMock()
+    db.get_sync_state = AsyncMock(side_effect=lambda key: state.get(key))
+
+    async def advance_sync_state(key, value):
+        state[key] = max(state.get(key) or "", value)
+
+    db.advance_sync_state = AsyncMock(side_effect=advance_sync_state)
+
+    async def set_sync_state(key, value):
+        state[key] = value
+
+    async def delete_sync_states(keys):
+        for key in list(keys):
+            state.pop(key, None)
+
+    db.set_sync_state = AsyncMock(side_effect=set_sync_state)
+    db.get_sync_states = AsyncMock(
+        side_effect=lambda prefix: {k: v for k, v in state.items() if k.startswith(prefix)}
+    )
+    db.delete_sync_states = AsyncMock(side_effect=delete_sync_states)
+    db.upsert_issue = AsyncMock()
+    return db
+
+
+@pytest.fixture(autouse=True)
+def clear_processed_ids():
+    webhook_server.processed_comment_ids.clear()
+    yield
+    webhook_server.processed_comment_ids.clear()
+
+
+@pytest.mark.asyncio
+async def test_first_start_only_initialises_cursor(tracker_api):
+    state = {}
+    db = make_db(state)
+    application = MagicMock()
+    application.bot.send_message = AsyncMock()
+
+    assert await catch_up_missed_comments(application, tracker_api, db) == 0
+    assert state[COMMENT_CURSOR_KEY]
+    application.bot.send_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_missed_comments_are_delivered_once(tracker_api, fake_tracker):
+    issue = await tracker_api.create_issue("A", "", {"telegramId": "42"})
+    await tracker_api.create_issue("B", "", {})
+    await tracker_api.add_comment(issue["key"], "old")
+    # Tracker timestamps have millisecond precision
+    await asyncio.sleep(0.005)
+    state = {COMMENT_CURSOR_KEY: tracker_timestamp()}
+    await asyncio.sleep(0.005)
+    await tracker_api.add_comment(issue["key"], "new")
+    await tracker_api.add_comment(issue["key"], "reply\n---\n👤 Ivan\n---\n")
+
+    db = make_db(state)
+    application = MagicMock()
+    application.bot.send_message = AsyncMock()
+
+    assert await catch_up_missed_comments(application, tracker_api, db, concurrency=2) == 1
+    application.bot.send_message.assert_awaited_once()
+    assert application.bot.send_message.call_args.kwargs["chat_id"] == 42
+    assert "new" in application.bot.send_message.call_args.kwargs["text"]
+    assert state[COMMENT_CURSOR_KEY] == fake_tracker.comments[issue["key"]][1]["createdAt"]
+
+    # A second run (or a webhook for the same comment) does not resend it
+    application.bot.send_message.reset_mock()
+    assert await catch_up_missed_comments(application, tracker_api, db) == 0
+    application.bot.send_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_failed_delivery_keeps_cursor_before_it(tracker_api, fake_tracker):
+    first = await tracker_api.create_issue("A", "", {"telegramId": "1"})
+    second = await tracker_api.create_issue("B", "", {"telegramId": "2"})
+    state = {COMMENT_CURSOR_KEY: tracker_timestamp()}
+    await asyncio.sleep(0.005)
+    await tracker_api.add_comment(first["key"], "lost")
+    await asyncio.sleep(0.005)
+    await tracker_api.add_comment(second["key"], "later")
+    since = state[COMMENT_CURSOR_KEY]
+
+    db = make_db(state)
+    application = MagicMock()
+
+    async def send_message(chat_id, **kwargs):
+        if chat_id == 1:
+            raise RuntimeError("telegram is down")
+
+    application.bot.send_message = AsyncMock(side_effect=send_message)
+
+    # The later comment is delivered, but the cursor must not pass the
+    # failed one, which is delivered again on the next run
+    assert await catch_up_missed_comments(application, tracker_api, db, concurrency=2) == 1
+    assert state[COMMENT_CURSOR_KEY] == since
+
+    application.bot.send_message = AsyncMock()
+    assert await catch_up_missed_comments(application, tracker_api, db) == 1
+    assert application.bot.send_message.call_args.kwargs["chat_id"] == 1
+    assert state[COMMENT_CURSOR_KEY] == fake_tracker.comments[second["key"]][0]["createdAt"]
+
+
+@pytest.mark.asyncio
+async def test_bot_attachment_comments_are_not_replayed(tracker_api, fake_tracker):
+    issue = await tracker_api.create_issue("A", "", {"telegramId": "42"})
+    state = {COMMENT_CURSOR_KEY: tracker_timestamp()}
+    await asyncio.sleep(0.005)
+    await tracker_api.add_attachment_comment(issue["key"], "1")
+    await tracker_api.add_comment(issue["key"], "answer")
+
+    db = make_db(state)
+    application = MagicMock()
+    application.bot.send_message = AsyncMock()
+
+    assert await catch_up_missed_comments(application, tracker_api, db) == 1
+    assert "answer" in application.bot.send_message.call_args.kwargs["text"]
+
+
+@pytest.mark.asyncio
+async def test_failed_webhook_is_replayed_after_a_later_one_moves_the_cursor(
+    tracker_api, fake_tracker
+):
+    issue = await tracker_api.create_issue("A", "", {"telegramId": "7"})
+    state = {COMMENT_CURSOR_KEY: tracker_timestamp()}
+    await asyncio.sleep(0.005)
+    await tracker_api.add_comment(issue["key"], "lost")
+    await asyncio.sleep(0.005)
+    await tracker_api.add_comment(issue["key"], "later")
+    lost, later = fake_tracker.comments[issue["key"]]
+    db = make_db(state)
+    application = MagicMock()
+
+    def event(comment):
+        return {
+            "event": "commentCreated",
+            "issue": {"key": issue["key"], "telegramId": "7"},
+            "comment": {**comment, "createdBy": {"display": "Ivan"}},
+        }
+
+    application.bot.send_message = AsyncMock(side_effect=RuntimeError("telegram is down"))
+    assert (await process_comment_event(application, tracker_api, event(lost), db))["status"] == "error"
+    application.bot.send_message = AsyncMock()
+    assert (await process_comment_event(application, tracker_api, event(later), db))["status"] == "ok"
+    # The cursor has passed the failed comment, which is recorded separately
+    assert state[COMMENT_CURSOR_KEY] == later["createdAt"]
+    assert state[f"{FAILED_COMMENT_PREFIX}{lost['id']}"] == lost["createdAt"]
+
+    webhook_server.processed_comment_ids.clear()
+    application.bot.send_message.reset_mock()
+    assert await catch_up_missed_comments(application, tracker_api, db) == 1
+    assert "lost" in application.bot.send_message.call_args.kwargs["text"]
+    assert not any(key.startswith(FAILED_COMMENT_PREFIX) for key in state)
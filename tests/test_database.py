@@ -1,11 +1,25 @@
+import asyncio
 import os
+from datetime import datetime, timezone
 import sys
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 import pytest
-from database import Database
+import json_codec
+from config import Config
+from database import CLOSE_MISSING_ISSUES, GET_USER, NOTIFY, REOPEN_ISSUE, Database
+
+
+def make_db(conn):
+    db = Database()
+    db._pool = MagicMock()
+    db._pool.acquire = AsyncMock(return_value=conn)
+    db._pool.release = AsyncMock()
+    return db
+
 
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
@@ -13,33 +27,27 @@ from database import Database
     [
         ("get_user", "fetchrow", (1,)),
         ("register_user", "execute", (1, "a", "b", "c")),
-        ("create_issue", "execute", (1, "ISSUE-1")),
+        ("create_issue", "executemany", (1, "ISSUE-1")),
         ("get_user_issues", "fetch", (1,)),
+        ("get_active_user_issues", "fetch", (1,)),
+        ("upsert_issue", "execute", ("ISSUE-1", "s")),
     ],
 )
-async def test_release_called_on_exception(monkeypatch, method_name, conn_method, args):
-    db = Database()
+async def test_release_called_on_exception(method_name, conn_method, args):
     conn = MagicMock()
     setattr(conn, conn_method, AsyncMock(side_effect=Exception("boom")))
-    db._pool = MagicMock()
-    db._pool.release = AsyncMock()
-
-    async def fake_ensure_connection():
-        return conn
-
-    monkeypatch.setattr(db, "ensure_connection", fake_ensure_connection)
+    db = make_db(conn)
 
     with pytest.raises(Exception):
         await getattr(db, method_name)(*args)
 
+    db._pool.acquire.assert_awaited_once_with(timeout=Config.DB_ACQUIRE_TIMEOUT)
     db._pool.release.assert_called_once_with(conn)
 
 
 @pytest.mark.asyncio
 async def test_no_release_when_no_connection(monkeypatch):
-    db = Database()
-    db._pool = MagicMock()
-    db._pool.release = AsyncMock()
+    db = make_db(MagicMock())
 
     async def fake_ensure_connection():
         return None
@@ -48,5 +56,225 @@ async def test_no_release_when_no_connection(monkeypatch):
 
     result = await db.get_user(1)
     assert result is None
+    db._pool.acquire.assert_not_called()
     db._pool.release.assert_not_called()
 
+
+@pytest.mark.asyncio
+async def test_acquire_timeout_is_raised():
+    db = make_db(MagicMock())
+    db._pool.acquire = AsyncMock(side_effect=asyncio.TimeoutError)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await db.get_user(1)
+    db._pool.release.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_upsert_issue_inserts_missing_row():
+    conn = MagicMock()
+    conn.execute = AsyncMock(side_effect=["UPDATE 0", "INSERT 0 1", "SELECT 1"])
+    db = make_db(conn)
+
+    await db.upsert_issue("ISSUE-1", summary="s", status="Открыт", closed=False, user_id=7)
+
+    assert conn.execute.await_count == 3
+    insert_args = conn.execute.call_args_list[1].args
+    assert insert_args[1:] == (7, "ISSUE-1", "s", "Открыт", False, None)
+    db._pool.release.assert_called_once_with(conn)
+
+
+@pytest.mark.asyncio
+async def test_get_user_is_cached_including_misses():
+    conn = MagicMock()
+    conn.fetchrow = AsyncMock(side_effect=[{"first_name": "a"}, None])
+    conn.execute = AsyncMock()
+    db = make_db(conn)
+
+    assert await db.get_user(1) == {"first_name": "a"}
+    assert await db.get_user(1) == {"first_name": "a"}
+    assert await db.get_user(2) is None
+    assert await db.get_user(2) is None
+    assert conn.fetchrow.await_count == 2
+
+    # register_user writes through, replacing the negative entry
+    await db.register_user(2, "b", "c", "d")
+    assert (await db.get_user(2))["first_name"] == "b"
+    assert conn.fetchrow.await_count == 2
+
+    db.invalidate_user(1)
+    conn.fetchrow = AsyncMock(return_value={"first_name": "x"})
+    assert await db.get_user(1) == {"first_name": "x"}
+
+
+@pytest.mark.asyncio
+async def test_writes_notify_and_foreign_notifications_invalidate():
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    db = make_db(conn)
+
+    await db.register_user(5, "a", "b", "c")
+    query, channel, payload = conn.execute.call_args.args
+    assert query == NOTIFY and channel == Config.DB_NOTIFY_CHANNEL
+    message = json_codec.loads(payload)
+    assert message["kind"] == "user" and message["ids"] == [5]
+
+    seen = []
+    db.add_invalidation_handler(lambda kind, data: seen.append(kind))
+
+    # Own notifications are ignored, the cache is already up to date
+    db._on_notification(None, 1, channel, payload)
+    assert db.user_cache.get(5)["first_name"] == "a"
+    assert seen == []
+
+    other = json_codec.dumps({"origin": "other", "kind": "user", "ids": [5]}).decode()
+    db._on_notification(None, 1, channel, other)
+    assert len(db.user_cache) == 0
+    assert seen == ["user"]
+
+
+@pytest.mark.asyncio
+async def test_create_issue_batches_concurrent_inserts():
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    conn.executemany = AsyncMock()
+    db = make_db(conn)
+
+    await asyncio.gather(*(db.create_issue(1, f"ISSUE-{n}") for n in range(3)))
+
+    conn.executemany.assert_awaited_once()
+    assert [row[1] for row in conn.executemany.call_args.args[1]] == ["ISSUE-0", "ISSUE-1", "ISSUE-2"]
+    db._pool.release.assert_called_once_with(conn)
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_only_fails_the_bad_row():
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+
+    async def executemany(query, rows):
+        if any(row[1] == "BAD" for row in rows):
+            raise ValueError("bad row")
+
+    conn.executemany = AsyncMock(side_effect=executemany)
+    db = make_db(conn)
+
+    results = await asyncio.gather(
+        db.create_issue(1, "ISSUE-1"), db.create_issue(1, "BAD"), return_exceptions=True
+    )
+    assert results[0] is None
+    assert isinstance(results[1], ValueError)
+
+
+@pytest.mark.asyncio
+async def test_query_timings_and_slow_log_redact_params(caplog):
+    conn = MagicMock()
+    conn.fetchrow = AsyncMock(return_value=None)
+    db = make_db(conn)
+    db.timings.slow_threshold = 0.1
+
+    await db.get_user(1)
+    db.timings.record_query(
+        SimpleNamespace(query=GET_USER, args=(123456789,), elapsed=0.2, exception=None)
+    )
+    db.timings.record_query(
+        SimpleNamespace(query=GET_USER, args=("secret",), elapsed=0.001, exception=ValueError())
+    )
+
+    stats = db.query_stats()
+    assert stats["pool_wait"]["count"] == 1
+    user_stats = stats["statements"]["GET_USER"]
+    assert user_stats["count"] == 2 and user_stats["errors"] == 1
+    assert user_stats["buckets"]["250"] == 1 and user_stats["buckets"]["1"] == 1
+    assert "123456789" not in caplog.text
+    assert '"statement":"GET_USER"' in caplog.text and "<int>" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_until_own_write_and_fail_over():
+    primary = MagicMock()
+    primary.fetch = AsyncMock(return_value=[{"tracker_id": "P-1"}])
+    primary.execute = AsyncMock()
+    primary.executemany = AsyncMock()
+    db = make_db(primary)
+    replica_conn = MagicMock()
+    replica_conn.fetch = AsyncMock(return_value=[{"tracker_id": "R-1"}])
+    replica = MagicMock()
+    replica.acquire = AsyncMock(return_value=replica_conn)
+    replica.release = AsyncMock()
+    db._replicas = [replica]
+
+    assert await db.get_user_issues(1) == ["R-1"]
+
+    # Read-your-writes: the user's own reads stick to the primary
+    await db.create_issue(1, "P-1")
+    assert await db.get_user_issues(1) == ["P-1"]
+    assert await db.get_user_issues(2) == ["R-1"]
+
+    replica.acquire = AsyncMock(side_effect=OSError("replica down"))
+    assert await db.get_user_issues(3) == ["P-1"]
+    # The failed replica is skipped without another attempt
+    assert await db.get_user_issues(4) == ["P-1"]
+    replica.acquire.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_replica_down_at_startup_is_reconnected(monkeypatch):
+    primary = MagicMock()
+    primary.fetch = AsyncMock(return_value=[{"tracker_id": "P-1"}])
+    db = make_db(primary)
+    replica_conn = MagicMock()
+    replica_conn.fetch = AsyncMock(return_value=[{"tracker_id": "R-1"}])
+    replica = MagicMock()
+    replica.acquire = AsyncMock(return_value=replica_conn)
+    replica.release = AsyncMock()
+    monkeypatch.setattr(Config, "DB_REPLICA_DSNS", ["postgres://replica"])
+    monkeypatch.setattr(Config, "DB_REPLICA_RETRY", 0)
+    db._create_pool = AsyncMock(side_effect=[OSError("replica down"), replica])
+
+    await db._connect_replicas()
+    assert db._replicas == [None]
+
+    # Once the retry delay is over, a read starts a background reconnect
+    # and is itself served by the primary
+    assert await db.get_user_issues(2) == ["P-1"]
+    await db._replica_tasks[0]
+    assert db._replicas == [replica]
+    db._create_pool.assert_awaited_with(dsn="postgres://replica")
+    assert await db.get_user_issues(2) == ["R-1"]
+
+
+@pytest.mark.asyncio
+async def test_sync_user_issues_only_closes_rows_older_than_the_fetch():
+    conn = MagicMock()
+    conn.execute = AsyncMock(return_value="UPDATE 1")
+    conn.transaction = MagicMock(return_value=AsyncMock())
+    db = make_db(conn)
+    fetched_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    updated_at = datetime(2025, 12, 31, tzinfo=timezone.utc)
+
+    await db.sync_user_issues(
+        1, [{"key": "CRM-1", "summary": "s", "status": "Открыт", "updated_at": updated_at}], fetched_at
+    )
+
+    reopen = next(c.args for c in conn.execute.call_args_list if c.args[0] == REOPEN_ISSUE)
+    assert reopen[1:] == ("CRM-1", "s", "Открыт", updated_at)
+    close = next(c.args for c in conn.execute.call_args_list if c.args[0] == CLOSE_MISSING_ISSUES)
+    assert close[1:] == (1, ["CRM-1"], fetched_at)
+    # Rows are compared by the Tracker change time, not the local write time
+    assert "tracker_updated_at < $3" in CLOSE_MISSING_ISSUES
+
+
+@pytest.mark.asyncio
+async def test_failed_migration_closes_the_new_pool():
+    db = Database()
+    pool = MagicMock()
+    pool.close = AsyncMock()
+    db._create_pool = AsyncMock(return_value=pool)
+    db._ensure_schema = AsyncMock(side_effect=Exception("migration failed"))
+
+    await db.connect()
+
+    assert db._pool is None
+    pool.close.assert_awaited_once()
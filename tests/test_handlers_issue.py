@@ -1,6 +1,7 @@
 import os
 import sys
 import asyncio
+import tempfile
 from unittest.mock import AsyncMock, MagicMock, ANY
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
@@ -11,12 +12,27 @@ from handlers_issue import (
     confirm_issue_creation,
     handle_attachment,
     _process_album_later,
+    handle_photo_or_album,
     process_comment,
     my_issues,
     start_create_issue,
     _album_buffer,
+    _album_full,
+    _album_last_seen,
+    _start_upload,
+    _wait_for_uploads,
+    _file_cache,
+    upload_cache_stats,
+    upload_file,
+)
+from messages import (
+    ALBUM_ALL_FAILED,
+    FILE_TOO_LARGE,
+    ISSUE_ALREADY_CREATING,
+    ISSUE_CREATING,
+    ISSUE_CREATION_ERROR,
+    NOT_REGISTERED,
 )
-from messages import NOT_REGISTERED, FILE_TOO_LARGE
 from states import IssueStates
 from telegram.ext import ConversationHandler
 from telegram.error import BadRequest
@@ -59,8 +75,134 @@ async def test_confirm_issue_creation_extra_fields(monkeypatch):
     assert extra[Config.PRODUCT_CUSTOM_FIELD] == Config.PRODUCT_DEFAULT
 
 
+@pytest.mark.asyncio
+async def test_confirm_issue_creation_waits_for_pending_uploads(monkeypatch):
+    update = MagicMock()
+    update.effective_user = MagicMock(id=1, first_name="A", last_name=None, username=None)
+    update.callback_query.answer = AsyncMock()
+    monkeypatch.setattr(sys.modules["handlers_issue"], "safe_reply_text", AsyncMock())
+
+    context = MagicMock()
+    context.user_data = {"issue_title": "Title", "attachments": [1]}
+    db = MagicMock()
+    db.get_user = AsyncMock(return_value={})
+    db.create_issue = AsyncMock()
+    tracker = MagicMock()
+    tracker.create_issue = AsyncMock(return_value={"key": "ISSUE-1"})
+    context.bot_data = {"db": db, "tracker": tracker}
+
+    async def slow_upload():
+        await asyncio.sleep(0.01)
+        return [2, 3]
+
+    _start_upload(context, 1, slow_upload(), "failed")
+    await confirm_issue_creation(update, context)
+
+    assert tracker.create_issue.call_args.args[2]["attachmentIds"] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_confirm_issue_creation_submits_job(monkeypatch):
+    update = MagicMock()
+    update.effective_user = MagicMock(id=1, first_name="A", last_name=None, username=None)
+    update.callback_query.answer = AsyncMock()
+    update.callback_query.message.chat_id = 10
+    events = []
+
+    async def reply(message, text, **kwargs):
+        events.append("reply")
+        return MagicMock(chat_id=10, message_id=20)
+
+    monkeypatch.setattr(sys.modules["handlers_issue"], "safe_reply_text", reply)
+
+    context = MagicMock()
+    context.user_data = {"issue_title": "Title", "draft_id": "d1"}
+    db = MagicMock()
+
+    async def get_user(user_id):
+        events.append("get_user")
+        return {}
+
+    db.get_user = get_user
+    tracker = MagicMock()
+    tracker.create_issue = AsyncMock()
+    jobs = MagicMock()
+    jobs.submit = AsyncMock(return_value=True)
+    context.bot_data = {"db": db, "tracker": tracker, "issue_jobs": jobs}
+
+    state = await confirm_issue_creation(update, context)
+
+    assert state == ConversationHandler.END
+    # The user is answered before the draft is assembled
+    assert events == ["reply", "get_user"]
+    tracker.create_issue.assert_not_called()
+    key, user_id, chat_id, message_id, payload = jobs.submit.call_args.args
+    assert (key, user_id, chat_id, message_id) == ("1:d1", 1, 10, 20)
+    assert payload["title"] == "Title"
+    assert payload["extra_fields"]["telegramId"] == "1"
+    assert context.user_data == {}
+
+
+@pytest.mark.asyncio
+async def test_confirm_issue_creation_keeps_draft_when_submit_fails(monkeypatch):
+    update = MagicMock()
+    update.effective_user = MagicMock(id=1, first_name="A", last_name=None, username=None)
+    update.callback_query.answer = AsyncMock()
+    message = MagicMock(chat_id=10, message_id=20)
+    message.edit_text = AsyncMock()
+    monkeypatch.setattr(
+        sys.modules["handlers_issue"], "safe_reply_text", AsyncMock(return_value=message)
+    )
+
+    context = MagicMock()
+    draft = {"issue_title": "Title", "draft_id": "d1", "attachments": [5]}
+    context.user_data = dict(draft)
+    db = MagicMock()
+    db.get_user = AsyncMock(return_value={})
+    jobs = MagicMock()
+    jobs.submit = AsyncMock(side_effect=ConnectionError("database is not available"))
+    context.bot_data = {"db": db, "tracker": MagicMock(), "issue_jobs": jobs}
+
+    state = await confirm_issue_creation(update, context)
+
+    assert state == IssueStates.waiting_for_attachment
+    assert message.edit_text.call_args.args[0] == ISSUE_CREATION_ERROR
+    # The draft and its key survive, so a retry submits the same job
+    assert {k: context.user_data[k] for k in draft} == draft
+
+
+@pytest.mark.asyncio
+async def test_confirm_issue_creation_reports_duplicate_submit(monkeypatch):
+    update = MagicMock()
+    update.effective_user = MagicMock(id=1, first_name="A", last_name=None, username=None)
+    update.callback_query.answer = AsyncMock()
+    message = MagicMock(chat_id=10, message_id=21)
+    message.edit_text = AsyncMock()
+    reply = AsyncMock(return_value=message)
+    monkeypatch.setattr(sys.modules["handlers_issue"], "safe_reply_text", reply)
+
+    context = MagicMock()
+    # The title may be gone from a stale draft; it must not break escaping
+    context.user_data = {"draft_id": "d1"}
+    db = MagicMock()
+    db.get_user = AsyncMock(return_value={})
+    jobs = MagicMock()
+    jobs.submit = AsyncMock(return_value=False)
+    context.bot_data = {"db": db, "tracker": MagicMock(), "issue_jobs": jobs}
+
+    state = await confirm_issue_creation(update, context)
+
+    assert state == ConversationHandler.END
+    assert reply.call_args.args[1] == ISSUE_CREATING.format(summary="")
+    # The first submit owns the result; this message says so instead of
+    # staying at "creating…" forever
+    message.edit_text.assert_awaited_once_with(ISSUE_ALREADY_CREATING)
+    assert context.user_data == {}
+
+
 @pytest.mark.asyncio
 async def test_handle_attachment_document_extension(monkeypatch):
+    monkeypatch.setattr(Config, "UPLOAD_MEMORY_THRESHOLD", 0)
     update = MagicMock()
     message = MagicMock()
     update.message = message
@@ -97,7 +239,9 @@ async def test_handle_attachment_document_extension(monkeypatch):
     monkeypatch.setattr(os, "remove", lambda *_: None)
 
     await handle_attachment(update, context)
+    await _wait_for_uploads(context.user_data)
 
+    assert context.user_data["attachments"] == [1]
     upload_path = tracker.upload_file.call_args.args[0]
     assert upload_path.endswith(".pdf")
     assert tracker.upload_file.call_args.args[1] == "file.pdf"
@@ -136,6 +280,7 @@ async def test_handle_attachment_too_large(monkeypatch):
 
 @pytest.mark.asyncio
 async def test_process_album_later_passes_filename(monkeypatch):
+    monkeypatch.setattr(Config, "UPLOAD_MEMORY_THRESHOLD", 0)
     msg = MagicMock()
     file = MagicMock()
     file.file_unique_id = "uid"
@@ -168,15 +313,62 @@ async def test_process_album_later_passes_filename(monkeypatch):
     context.user_data = {}
 
     monkeypatch.setattr(asyncio, "sleep", AsyncMock())
+    monkeypatch.setattr(Config, "ALBUM_QUIET_PERIOD", 0.01)
     monkeypatch.setattr(os, "remove", lambda *_: None)
 
     await _process_album_later("gid", context)
+    await _wait_for_uploads(context.user_data)
 
     assert tracker.upload_file.call_args.args[1] == "orig.jpg"
 
 
+def album_update(gid):
+    update = MagicMock()
+    update.message.media_group_id = gid
+    return update
+
+
+@pytest.fixture
+def clean_albums():
+    yield
+    for state in (_album_buffer, _album_last_seen, _album_full):
+        state.pop("g1", None)
+        state.pop("g2", None)
+
+
+@pytest.mark.asyncio
+async def test_album_quiet_period_restarts_on_new_items(monkeypatch, clean_albums):
+    monkeypatch.setattr(Config, "ALBUM_QUIET_PERIOD", 0.05)
+    monkeypatch.setattr(Config, "ALBUM_MAX_WAIT", 5)
+    process = AsyncMock()
+    monkeypatch.setattr(sys.modules["handlers_issue"], "_process_album_later", process)
+
+    await handle_photo_or_album(album_update("g1"), MagicMock())
+    waiter = asyncio.create_task(sys.modules["handlers_issue"]._wait_for_album("g1"))
+    await asyncio.sleep(0.03)
+    await handle_photo_or_album(album_update("g1"), MagicMock())
+    await asyncio.sleep(0.03)
+    # 60 ms after the first item, but only 30 ms after the second
+    assert not waiter.done()
+    await asyncio.wait_for(waiter, 1)
+
+
+@pytest.mark.asyncio
+async def test_full_album_is_processed_immediately(monkeypatch, clean_albums):
+    monkeypatch.setattr(Config, "ALBUM_QUIET_PERIOD", 10)
+    monkeypatch.setattr(sys.modules["handlers_issue"], "_process_album_later", AsyncMock())
+
+    await handle_photo_or_album(album_update("g2"), MagicMock())
+    waiter = asyncio.create_task(sys.modules["handlers_issue"]._wait_for_album("g2"))
+    for _ in range(9):
+        await handle_photo_or_album(album_update("g2"), MagicMock())
+    await asyncio.wait_for(waiter, 0.5)
+    assert len(_album_buffer["g2"]) == 10
+
+
 @pytest.mark.asyncio
 async def test_process_comment_passes_filename(monkeypatch):
+    monkeypatch.setattr(Config, "UPLOAD_MEMORY_THRESHOLD", 0)
     update = MagicMock()
     message = MagicMock()
     update.message = message
@@ -296,6 +488,7 @@ async def test_my_issues_clears_user_data(monkeypatch):
     context.user_data = {"tmp": "data"}
     db = MagicMock()
     db.get_user = AsyncMock(return_value={"id": 1})
+    db.get_active_user_issues = AsyncMock(return_value=[])
     tracker = MagicMock()
     tracker.get_active_issues_by_telegram_id = AsyncMock(return_value=[])
     context.bot_data = {"db": db, "tracker": tracker}
@@ -360,3 +553,269 @@ async def test_start_create_issue_edit_missing(monkeypatch):
 
     assert result == IssueStates.waiting_for_title
     send_mock.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_my_issues_rendered_from_local_mirror(monkeypatch):
+    update = MagicMock()
+    update.message = MagicMock()
+    update.callback_query = None
+    update.effective_user = MagicMock(id=1)
+    reply_mock = AsyncMock()
+    monkeypatch.setattr(sys.modules["handlers_issue"], "safe_reply_text", reply_mock)
+    monkeypatch.setattr(sys.modules["handlers_issue"], "safe_delete_message", AsyncMock())
+
+    context = MagicMock()
+    context.user_data = {}
+    db = MagicMock()
+    db.get_user = AsyncMock(return_value={"id": 1})
+    db.get_active_user_issues = AsyncMock(
+        return_value=[{"id": 1, "key": "CRM-1", "summary": None, "status": "Открыт"}]
+    )
+    tracker = MagicMock()
+    tracker.get_active_issues_by_telegram_id = AsyncMock()
+    context.bot_data = {"db": db, "tracker": tracker}
+
+    await my_issues(update, context)
+
+    db.get_active_user_issues.assert_awaited_once_with(
+        1, limit=Config.MY_ISSUES_PAGE_SIZE + 1, after=None
+    )
+    tracker.get_active_issues_by_telegram_id.assert_not_called()
+    markup = reply_mock.call_args.kwargs["reply_markup"]
+    button = markup.inline_keyboard[0][0]
+    assert button.text == "CRM-1: Без описания"
+    assert button.callback_data == "issue_CRM-1"
+
+
+@pytest.mark.asyncio
+async def test_my_issues_page_turn_edits_message(monkeypatch):
+    monkeypatch.setattr(Config, "MY_ISSUES_PAGE_SIZE", 2)
+    update = MagicMock()
+    update.message = None
+    update.effective_user = MagicMock(id=1)
+    query = update.callback_query
+    # Page 2 starts after the issue with id 12, the last one of page 1
+    query.data = "my_issues_next_2_12"
+    query.answer = AsyncMock()
+    query.edit_message_text = AsyncMock()
+
+    context = MagicMock()
+    context.user_data = {}
+    db = MagicMock()
+    db.get_user = AsyncMock(return_value={"id": 1})
+    db.get_active_user_issues = AsyncMock(
+        return_value=[{"id": 10 + n, "key": f"CRM-{n}", "summary": "s"} for n in (3, 4, 5)]
+    )
+    context.bot_data = {"db": db}
+
+    await my_issues(update, context)
+
+    db.get_active_user_issues.assert_awaited_once_with(1, limit=3, after=12)
+    text = query.edit_message_text.call_args.args[0]
+    assert "2" in text
+    keyboard = query.edit_message_text.call_args.kwargs["reply_markup"].inline_keyboard
+    assert [row[0].callback_data for row in keyboard[:2]] == ["issue_CRM-3", "issue_CRM-4"]
+    assert [button.callback_data for button in keyboard[2]] == [
+        "my_issues_prev_1_13", "my_issues_next_3_14"
+    ]
+
+    # Going back reads the page just before the first issue shown
+    query.data = "my_issues_prev_1_13"
+    db.get_active_user_issues = AsyncMock(
+        return_value=[{"id": 10 + n, "key": f"CRM-{n}", "summary": "s"} for n in (1, 2)]
+    )
+    await my_issues(update, context)
+
+    db.get_active_user_issues.assert_awaited_once_with(1, limit=3, before=13)
+    keyboard = query.edit_message_text.call_args.kwargs["reply_markup"].inline_keyboard
+    assert [button.callback_data for button in keyboard[2]] == ["my_issues_next_2_12"]
+
+
+@pytest.mark.asyncio
+async def test_upload_file_reuses_draft_ids_and_cached_content(monkeypatch):
+    monkeypatch.setattr(Config, "UPLOAD_MEMORY_THRESHOLD", 0)
+    _file_cache.clear()
+    file = MagicMock(file_unique_id="same", file_id="fid", file_name="a.png", file_size=5)
+
+    async def fake_download(path):
+        with open(path, "wb") as f:
+            f.write(b"12345")
+
+    file_info = MagicMock()
+    file_info.download_to_drive = AsyncMock(side_effect=fake_download)
+    bot = MagicMock()
+    bot.get_file = AsyncMock(return_value=file_info)
+    tracker = MagicMock()
+    tracker.upload_file = AsyncMock(side_effect=[11, 12])
+    before = upload_cache_stats()
+
+    uploaded = {}
+    assert await upload_file(file, bot, tracker, uploaded) == 11
+    # The same draft reuses the attachment id without any transfer
+    assert await upload_file(file, bot, tracker, uploaded) == 11
+    # A comment gets a new attachment, but from the cached content
+    assert await upload_file(file, bot, tracker) == 12
+
+    bot.get_file.assert_awaited_once()
+    assert tracker.upload_file.call_args.kwargs["content"] == b"12345"
+    assert tracker.upload_file.call_args.args[1] == "a.png"
+    stats = upload_cache_stats()
+    assert stats["reused_ids"] - before["reused_ids"] == 1
+    assert stats["download_bytes_saved"] - before["download_bytes_saved"] == 5
+
+
+@pytest.mark.asyncio
+async def test_small_files_are_uploaded_from_memory(monkeypatch):
+    _file_cache.clear()
+    monkeypatch.setattr(Config, "UPLOAD_MEMORY_THRESHOLD", 1024)
+    file = MagicMock(file_unique_id="small", file_id="fid", file_name=None, file_size=4)
+
+    async def fake_download(out):
+        out.write(b"\xff\xd8ok")
+
+    file_info = MagicMock()
+    file_info.download_to_memory = AsyncMock(side_effect=fake_download)
+    bot = MagicMock()
+    bot.get_file = AsyncMock(return_value=file_info)
+    tracker = MagicMock()
+    tracker.upload_file = AsyncMock(return_value=5)
+    monkeypatch.setattr(tempfile, "NamedTemporaryFile", MagicMock(side_effect=AssertionError))
+
+    assert await upload_file(file, bot, tracker) == 5
+
+    file_info.download_to_drive.assert_not_called()
+    assert tracker.upload_file.call_args.args == (None, "small.jpg")
+    assert tracker.upload_file.call_args.kwargs["content"] == b"\xff\xd8ok"
+
+
+@pytest.mark.asyncio
+async def test_photo_gets_the_same_name_on_every_upload_path(monkeypatch):
+    _file_cache.clear()
+    monkeypatch.setattr(Config, "UPLOAD_MEMORY_THRESHOLD", 0)
+    file = MagicMock(file_unique_id="big", file_id="fid", file_name=None, file_size=4)
+
+    async def fake_download(path):
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8ok")
+
+    file_info = MagicMock()
+    file_info.download_to_drive = AsyncMock(side_effect=fake_download)
+    bot = MagicMock()
+    bot.get_file = AsyncMock(return_value=file_info)
+    tracker = MagicMock()
+    tracker.upload_file = AsyncMock(side_effect=[5, 6])
+
+    # Downloaded through a temporary file, then served from the cache
+    assert await upload_file(file, bot, tracker) == 5
+    assert await upload_file(file, bot, tracker) == 6
+
+    names = [c.args[1] for c in tracker.upload_file.call_args_list]
+    assert names == ["big.jpg", "big.jpg"]
+
+
+@pytest.mark.asyncio
+async def test_album_keeps_uploaded_files_and_reports_failed_ones(monkeypatch):
+    monkeypatch.setattr(Config, "ALBUM_QUIET_PERIOD", 0.01)
+    monkeypatch.setattr(Config, "ALBUM_RETRY_DELAY", 0)
+    monkeypatch.setattr(Config, "ALBUM_UPLOAD_RETRIES", 2)
+    messages = []
+    for n in (1, 2):
+        msg = MagicMock(chat_id=1, photo=[])
+        msg.document = MagicMock(file_unique_id=f"u{n}", file_name=f"f{n}.pdf", file_size=1)
+        messages.append(msg)
+    _album_buffer["partial"] = messages
+
+    attempts = {"u1": 0, "u2": 0}
+
+    async def fake_upload(file, bot, tracker, uploaded=None):
+        attempts[file.file_unique_id] += 1
+        if file.file_unique_id == "u1" and attempts["u1"] == 1:
+            raise OSError("temporary")
+        if file.file_unique_id == "u2":
+            raise OSError("broken")
+        return 101
+
+    monkeypatch.setattr(sys.modules["handlers_issue"], "upload_file", fake_upload)
+    send = AsyncMock()
+    monkeypatch.setattr(sys.modules["handlers_issue"], "safe_send_message", send)
+    context = MagicMock()
+    context.bot_data = {"tracker": MagicMock()}
+    context.user_data = {}
+
+    await _process_album_later("partial", context)
+    await _wait_for_uploads(context.user_data)
+
+    assert context.user_data["attachments"] == [101]
+    assert attempts == {"u1": 2, "u2": 3}
+    report = send.call_args_list[-1].kwargs["text"]
+    assert "1 из 2" in report and "№2 (f2.pdf)" in report
+
+
+@pytest.mark.asyncio
+async def test_files_received_counts_files_of_the_draft(monkeypatch):
+    monkeypatch.setattr(Config, "ALBUM_QUIET_PERIOD", 0.01)
+    release = asyncio.Event()
+    ids = iter(range(1, 10))
+
+    async def slow_upload(file, bot, tracker, uploaded=None):
+        await release.wait()
+        return next(ids)
+
+    monkeypatch.setattr(sys.modules["handlers_issue"], "upload_file", slow_upload)
+    send = AsyncMock()
+    reply = AsyncMock()
+    monkeypatch.setattr(sys.modules["handlers_issue"], "safe_send_message", send)
+    monkeypatch.setattr(sys.modules["handlers_issue"], "safe_reply_text", reply)
+    context = MagicMock()
+    context.bot_data = {"tracker": MagicMock()}
+    context.user_data = {"files_accepted": 0}
+
+    messages = []
+    for n in (1, 2, 3):
+        msg = MagicMock(chat_id=1, photo=[])
+        msg.document = MagicMock(file_unique_id=f"a{n}", file_size=1)
+        messages.append(msg)
+    _album_buffer["count"] = messages
+    await _process_album_later("count", context)
+    assert "Принято файлов: 3" in send.call_args.kwargs["text"]
+
+    # The album is still uploading while a single file arrives
+    update = MagicMock()
+    update.effective_user = MagicMock(id=1)
+    update.message.photo = []
+    update.message.document = MagicMock(file_unique_id="s1", file_size=1)
+    await handle_attachment(update, context)
+    assert "Принято файлов: 4" in reply.call_args.args[1]
+
+    release.set()
+    await _wait_for_uploads(context.user_data)
+    assert sorted(context.user_data["attachments"]) == [1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_album_reports_when_no_file_was_uploaded(monkeypatch):
+    monkeypatch.setattr(Config, "ALBUM_QUIET_PERIOD", 0.01)
+    monkeypatch.setattr(Config, "ALBUM_RETRY_DELAY", 0)
+    monkeypatch.setattr(Config, "ALBUM_UPLOAD_RETRIES", 0)
+    messages = []
+    for n in (1, 2):
+        msg = MagicMock(chat_id=1, photo=[])
+        msg.document = MagicMock(file_unique_id=f"x{n}", file_name=f"f{n}.pdf", file_size=1)
+        messages.append(msg)
+    _album_buffer["failed"] = messages
+
+    monkeypatch.setattr(
+        sys.modules["handlers_issue"], "upload_file", AsyncMock(side_effect=OSError("down"))
+    )
+    send = AsyncMock()
+    monkeypatch.setattr(sys.modules["handlers_issue"], "safe_send_message", send)
+    context = MagicMock()
+    context.bot_data = {"tracker": MagicMock()}
+    context.user_data = {}
+
+    await _process_album_later("failed", context)
+    await _wait_for_uploads(context.user_data)
+
+    assert context.user_data["attachments"] == []
+    assert send.call_args_list[-1].kwargs["text"] == ALBUM_ALL_FAILED
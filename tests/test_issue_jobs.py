@@ -0,0 +1,156 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+import json_codec
+from issue_jobs import (
+    COMPLETE_JOB,
+    ENQUEUE_JOB,
+    EXTEND_LEASE,
+    FAIL_JOB,
+    RETRY_JOB,
+    IssueJobQueue,
+)
+from messages import ISSUE_CREATION_ERROR
+
+
+def job(attempts=1):
+    return {
+        "id": 7,
+        "idempotency_key": "1:draft",
+        "user_id": 1,
+        "chat_id": 10,
+        "message_id": 20,
+        "payload": json_codec.dumps(
+            {"title": "Title", "description": "Desc", "extra_fields": {"telegramId": "1"}}
+        ).decode(),
+        "attempts": attempts,
+    }
+
+
+@pytest.mark.asyncio
+async def test_submit_ignores_duplicate_keys(make_db):
+    conn = MagicMock()
+    conn.fetchval = AsyncMock(side_effect=[1, None])
+    queue = IssueJobQueue(make_db(conn), MagicMock(), MagicMock())
+
+    assert await queue.submit("1:draft", 1, 10, 20, {"title": "t"}) is True
+    assert await queue.submit("1:draft", 1, 10, 21, {"title": "t"}) is False
+    assert conn.fetchval.call_args.args[0] == ENQUEUE_JOB
+    assert queue.stats()["duplicates"] == 1
+
+
+@pytest.mark.asyncio
+async def test_job_creates_issue_with_idempotency_key_and_edits_message(make_db):
+    conn = MagicMock()
+    conn.fetch = AsyncMock(return_value=[job()])
+    conn.execute = AsyncMock()
+    db = make_db(conn)
+    tracker = MagicMock()
+    tracker.create_issue = AsyncMock(return_value={
+        "key": "CRM-1",
+        "status": {"display": "Открыт"},
+        "updatedAt": "2024-01-01T00:00:01.000+0000",
+    })
+    bot = MagicMock()
+    bot.edit_message_text = AsyncMock()
+    queue = IssueJobQueue(db, tracker, bot)
+
+    assert await queue.run_due() == 1
+
+    assert tracker.create_issue.call_args.kwargs["unique"] == "1:draft"
+    db.create_issue.assert_awaited_once_with(
+        1, "CRM-1", summary="Title", status="Открыт",
+        updated_at=datetime(2024, 1, 1, 0, 0, 1, tzinfo=timezone.utc),
+    )
+    conn.execute.assert_awaited_once_with(COMPLETE_JOB, 7, "CRM-1")
+    text = bot.edit_message_text.call_args.args[0]
+    assert "CRM-1" in text
+    assert bot.edit_message_text.call_args.kwargs["message_id"] == 20
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_retried_then_reported(make_db):
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    tracker = MagicMock()
+    tracker.create_issue = AsyncMock(side_effect=Exception("Create issue failed: 500"))
+    bot = MagicMock()
+    bot.edit_message_text = AsyncMock()
+    queue = IssueJobQueue(make_db(conn), tracker, bot, max_attempts=3, retry_delay=5)
+
+    conn.fetch = AsyncMock(return_value=[job(attempts=2)])
+    await queue.run_due()
+    query, job_id, delay, _ = conn.execute.call_args.args
+    assert (query, job_id, delay) == (RETRY_JOB, 7, 10.0)
+    bot.edit_message_text.assert_not_called()
+
+    conn.fetch = AsyncMock(return_value=[job(attempts=3)])
+    await queue.run_due()
+    assert conn.execute.call_args.args[0] == FAIL_JOB
+    assert bot.edit_message_text.call_args.args[0] == ISSUE_CREATION_ERROR
+    assert queue.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stop_lets_running_jobs_finish(make_db):
+    conn = MagicMock()
+    conn.fetch = AsyncMock(side_effect=[[job()], []])
+    conn.execute = AsyncMock()
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def create_issue(*args, **kwargs):
+        started.set()
+        await release.wait()
+        return {"key": "CRM-1"}
+
+    tracker = MagicMock()
+    tracker.create_issue = create_issue
+    bot = MagicMock()
+    bot.edit_message_text = AsyncMock()
+    queue = IssueJobQueue(make_db(conn), tracker, bot, poll_interval=60)
+
+    queue.start()
+    await started.wait()
+    stopping = asyncio.create_task(queue.stop(timeout=5))
+    await asyncio.sleep(0)
+    assert not stopping.done()
+    release.set()
+    await stopping
+
+    # The job completed and reported instead of being cancelled mid-way
+    assert conn.execute.call_args.args[:3] == (COMPLETE_JOB, 7, "CRM-1")
+    bot.edit_message_text.assert_awaited_once()
+    assert conn.fetch.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_lease_is_renewed_while_the_job_runs(make_db):
+    conn = MagicMock()
+    conn.fetch = AsyncMock(return_value=[job()])
+    conn.execute = AsyncMock()
+
+    async def create_issue(*args, **kwargs):
+        await asyncio.sleep(0.25)
+        return {"key": "CRM-1"}
+
+    tracker = MagicMock()
+    tracker.create_issue = create_issue
+    bot = MagicMock()
+    bot.edit_message_text = AsyncMock()
+    queue = IssueJobQueue(make_db(conn), tracker, bot, lease=0.2)
+
+    await queue.run_due()
+
+    queries = [c.args[0] for c in conn.execute.call_args_list]
+    # The attempt outlasts the lease, so it is renewed until completion
+    assert queries[-1] == COMPLETE_JOB
+    assert len(queries) >= 2 and set(queries[:-1]) == {EXTEND_LEASE}
+    assert conn.execute.call_args_list[0].args[1:] == (7, 0.2)
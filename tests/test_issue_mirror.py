@@ -0,0 +1,222 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+import issue_mirror
+from issue_mirror import (
+    MY_ISSUES_NEXT_PREFIX,
+    MY_ISSUES_PREV_PREFIX,
+    SYNC_CURSOR_KEY,
+    IssuePrefetcher,
+    mirror_row,
+    prefetch_on_activity,
+    sync_updated_issues,
+)
+
+
+def test_mirror_row_marks_closed_statuses():
+    row = mirror_row({
+        "key": "CRM-1",
+        "summary": "s",
+        "status": {"key": "closed", "display": "Закрыт"},
+        "updatedAt": "2024-01-01T00:00:01.500+0000",
+    })
+    assert row == {
+        "key": "CRM-1",
+        "summary": "s",
+        "status": "Закрыт",
+        "closed": True,
+        "updated_at": datetime(2024, 1, 1, 0, 0, 1, 500000, tzinfo=timezone.utc),
+    }
+
+
+@pytest.mark.asyncio
+async def test_sync_pages_through_changes_since_cursor(tracker_api, fake_tracker):
+    first = await tracker_api.create_issue("A", "", {"telegramId": "1"})
+    for title in ("B", "C"):
+        await tracker_api.create_issue(title, "", {"telegramId": "2"})
+    # Issues created within one millisecond would all sit on the inclusive
+    # cursor boundary; give them distinct timestamps in the past
+    for second, key in enumerate(fake_tracker.issues, 1):
+        fake_tracker.issues[key]["updatedAt"] = f"2024-01-01T00:00:0{second}.000+0000"
+
+    db = MagicMock()
+    state = {}
+    db.get_sync_state = AsyncMock(side_effect=lambda key: state.get(key))
+    pages = []
+
+    async def apply_issue_changes(rows, key, cursor):
+        pages.append(rows)
+        state[key] = cursor
+
+    db.apply_issue_changes = AsyncMock(side_effect=apply_issue_changes)
+
+    assert await sync_updated_issues(db, tracker_api, page_size=2) == 3
+    assert [len(p) for p in pages] == [2, 1]
+    assert pages[0][0]["user_id"] == 1
+    cursor = state[SYNC_CURSOR_KEY]
+    assert cursor == max(i["updatedAt"] for i in fake_tracker.issues.values())
+
+    # Only the issue changed after the cursor (plus the boundary) is fetched
+    pages.clear()
+    fake_tracker.touch(first["key"], status={"key": "closed", "display": "Закрыт"})
+    await sync_updated_issues(db, tracker_api, page_size=2)
+    changed = [row for page in pages for row in page]
+    assert first["key"] in [row["key"] for row in changed]
+    assert [row["key"] for row in changed] == [next(reversed(fake_tracker.issues)), first["key"]]
+    assert next(r for r in changed if r["key"] == first["key"])["closed"] is True
+
+
+def make_sync_db(pages):
+    db = MagicMock()
+    state = {}
+    db.get_sync_state = AsyncMock(side_effect=lambda key: state.get(key))
+
+    async def apply_issue_changes(rows, key, cursor):
+        pages.append([row["key"] for row in rows])
+        state[key] = cursor
+
+    db.apply_issue_changes = AsyncMock(side_effect=apply_issue_changes)
+    return db, state
+
+
+@pytest.mark.asyncio
+async def test_sync_keeps_issues_shifted_by_a_change_during_the_pass(tracker_api, fake_tracker):
+    for title in "ABCD":
+        await tracker_api.create_issue(title, "", {})
+    keys = list(fake_tracker.issues)
+    for second, key in enumerate(keys, 1):
+        fake_tracker.issues[key]["updatedAt"] = f"2024-01-01T00:00:0{second}.000+0000"
+    pages = []
+    db, state = make_sync_db(pages)
+    apply = db.apply_issue_changes.side_effect
+
+    async def apply_and_touch(rows, key, cursor):
+        await apply(rows, key, cursor)
+        if len(pages) == 1:
+            # The first issue changes while the pass is running
+            fake_tracker.touch(keys[0])
+
+    db.apply_issue_changes.side_effect = apply_and_touch
+
+    await sync_updated_issues(db, tracker_api, page_size=2)
+    synced = {key for page in pages for key in page}
+    assert synced == set(keys)
+    assert state[SYNC_CURSOR_KEY] == fake_tracker.issues[keys[0]]["updatedAt"]
+
+
+@pytest.mark.asyncio
+async def test_sync_pages_through_more_ties_than_a_page(tracker_api, fake_tracker):
+    for title in "ABCDE":
+        await tracker_api.create_issue(title, "", {})
+    for key in fake_tracker.issues:
+        fake_tracker.issues[key]["updatedAt"] = "2024-01-01T00:00:01.000+0000"
+    pages = []
+    db, _ = make_sync_db(pages)
+
+    assert await sync_updated_issues(db, tracker_api, page_size=2) == 5
+    assert sorted(key for page in pages for key in page) == sorted(fake_tracker.issues)
+
+@pytest.mark.asyncio
+async def test_prefetcher_respects_staleness_and_budget(tracker_api):
+    await tracker_api.create_issue("A", "", {"telegramId": "1"})
+    db = MagicMock()
+    db.get_user = AsyncMock(return_value={"telegram_id": 1})
+    db.sync_user_issues = AsyncMock()
+    now = [0.0]
+    prefetcher = IssuePrefetcher(db, tracker_api, stale_after=60, budget=2, clock=lambda: now[0])
+
+    await prefetcher.schedule(1)
+    db.sync_user_issues.assert_awaited_once()
+    assert db.sync_user_issues.call_args.args[1][0]["summary"] == "A"
+
+    # Fresh lists are not fetched again
+    assert prefetcher.schedule(1) is None
+
+    now[0] = 61
+    await prefetcher.schedule(1)
+    assert db.sync_user_issues.await_count == 2
+
+    # The budget of two prefetches per minute is spent
+    await prefetcher.schedule(2)
+    assert prefetcher.schedule(3) is None
+    assert prefetcher.stats()["skipped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_prefetcher_keeps_tasks_until_done(tracker_api):
+    db = MagicMock()
+    db.get_user = AsyncMock(return_value=None)
+    prefetcher = IssuePrefetcher(db, tracker_api, stale_after=60, budget=2)
+
+    task = prefetcher.schedule(1)
+    assert task in prefetcher._tasks
+    await task
+    assert not prefetcher._tasks
+
+
+@pytest.mark.asyncio
+async def test_prefetcher_skips_users_reconciled_elsewhere(tracker_api):
+    db = MagicMock()
+    db.get_user = AsyncMock(return_value=None)
+    prefetcher = IssuePrefetcher(db, tracker_api, stale_after=60, budget=2)
+
+    prefetcher.on_invalidation("issue", {"keys": ["CRM-1"], "user_id": 7})
+    assert not prefetcher.is_fresh(7)
+
+    prefetcher.on_invalidation("issue", {"keys": ["CRM-1"], "user_id": 7, "synced": True})
+    assert prefetcher.schedule(7) is None
+    db.get_user.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_page_turns_do_not_trigger_a_prefetch():
+    prefetcher = MagicMock()
+    context = MagicMock(bot_data={"prefetcher": prefetcher})
+    update = MagicMock()
+    update.effective_user.id = 1
+
+    update.callback_query.data = f"{MY_ISSUES_NEXT_PREFIX}2_10"
+    await prefetch_on_activity(update, context)
+    update.callback_query.data = f"{MY_ISSUES_PREV_PREFIX}1_11"
+    await prefetch_on_activity(update, context)
+    prefetcher.schedule.assert_not_called()
+
+    update.callback_query.data = "my_issues"
+    await prefetch_on_activity(update, context)
+    prefetcher.schedule.assert_called_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_reconciliation_survives_errors_and_spreads_users(monkeypatch):
+    db = MagicMock()
+    db.get_user_ids = AsyncMock(side_effect=[Exception("db down"), [1, 2]])
+    reconciled = []
+    sleeps = []
+
+    async def reconcile_user(db, tracker, user_id):
+        reconciled.append(user_id)
+        if user_id == 1:
+            raise Exception("tracker down")
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) > 3:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(issue_mirror, "reconcile_user", reconcile_user)
+    monkeypatch.setattr(issue_mirror.asyncio, "sleep", sleep)
+
+    with pytest.raises(asyncio.CancelledError):
+        await issue_mirror.run_reconciliation(db, MagicMock(), interval=100)
+
+    assert reconciled == [1, 2]
+    # A failed user listing waits a full interval, then each user gets a
+    # share of it before its Tracker search
+    assert sleeps[:3] == [100, 50, 50]
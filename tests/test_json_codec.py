@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+import json_codec
+
+PAYLOAD = {
+    "event": "commentCreated",
+    "issue": {"key": "CRM-1", "summary": "Тест", "telegramId": "123"},
+    "comment": {"id": 5, "text": "привет 👋", "attachments": []},
+}
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "msgspec"])
+def test_codec_round_trip(name):
+    if name != "json" and getattr(json_codec, name) is None:
+        pytest.skip(f"{name} is not installed")
+    backend, dumps, loads = json_codec.get_codec(name)
+    assert backend == name
+    encoded = dumps(PAYLOAD)
+    assert isinstance(encoded, bytes)
+    assert loads(encoded) == PAYLOAD
+    assert loads(encoded.decode()) == PAYLOAD
+
+
+def test_unknown_backend_falls_back_to_stdlib():
+    backend, dumps, _ = json_codec.get_codec("simdjson")
+    assert backend == "json"
+    assert dumps({"a": 1}) == b'{"a":1}'
@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from telegram import Bot
+from unittest.mock import MagicMock
+
+from handlers_issue import upload_cache_stats, upload_file
+
+
+@pytest.mark.asyncio
+async def test_local_mode_uploads_file_from_server_disk(tmp_path, tracker_api, fake_tracker):
+    # The local telegram-bot-api server answers getFile with an absolute path
+    # in its working directory instead of a download URL
+    stored = tmp_path / "documents" / "file_0.pdf"
+    stored.parent.mkdir()
+    stored.write_bytes(b"%PDF local")
+
+    async def get_file(request):
+        return web.json_response(
+            {"ok": True, "result": {"file_id": "fid", "file_unique_id": "uid-local",
+                                    "file_size": stored.stat().st_size, "file_path": str(stored)}}
+        )
+
+    app = web.Application()
+    app.router.add_post("/botTOKEN/getFile", get_file)
+    server = TestServer(app)
+    await server.start_server()
+    bot = Bot("TOKEN", base_url=str(server.make_url("/bot")), local_mode=True)
+    try:
+        before = upload_cache_stats()["local_reads"]
+        document = MagicMock(file_id="fid", file_unique_id="uid-local", file_name="report.pdf", file_size=10)
+
+        attachment_id = await upload_file(document, bot, tracker_api)
+
+        attachment = fake_tracker.attachments[str(attachment_id)]
+        assert attachment["content"] == b"%PDF local"
+        assert attachment["name"] == "report.pdf"
+        assert upload_cache_stats()["local_reads"] == before + 1
+        # The server owns the file; the bot must not delete it
+        assert stored.exists()
+    finally:
+        await bot.shutdown()
+        await server.close()
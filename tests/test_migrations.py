@@ -0,0 +1,29 @@
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+from migrations import MIGRATIONS, migrate
+
+
+def test_versions_are_unique_and_ordered():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+
+@pytest.mark.asyncio
+async def test_only_pending_migrations_are_applied():
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    conn.fetch = AsyncMock(return_value=[{"version": 1}])
+    migrations = [(2, "two", ["SELECT 2"]), (1, "one", ["SELECT 1"]), (3, "three", ["SELECT 3"])]
+
+    assert await migrate(conn, migrations) == [2, 3]
+
+    statements = [call.args[0] for call in conn.execute.call_args_list]
+    assert "SELECT 1" not in statements
+    assert statements.index("SELECT 2") < statements.index("SELECT 3")
+    assert conn.execute.call_args_list[-1].args[0] == "SELECT pg_advisory_unlock($1)"
@@ -0,0 +1,48 @@
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+import json_codec
+from persistence import UPSERT_CONVERSATION, UPSERT_USER_DATA, PostgresPersistence, decode_state
+from states import IssueStates
+
+
+@pytest.mark.asyncio
+async def test_changes_are_written_in_one_batch(make_db):
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    conn.executemany = AsyncMock()
+    persistence = PostgresPersistence(make_db(conn), flush_delay=60)
+
+    await persistence.update_user_data(1, {"issue_title": "t", "attachments": ["a1"], "msg": object()})
+    await persistence.update_user_data(2, {"issue_title": "u"})
+    await persistence.update_conversation("issue_flow", (1, 1), IssueStates.waiting_for_attachment)
+    await persistence.drop_user_data(3)
+    conn.executemany.assert_not_called()
+
+    await persistence.flush()
+
+    calls = {call.args[0]: call.args[1] for call in conn.executemany.call_args_list}
+    users = dict(calls[UPSERT_USER_DATA])
+    assert json_codec.loads(users[1]) == {"issue_title": "t", "attachments": ["a1"]}
+    assert 2 in users
+    ((name, key, state),) = calls[UPSERT_CONVERSATION]
+    assert (name, key) == ("issue_flow", "[1,1]")
+    assert decode_state(json_codec.loads(state)) is IssueStates.waiting_for_attachment
+    conn.execute.assert_awaited_once()
+    assert conn.execute.call_args.args[1] == [3]
+
+
+@pytest.mark.asyncio
+async def test_conversations_are_restored(make_db):
+    conn = MagicMock()
+    conn.fetch = AsyncMock(
+        return_value=[{"key": "[5,5]", "state": '{"enum":"IssueStates","name":"waiting_for_title"}'}]
+    )
+    persistence = PostgresPersistence(make_db(conn))
+
+    assert await persistence.get_conversations("issue_flow") == {(5, 5): IssueStates.waiting_for_title}
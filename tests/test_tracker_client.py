@@ -10,7 +10,7 @@ class MockResponse:
         self._json = json_data
         self.status = status
 
-    async def json(self):
+    async def json(self, loads=None):
         return self._json
 
     async def text(self):
@@ -139,3 +139,233 @@ async def test_upload_file_uses_mimetype(tmp_path):
         await api.upload_file(str(file_path))
 
     assert captured["content_type"] == 'image/png'
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_gets_share_one_request():
+    import asyncio
+
+    api = TrackerAPI('http://example.com', 'TOKEN')
+    release = asyncio.Event()
+
+    class SlowResponse(MockResponse):
+        async def json(self, loads=None):
+            await release.wait()
+            return self._json
+
+    mock_session = MagicMock()
+    mock_session.get.return_value = SlowResponse({'key': 'ISSUE-1'})
+    api.get_session = AsyncMock(return_value=mock_session)
+
+    tasks = [asyncio.create_task(api.get_issue('ISSUE-1')) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert [r['key'] for r in results] == ['ISSUE-1'] * 3
+    assert mock_session.get.call_count == 1
+    assert api.coalesce_stats()['issue'] == {'calls': 3, 'coalesced': 2}
+
+    # Once the request completed a new call hits Tracker again
+    await api.get_issue('ISSUE-1')
+    assert mock_session.get.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_coalescing_can_be_disabled_per_endpoint():
+    import asyncio
+
+    api = TrackerAPI('http://example.com', 'TOKEN', coalesce_endpoints=[])
+    mock_session = MagicMock()
+    mock_session.get.return_value = MockResponse({'key': 'ISSUE-1'})
+    api.get_session = AsyncMock(return_value=mock_session)
+
+    await asyncio.gather(api.get_issue('ISSUE-1'), api.get_issue('ISSUE-1'))
+
+    assert mock_session.get.call_count == 2
+    assert api.coalesce_stats() == {}
+
+
+@pytest.mark.asyncio
+async def test_429_is_retried_and_throttles_bucket(monkeypatch):
+    import asyncio
+
+    api = TrackerAPI('http://example.com', 'TOKEN')
+    throttled = MockResponse({}, status=429)
+    throttled.headers = {'Retry-After': '0'}
+    mock_session = MagicMock()
+    mock_session.post.side_effect = [throttled, MockResponse({'key': 'ISSUE-1'}, status=201)]
+    api.get_session = AsyncMock(return_value=mock_session)
+    monkeypatch.setattr(asyncio, 'sleep', AsyncMock())
+
+    issue = await api.create_issue('T', 'D')
+
+    assert issue['key'] == 'ISSUE-1'
+    assert mock_session.post.call_count == 2
+    stats = api.rate_limit_stats()
+    assert stats['write']['throttled'] == 1
+    assert stats['read']['throttled'] == 0
+
+
+@pytest.mark.asyncio
+async def test_429_raises_after_retries_exhausted(monkeypatch):
+    import asyncio
+    from config import Config
+
+    monkeypatch.setattr(Config, 'TRACKER_MAX_RETRIES', 1)
+    api = TrackerAPI('http://example.com', 'TOKEN')
+    throttled = MockResponse({}, status=429)
+    throttled.headers = {}
+    mock_session = MagicMock()
+    mock_session.get.return_value = throttled
+    api.get_session = AsyncMock(return_value=mock_session)
+    monkeypatch.setattr(asyncio, 'sleep', AsyncMock())
+
+    with pytest.raises(Exception, match='429'):
+        await api.get_issue('ISSUE-1')
+    assert mock_session.get.call_count == 2
+
+
+def test_token_bucket_adapts_to_throttling():
+    from rate_limiter import MAX_RETRY_AFTER, TokenBucket, parse_retry_after
+
+    now = {'t': 0.0}
+    bucket = TokenBucket('read', rate=10, clock=lambda: now['t'])
+    # The initial burst is served without waiting, the next call queues
+    assert [bucket.reserve() for _ in range(10)] == [0.0] * 10
+    assert bucket.reserve() == pytest.approx(0.1)
+
+    bucket.throttle(retry_after=2)
+    assert bucket.rate == 5
+    assert bucket.reserve() >= 2
+
+    for _ in range(100):
+        bucket.succeed()
+    assert bucket.rate == 10
+
+    assert parse_retry_after('3') == 3
+    assert parse_retry_after('Thu, 01 Jan 1970 00:00:00 GMT') == 0
+    assert parse_retry_after('garbage') is None
+    # Absurd values are capped instead of blocking the bucket for good
+    assert parse_retry_after('inf') == MAX_RETRY_AFTER
+    assert parse_retry_after('1e12') == MAX_RETRY_AFTER
+    assert parse_retry_after('Fri, 01 Jan 9999 00:00:00 GMT') == MAX_RETRY_AFTER
+    assert parse_retry_after('nan') is None
+
+
+@pytest.mark.asyncio
+async def test_waiters_respect_a_block_set_while_they_sleep(monkeypatch):
+    from rate_limiter import TokenBucket
+
+    now = {'t': 0.0}
+    sleeps = []
+
+    async def sleep(delay):
+        sleeps.append(delay)
+        now['t'] += delay
+        if len(sleeps) == 1:
+            # Another request gets a 429 while this one is waiting
+            bucket.throttle(retry_after=5)
+
+    monkeypatch.setattr('rate_limiter.asyncio.sleep', sleep)
+    bucket = TokenBucket('read', rate=1, capacity=1, clock=lambda: now['t'])
+    bucket.reserve()
+
+    await bucket.acquire()
+
+    assert sleeps == [pytest.approx(1.0), pytest.approx(5.0)]
+
+
+@pytest.mark.asyncio
+async def test_request_timings_recorded_per_endpoint(caplog):
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+
+    async def issue(request):
+        return web.json_response({'key': request.match_info['key']})
+
+    app = web.Application()
+    app.router.add_get('/v2/issues/{key}', issue)
+    server = TestServer(app)
+    await server.start_server()
+    api = TrackerAPI(str(server.make_url('')), 'TOKEN', coalesce_endpoints=[])
+    api.timings.slow_threshold = 1e-9
+    try:
+        await api.get_issue('ISSUE-1')
+        await api.get_issue('ISSUE-2')
+    finally:
+        await api.close()
+        await server.close()
+
+    summary = api.timings.summary()
+    stats = summary['GET /v2/issues/{key}']
+    assert stats['count'] == 2
+    # The second request reuses the keep-alive connection
+    assert stats['reused'] == 0.5
+    assert stats['errors'] == 0
+    assert stats['phases']['total']['max'] >= stats['phases']['wait']['max']
+    # Logged once per request even though the body was read as well
+    assert caplog.text.count('Slow Tracker request') == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_request_without_body_read_is_logged(caplog):
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+
+    async def head(request):
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_get('/ping', head)
+    server = TestServer(app)
+    await server.start_server()
+    api = TrackerAPI(str(server.make_url('')), 'TOKEN')
+    api.timings.slow_threshold = 1e-9
+    try:
+        session = await api.get_session()
+        async with session.get(f"{api.base_url}/ping") as resp:
+            assert resp.status == 204
+    finally:
+        await api.close()
+        await server.close()
+
+    assert 'Slow Tracker request' in caplog.text
+
+
+def test_endpoint_label_normalizes_ids():
+    from yarl import URL
+    from tracker_trace import endpoint_label
+
+    assert endpoint_label('GET', URL('http://x/v2/issues/CRM-12')) == 'GET /v2/issues/{key}'
+    assert (
+        endpoint_label('GET', URL('http://x/v2/issues/CRM-1/comments/55?expand=attachments'))
+        == 'GET /v2/issues/{key}/comments/{id}'
+    )
+    assert (
+        endpoint_label('GET', URL('http://x/v2/attachments/7/photo.png'))
+        == 'GET /v2/attachments/{id}/{id}'
+    )
+
+
+def test_is_closed_status_matches_key_and_name_only():
+    from tracker_client import is_closed_status
+
+    assert is_closed_status({"key": "closed", "display": "Закрыт"})
+    assert is_closed_status({"key": "resolved", "name": "Завершена"})
+    assert is_closed_status("cancelled")
+    # The display name is not inspected, as in the original search filter
+    assert not is_closed_status({"key": "inReview", "display": "Отменить?"})
+
+
+@pytest.mark.asyncio
+async def test_get_issue_comments_follows_pages(tracker_api, fake_tracker):
+    issue = await tracker_api.create_issue("A", "", {})
+    for n in range(5):
+        await tracker_api.add_comment(issue["key"], f"c{n}")
+
+    comments = await tracker_api.get_issue_comments(issue["key"], per_page=2)
+
+    assert [c["text"] for c in comments] == [f"c{n}" for n in range(5)]
+    pages = [p for m, p in fake_tracker.requests if m == "GET" and p.endswith("/comments")]
+    assert len(pages) == 3
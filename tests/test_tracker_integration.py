@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+from config import Config
+from rate_limiter import TokenBucket
+
+
+@pytest.mark.asyncio
+async def test_issue_lifecycle(tracker_api, fake_tracker, tmp_path):
+    path = tmp_path / "screen.png"
+    path.write_bytes(b"\x89PNG data")
+    attachment_id = await tracker_api.upload_file(str(path), "screen.png")
+    assert fake_tracker.attachments[str(attachment_id)]["content"] == b"\x89PNG data"
+
+    issue = await tracker_api.create_issue(
+        "Title", "Description", {"telegramId": "42", "attachmentIds": [attachment_id]}
+    )
+    assert issue["key"].startswith("CRM-")
+
+    details = await tracker_api.get_issue(issue["key"])
+    assert details["summary"] == "Title"
+
+    active = await tracker_api.get_active_issues_by_telegram_id(42)
+    assert [i["key"] for i in active] == [issue["key"]]
+
+    comment = await tracker_api.add_comment(issue["key"], "hi", [attachment_id])
+    author = await tracker_api.get_comment_author(issue["key"], str(comment["id"]))
+    assert author == "Bot"
+
+    attachments = await tracker_api.get_attachments_for_comment(issue["key"], comment["id"])
+    assert attachments[0]["filename"] == "screen.png"
+    content = await tracker_api.get_file_content(attachments[0]["content_url"])
+    assert content == b"\x89PNG data"
+
+
+@pytest.mark.asyncio
+async def test_injected_errors_surface_as_exceptions(tracker_api, fake_tracker):
+    fake_tracker.fail_next(500)
+    with pytest.raises(Exception, match="500"):
+        await tracker_api.create_issue("Title", "Description")
+
+
+@pytest.mark.asyncio
+async def test_429_from_server_is_retried(tracker_api, fake_tracker):
+    issue = await tracker_api.create_issue("Title", "Description")
+    fake_tracker.fail_next(429, count=2)
+
+    details = await tracker_api.get_issue(issue["key"])
+
+    assert details["key"] == issue["key"]
+    assert tracker_api.rate_limit_stats()["read"]["throttled"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_load(tracker_api, fake_tracker):
+    """End-to-end throughput of the real client against the fake server."""
+    fake_tracker.latency = 0.005
+    tracker_api.limiters["read"] = TokenBucket("read", rate=10_000)
+    issue = await tracker_api.create_issue("Title", "Description")
+    tracker_api.coalesce_endpoints.clear()
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(tracker_api.get_issue(issue["key"]) for _ in range(200))
+    )
+    elapsed = time.perf_counter() - started
+
+    assert len(results) == 200
+    stats = tracker_api.timings.summary()["GET /v2/issues/{key}"]
+    assert stats["count"] == 200
+    assert stats["errors"] == 0
+    # At most TRACKER_POOL_LIMIT connections are opened for 200 requests
+    assert stats["reused"] >= 1 - Config.TRACKER_POOL_LIMIT / 200
+    # Requests overlap instead of running one after another
+    assert elapsed < 200 * fake_tracker.latency
+    logging.info(
+        "200 GETs in %.3fs (%.0f req/s), p95 %.1f ms, connection reuse %.0f%%",
+        elapsed, 200 / elapsed, stats["phases"]["total"]["p95"], stats["reused"] * 100,
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_issue_with_unique_key_is_idempotent(tracker_api, fake_tracker):
+    first = await tracker_api.create_issue("Title", "Description", unique="42:draft")
+    second = await tracker_api.create_issue("Title", "Description", unique="42:draft")
+
+    assert second["key"] == first["key"]
+    assert len(fake_tracker.issues) == 1
+
+
+@pytest.mark.asyncio
+async def test_upload_file_from_memory(tracker_api, fake_tracker):
+    attachment_id = await tracker_api.upload_file(None, "shot.png", content=b"\x89PNG mem")
+
+    assert fake_tracker.attachments[str(attachment_id)]["content"] == b"\x89PNG mem"
+    assert fake_tracker.attachments[str(attachment_id)]["name"] == "shot.png"
+    assert fake_tracker.attachments[str(attachment_id)]["mimetype"] == "image/png"
@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
+from datetime import datetime, timezone
 from unittest.mock import AsyncMock, MagicMock
 from telegram.error import BadRequest
 import os
@@ -16,11 +17,11 @@ from webhook_server import (
 from config import Config
 
 
-def create_app(application, tracker):
+def create_app(application, tracker, db=None):
     app = FastAPI()
     router.routes.clear()
     processed_comment_ids.clear()
-    setup_webhook_routes(app, application, tracker)
+    setup_webhook_routes(app, application, tracker, db)
     return app
 
 
@@ -714,3 +715,43 @@ def test_attachments_sent_before_message():
     assert calls[0] == "send_document"
     assert "send_message" in calls
     assert calls.index("send_document") < calls.index("send_message")
+
+
+def test_webhooks_refresh_issue_mirror():
+    Config.API_TOKEN = "TOKEN"
+    application, tracker, bot = create_mocks()
+    db = MagicMock()
+    db.upsert_issue = AsyncMock()
+    app = create_app(application, tracker, db)
+    client = TestClient(app)
+
+    client.post(
+        "/trackers/comment",
+        json={
+            "event": "commentCreated",
+            "issue": {"key": "ISSUE-1", "summary": "New title", "telegramId": "123"},
+            "comment": {"id": "1", "text": "hi", "createdAt": "2024-01-01T00:00:01.000+0000"},
+        },
+        headers={"Authorization": "Bearer TOKEN"},
+    )
+    # The comment time stands in for the issue's updatedAt
+    db.upsert_issue.assert_awaited_once_with(
+        "ISSUE-1", summary="New title", status=None, closed=None, user_id=123,
+        updated_at=datetime(2024, 1, 1, 0, 0, 1, tzinfo=timezone.utc),
+    )
+
+    db.upsert_issue.reset_mock()
+    client.post(
+        "/trackers/updateStatus",
+        json={
+            "event": "issueUpdated",
+            "issue": {"key": "ISSUE-1", "summary": "New title", "telegramId": "123"},
+            "status": {"key": "closed", "display": "Закрыт"},
+        },
+        headers={"Authorization": "Bearer TOKEN"},
+    )
+    db.upsert_issue.assert_awaited_once_with(
+        "ISSUE-1", summary="New title", status="Закрыт", closed=True, user_id=123,
+        updated_at=None,
+    )
+    assert bot.send_message.call_count == 2
@@ -1,14 +1,65 @@
 import logging
 import os
 import asyncio
+import io
 import aiohttp
 import mimetypes
+import contextlib
+from collections import Counter
+from datetime import datetime, timezone
 from config import Config
+import json_codec
+from rate_limiter import TokenBucket, parse_retry_after
+from tracker_trace import RequestTimings
 
 logger = logging.getLogger(__name__)
 
+# Text of the comments created by :meth:`TrackerAPI.add_attachment_comment`
+ATTACHMENT_COMMENT_TEXT = "Вложение"
+
+
+def is_closed_status(status) -> bool:
+    """Return ``True`` for closed, cancelled and finished Tracker statuses."""
+    status = status or {}
+    if isinstance(status, dict):
+        key = str(status.get("key", "")).lower()
+        name = str(status.get("name", "")).lower()
+    else:
+        key = str(status).lower()
+        name = ""
+    if any(w in key for w in ("closed", "canceled", "cancelled", "done")):
+        return True
+    return any(substr in name for substr in ("заверш", "отмен"))
+
+
+def tracker_timestamp(dt=None) -> str:
+    """Format ``dt`` (default: now) like Tracker timestamps, e.g.
+    ``2024-10-02T17:03:11.456+0000``, so they compare as strings."""
+    dt = (dt or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}+0000"
+
+
+def parse_tracker_timestamp(value):
+    """Parse a Tracker timestamp such as ``2024-10-02T17:03:11.456+0000``.
+
+    Returns ``None`` for a missing or malformed value."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z")
+    except (TypeError, ValueError):
+        return None
+
+
+def status_display(status):
+    """Return a human readable name of a Tracker status."""
+    if isinstance(status, dict):
+        return status.get("display") or status.get("name") or status.get("key")
+    return status
+
+
 class TrackerAPI:
-    def __init__(self, base_url, token, org_id=None, queue=None):
+    def __init__(self, base_url, token, org_id=None, queue=None, coalesce_endpoints=None):
         self.base_url = base_url.rstrip('/')
         self.token = token
         self.org_id = org_id
@@ -16,6 +67,23 @@ class TrackerAPI:
         # Store sessions per event loop to avoid cross-loop errors
         self._sessions = {}
         self._connector = None
+        # Single-flight: identical in-flight reads of these endpoints share
+        # one underlying request and its parsed result.
+        if coalesce_endpoints is None:
+            coalesce_endpoints = Config.TRACKER_COALESCE_ENDPOINTS
+        self.coalesce_endpoints = set(coalesce_endpoints)
+        self._inflight = {}
+        self._flight_calls = Counter()
+        self._coalesced_calls = Counter()
+        # Separate buckets so that e.g. album uploads can't starve lookups
+        self.limiters = {
+            "read": TokenBucket("read", Config.TRACKER_READ_RPS),
+            "write": TokenBucket("write", Config.TRACKER_WRITE_RPS),
+            "upload": TokenBucket("upload", Config.TRACKER_UPLOAD_RPS),
+        }
+        # Phase timings of every request made through our sessions,
+        # including attachment downloads done by the webhook server
+        self.timings = RequestTimings()
 
     async def get_session(self):
         """Return an ``aiohttp`` session bound to the current event loop."""
@@ -27,7 +95,11 @@ class TrackerAPI:
                 self._connector = aiohttp.TCPConnector(
                     limit=Config.TRACKER_POOL_LIMIT
                 )
-            session = aiohttp.ClientSession(timeout=timeout, connector=self._connector)
+            session = aiohttp.ClientSession(
+                timeout=timeout,
+                connector=self._connector,
+                trace_configs=[self.timings.trace_config()],
+            )
             self._sessions[loop] = session
         return session
 
@@ -41,6 +113,80 @@ class TrackerAPI:
             await self._connector.close()
         self._connector = None
 
+    @contextlib.asynccontextmanager
+    async def _request(self, kind, method, url, form_factory=None, **kwargs):
+        """Send a request through the ``kind`` rate limiter.
+
+        Responses with status 429 throttle the bucket and the request is
+        retried up to ``Config.TRACKER_MAX_RETRIES`` times; the last response
+        is yielded as is.  ``form_factory`` rebuilds a multipart body for
+        every attempt because ``aiohttp.FormData`` can only be sent once.
+        """
+        bucket = self.limiters[kind]
+        session = await self.get_session()
+        send = getattr(session, method.lower())
+        for attempt in range(Config.TRACKER_MAX_RETRIES + 1):
+            await bucket.acquire()
+            if form_factory is not None:
+                kwargs["data"] = form_factory()
+            async with send(url, **kwargs) as resp:
+                if resp.status == 429 and attempt < Config.TRACKER_MAX_RETRIES:
+                    bucket.throttle(parse_retry_after(resp.headers.get("Retry-After")))
+                    continue
+                if resp.status != 429:
+                    bucket.succeed()
+                yield resp
+                return
+
+    def rate_limit_stats(self):
+        """Return current rate and 429 counters of every bucket."""
+        return {kind: bucket.stats() for kind, bucket in self.limiters.items()}
+
+    async def _single_flight(self, endpoint, key, fetch):
+        """Run ``fetch`` once for identical concurrent requests.
+
+        Callers arriving while a request with the same ``key`` is in flight
+        await the same task and receive the same parsed object, so they must
+        treat it as read-only.  Cancelling one caller does not cancel the
+        request for the others.
+        """
+        if endpoint not in self.coalesce_endpoints:
+            return await fetch()
+        self._flight_calls[endpoint] += 1
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, endpoint, *key)
+        task = self._inflight.get(flight_key)
+        if task is None:
+            task = loop.create_task(fetch())
+            self._inflight[flight_key] = task
+            task.add_done_callback(
+                lambda t: self._flight_done(flight_key, t)
+            )
+        else:
+            self._coalesced_calls[endpoint] += 1
+        return await asyncio.shield(task)
+
+    def _flight_done(self, flight_key, task):
+        if self._inflight.get(flight_key) is task:
+            del self._inflight[flight_key]
+        # Mark the exception as retrieved in case every waiter was cancelled.
+        if not task.cancelled():
+            task.exception()
+
+    def coalesce_stats(self):
+        """Return per-endpoint counters of single-flight calls.
+
+        ``calls`` counts every coalescable request, ``coalesced`` those that
+        reused an in-flight request instead of hitting Tracker.
+        """
+        return {
+            endpoint: {
+                "calls": self._flight_calls[endpoint],
+                "coalesced": self._coalesced_calls[endpoint],
+            }
+            for endpoint in self._flight_calls
+        }
+
     def _get_headers(self):
         headers = {
             "Authorization": f"OAuth {self.token}",
@@ -54,7 +200,13 @@ class TrackerAPI:
         """Return headers for Tracker API requests."""
         return self._get_headers()
 
-    async def create_issue(self, title, description, extra_fields=None):
+    async def create_issue(self, title, description, extra_fields=None, unique=None):
+        """Create an issue and return it.
+
+        ``unique`` is an idempotency key stored in the issue's ``unique``
+        field: Tracker refuses a second issue with the same value (409), and
+        the existing issue is returned instead.
+        """
         url = f"{self.base_url}/v2/issues/"
         data = {
             "summary": title,
@@ -64,25 +216,47 @@ class TrackerAPI:
             data["queue"] = self.queue
         if extra_fields:
             data.update(extra_fields)
-        session = await self.get_session()
+        if unique:
+            data["unique"] = unique
         headers = self.get_headers()
-        async with session.post(url, json=data, headers=headers) as resp:
+        async with self._request("write", "POST", url, data=json_codec.dumps(data), headers=headers) as resp:
+            if resp.status == 409 and unique:
+                logger.info(f"Issue with unique key {unique} already exists")
+                existing = await self.find_issue_by_unique(unique)
+                if existing:
+                    return existing
             if resp.status != 201:
                 text = await resp.text()
                 logger.error(f"Failed to create issue: {resp.status} {text}")
                 raise Exception(f"Create issue failed: {resp.status} {text}")
-            return await resp.json()
+            return await resp.json(loads=json_codec.loads)
 
-    async def get_issue_details(self, issue_key):
-        url = f"{self.base_url}/v2/issues/{issue_key}"
-        session = await self.get_session()
+    async def find_issue_by_unique(self, unique):
+        """Return the issue created with the ``unique`` key, or ``None``."""
+        url = f"{self.base_url}/v2/issues/_search"
+        query = {"filter": {"unique": unique}}
         headers = self.get_headers()
-        async with session.get(url, headers=headers) as resp:
+        async with self._request("read", "POST", url, data=json_codec.dumps(query), headers=headers) as resp:
             if resp.status != 200:
                 text = await resp.text()
-                logger.error(f"Failed to get issue details: {resp.status} {text}")
-                raise Exception(f"Get issue failed: {resp.status} {text}")
-            return await resp.json()
+                logger.error(f"Failed to find issue by unique key: {resp.status} {text}")
+                raise Exception(f"Search issues failed: {resp.status} {text}")
+            issues = await resp.json(loads=json_codec.loads)
+        return issues[0] if issues else None
+
+    async def get_issue_details(self, issue_key):
+        url = f"{self.base_url}/v2/issues/{issue_key}"
+
+        async def fetch():
+            headers = self.get_headers()
+            async with self._request("read", "GET", url, headers=headers) as resp:
+                if resp.status != 200:
+                    text = await resp.text()
+                    logger.error(f"Failed to get issue details: {resp.status} {text}")
+                    raise Exception(f"Get issue failed: {resp.status} {text}")
+                return await resp.json(loads=json_codec.loads)
+
+        return await self._single_flight("issue", ("GET", url), fetch)
 
     async def get_issue(self, issue_key):
         """Fetch issue information."""
@@ -98,18 +272,21 @@ class TrackerAPI:
         """Return display name of the comment author."""
         comment_id = self._normalize_comment_id(comment_id)
         url = f"{self.base_url}/v2/issues/{issue_key}/comments/{comment_id}"
-        session = await self.get_session()
-        headers = self.get_headers()
-        async with session.get(url, headers=headers) as resp:
-            if resp.status != 200:
-                text = await resp.text()
-                logger.error(
-                    f"Failed to get comment author: {resp.status} {text}"
-                )
-                raise Exception(
-                    f"Get comment author failed: {resp.status} {text}"
-                )
-            comment = await resp.json()
+
+        async def fetch():
+            headers = self.get_headers()
+            async with self._request("read", "GET", url, headers=headers) as resp:
+                if resp.status != 200:
+                    text = await resp.text()
+                    logger.error(
+                        f"Failed to get comment author: {resp.status} {text}"
+                    )
+                    raise Exception(
+                        f"Get comment author failed: {resp.status} {text}"
+                    )
+                return await resp.json(loads=json_codec.loads)
+
+        comment = await self._single_flight("comment", ("GET", url), fetch)
         author_info = comment.get("createdBy") or comment.get("author") or {}
         if isinstance(author_info, dict):
             return author_info.get("display") or author_info.get("login")
@@ -121,18 +298,21 @@ class TrackerAPI:
         url = (
             f"{self.base_url}/v2/issues/{issue_key}/comments/{comment_id}?expand=attachments"
         )
-        session = await self.get_session()
-        headers = self.get_headers()
-        async with session.get(url, headers=headers) as resp:
-            if resp.status != 200:
-                text = await resp.text()
-                logger.error(
-                    f"Failed to get comment attachments: {resp.status} {text}"
-                )
-                raise Exception(
-                    f"Get attachments failed: {resp.status} {text}"
-                )
-            comment = await resp.json()
+
+        async def fetch():
+            headers = self.get_headers()
+            async with self._request("read", "GET", url, headers=headers) as resp:
+                if resp.status != 200:
+                    text = await resp.text()
+                    logger.error(
+                        f"Failed to get comment attachments: {resp.status} {text}"
+                    )
+                    raise Exception(
+                        f"Get attachments failed: {resp.status} {text}"
+                    )
+                return await resp.json(loads=json_codec.loads)
+
+        comment = await self._single_flight("comment", ("GET", url), fetch)
         attachments = []
         for att in comment.get("attachments", []):
             content_url = None
@@ -162,36 +342,77 @@ class TrackerAPI:
                 "telegramId": str(telegram_id),
             }
         }
-        session = await self.get_session()
+
+        async def fetch():
+            headers = self.get_headers()
+            async with self._request("read", "POST", url, data=json_codec.dumps(query), headers=headers) as resp:
+                if resp.status != 200:
+                    text = await resp.text()
+                    logger.error(f"Failed to search issues: {resp.status} {text}")
+                    raise Exception(f"Search issues failed: {resp.status} {text}")
+                return await resp.json(loads=json_codec.loads)
+
+        # The search is read-only, so identical concurrent searches are shared.
+        issues = await self._single_flight(
+            "search", ("POST", url, self.queue, str(telegram_id)), fetch
+        )
+
+        # Фильтруем закрытые, отменённые и завершённые задачи вручную
+        return [issue for issue in issues if not is_closed_status(issue.get("status"))]
+
+    async def search_issues_updated_since(self, since=None, per_page=100):
+        """Return the first ``per_page`` queue issues updated at or after ``since``.
+
+        Issues are ordered by ``updatedAt`` ascending, so the last item is
+        the newest one.  ``since`` is a Tracker timestamp string; with
+        ``None`` the whole queue is listed.  Use
+        :meth:`iter_issues_updated_since` to read all of them.
+        """
+        url = f"{self.base_url}/v2/issues/_search?perPage={per_page}"
+        query = {"filter": {"queue": self.queue}, "order": "+updatedAt"}
+        if since:
+            query["filter"]["updatedAt"] = {"from": since}
         headers = self.get_headers()
-        async with session.post(url, json=query, headers=headers) as resp:
+        async with self._request("read", "POST", url, data=json_codec.dumps(query), headers=headers) as resp:
             if resp.status != 200:
                 text = await resp.text()
-                logger.error(f"Failed to search issues: {resp.status} {text}")
-                raise Exception(f"Search issues failed: {resp.status} {text}")
-            issues = await resp.json()
-
-        # Фильтруем закрытые, отменённые и завершённые задачи вручную
-        filtered = []
-        for issue in issues:
-            status = issue.get("status") or {}
-            if isinstance(status, dict):
-                key = str(status.get("key", "")).lower()
-                name = str(status.get("name", "")).lower()
-            else:
-                key = str(status).lower()
-                name = ""
-
-            skip = False
-            if any(w in key for w in ("closed", "canceled", "cancelled", "done")):
-                skip = True
-            if any(substr in name for substr in ("заверш", "отмен")):
-                skip = True
-
-            if not skip:
-                filtered.append(issue)
-
-        return filtered
+                logger.error(f"Failed to search updated issues: {resp.status} {text}")
+                raise Exception(f"Search updated issues failed: {resp.status} {text}")
+            return await resp.json(loads=json_codec.loads)
+
+    async def iter_issues_updated_since(self, since=None, per_page=100):
+        """Yield pages of queue issues updated at or after ``since``.
+
+        Pages are read by keyset rather than by page number: every request
+        starts at the newest ``updatedAt`` seen so far (inclusive) and
+        issues already yielded with that timestamp are dropped.  An issue
+        changing during the pass therefore moves to a later request instead
+        of shifting another issue out of the result.  When a full page
+        shares one timestamp, the page size is doubled until the timestamp
+        changes.
+        """
+        cursor = since
+        boundary: set[str] = set()
+        size = per_page
+        while True:
+            issues = await self.search_issues_updated_since(cursor, per_page=size)
+            fresh = [
+                issue for issue in issues
+                if not (issue.get("updatedAt") == cursor and issue["key"] in boundary)
+            ]
+            if fresh:
+                yield fresh
+            if len(issues) < size:
+                return
+            last = issues[-1].get("updatedAt") or ""
+            if last == cursor:
+                # Every issue of the page sits on the boundary timestamp
+                boundary.update(issue["key"] for issue in issues)
+                size *= 2
+                continue
+            cursor = last
+            boundary = {issue["key"] for issue in issues if issue.get("updatedAt") == last}
+            size = per_page
 
     async def add_comment(
         self,
@@ -229,87 +450,116 @@ class TrackerAPI:
         if maillist_summonees:
             data["maillistSummonees"] = maillist_summonees
 
-        session = await self.get_session()
         headers = self.get_headers()
-        async with session.post(url, json=data, headers=headers) as resp:
+        async with self._request("write", "POST", url, data=json_codec.dumps(data), headers=headers) as resp:
             if resp.status != 201:
                 text = await resp.text()
                 logger.error(f"Failed to add comment: {resp.status} {text}")
                 raise Exception(f"Add comment failed: {resp.status} {text}")
-            return await resp.json()
+            return await resp.json(loads=json_codec.loads)
 
-    async def upload_file(self, file_path, orig_filename=None):
+    async def upload_file(self, file_path, orig_filename=None, content=None):
         """Uploads a file to Tracker and returns its attachment ID.
 
         Parameters
         ----------
-        file_path : str
+        file_path : str | None
             Path to a temporary file to read from.
         orig_filename : str | None
             Original filename to pass to Tracker. If ``None`` the basename of
             ``file_path`` is used.
+        content : bytes | None
+            File content already in memory; ``file_path`` is then not read
+            and may be ``None`` if ``orig_filename`` is given.
         """
         url = f"{self.base_url}/v2/attachments"
-        session = await self.get_session()
         headers = self.get_headers()
         headers.pop("Content-Type", None)
+        filename = orig_filename or os.path.basename(file_path)
+
+        with (open(file_path, "rb") if content is None else io.BytesIO(content)) as f:
+            mime_type, _ = mimetypes.guess_type(filename)
+
+            def build_form():
+                # A retried upload has to send the file from the beginning
+                f.seek(0)
+                form = aiohttp.FormData()
+                form.add_field(
+                    "file",
+                    f,
+                    filename=filename,
+                    content_type=mime_type or "application/octet-stream",
+                )
+                return form
 
-        with open(file_path, "rb") as f:
-            form = aiohttp.FormData()
-            mime_type, _ = mimetypes.guess_type(file_path)
-            form.add_field(
-                "file",
-                f,
-                filename=orig_filename or os.path.basename(file_path),
-                content_type=mime_type or "application/octet-stream",
-            )
-
-            async with session.post(url, data=form, headers=headers) as resp:
+            async with self._request(
+                "upload", "POST", url, form_factory=build_form, headers=headers
+            ) as resp:
                 if resp.status != 201:
                     text = await resp.text()
                     logger.error(f"Failed to upload file: {resp.status} {text}")
                     raise Exception(f"Upload file failed: {resp.status} {text}")
 
-                json_resp = await resp.json()
+                json_resp = await resp.json(loads=json_codec.loads)
                 return json_resp.get("id")
 
     async def add_attachment_comment(self, issue_key, file_id):
         url = f"{self.base_url}/v2/issues/{issue_key}/comments"
         data = {
-            "text": "Вложение",
+            "text": ATTACHMENT_COMMENT_TEXT,
             "attachments": [file_id]
         }
-        session = await self.get_session()
         headers = self.get_headers()
-        async with session.post(url, json=data, headers=headers) as resp:
+        async with self._request("write", "POST", url, data=json_codec.dumps(data), headers=headers) as resp:
             if resp.status != 201:
                 text = await resp.text()
                 logger.error(f"Failed to add attachment comment: {resp.status} {text}")
                 raise Exception(f"Add attachment comment failed: {resp.status} {text}")
-            return await resp.json()
+            return await resp.json(loads=json_codec.loads)
 
-    async def get_issue_comments(self, issue_key, expand_attachments=False):
-        url = f"{self.base_url}/v2/issues/{issue_key}/comments"
+    async def get_issue_comments(self, issue_key, expand_attachments=False, per_page=100):
+        """Return all comments of an issue, oldest first.
+
+        Tracker returns comments page by page; the next page starts after
+        the ``id`` of the last comment received.
+        """
+        url = f"{self.base_url}/v2/issues/{issue_key}/comments?perPage={per_page}"
         if expand_attachments:
-            url += "?expand=attachments"
-        session = await self.get_session()
-        headers = self.get_headers()
-        async with session.get(url, headers=headers) as resp:
-            if resp.status != 200:
-                text = await resp.text()
-                logger.error(f"Failed to get comments: {resp.status} {text}")
-                raise Exception(f"Get comments failed: {resp.status} {text}")
-            return await resp.json()
+            url += "&expand=attachments"
+
+        async def fetch_page(after):
+            page_url = url if after is None else f"{url}&id={after}"
+            headers = self.get_headers()
+            async with self._request("read", "GET", page_url, headers=headers) as resp:
+                if resp.status != 200:
+                    text = await resp.text()
+                    logger.error(f"Failed to get comments: {resp.status} {text}")
+                    raise Exception(f"Get comments failed: {resp.status} {text}")
+                return await resp.json(loads=json_codec.loads)
+
+        async def fetch():
+            comments = []
+            after = None
+            while True:
+                page = await fetch_page(after)
+                comments.extend(page)
+                if len(page) < per_page or not page:
+                    return comments
+                after = page[-1]["id"]
+
+        return await self._single_flight("comments", ("GET", url), fetch)
 
     async def get_file_content(self, file_self_url):
-        session = await self.get_session()
-        headers = self.get_headers()
-        async with session.get(file_self_url, headers=headers) as resp:
-            if resp.status != 200:
-                text = await resp.text()
-                logger.error(f"Failed to get file content: {resp.status} {text}")
-                raise Exception(f"Get file content failed: {resp.status} {text}")
-            return await resp.read()
+        async def fetch():
+            headers = self.get_headers()
+            async with self._request("read", "GET", file_self_url, headers=headers) as resp:
+                if resp.status != 200:
+                    text = await resp.text()
+                    logger.error(f"Failed to get file content: {resp.status} {text}")
+                    raise Exception(f"Get file content failed: {resp.status} {text}")
+                return await resp.read()
+
+        return await self._single_flight("file", ("GET", file_self_url), fetch)
 
     async def __aenter__(self):
         return self
@@ -0,0 +1,205 @@
+import logging
+import re
+import time
+from collections import deque
+
+import aiohttp
+
+from config import Config
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+# Path segments kept verbatim when building an endpoint label; everything
+# else (issue keys, ids, file names) is replaced by a placeholder so the
+# number of distinct endpoints stays small.
+_KNOWN_SEGMENTS = {
+    "v2", "v3", "issues", "_search", "comments", "attachments",
+    "download", "thumbnail", "expand",
+}
+_ISSUE_KEY_RE = re.compile(r"^[A-Z][A-Z0-9_]*-\d+$")
+
+# Phases recorded for every request, in seconds
+PHASES = ("queue", "dns", "connect", "send", "wait", "transfer", "total")
+
+
+def endpoint_label(method, url) -> str:
+    """Return a low-cardinality label like ``GET /v2/issues/{key}``."""
+    parts = []
+    for segment in url.path.split("/"):
+        if not segment:
+            continue
+        if segment in _KNOWN_SEGMENTS:
+            parts.append(segment)
+        elif _ISSUE_KEY_RE.match(segment):
+            parts.append("{key}")
+        else:
+            parts.append("{id}")
+    return f"{method} /{'/'.join(parts)}"
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class RequestTimings:
+    """Per-phase timings of HTTP requests collected through aiohttp tracing.
+
+    Records are kept in a bounded ``deque``: appends are atomic, so neither
+    the trace callbacks nor readers need a lock, and old records fall off
+    automatically.  Phases:
+
+    * ``queue`` – waiting for a free connection in the pool;
+    * ``dns`` – host resolution;
+    * ``connect`` – TCP connect including the TLS handshake (aiohttp does
+      not report them separately);
+    * ``send`` – from the request start to the headers being written;
+    * ``wait`` – from sending the request to the response headers (TTFB);
+    * ``transfer`` – reading the response body;
+    * ``total`` – the whole request.
+    """
+
+    def __init__(self, size=None, slow_threshold=None):
+        self._records = deque(maxlen=size or Config.TRACKER_TRACE_BUFFER)
+        self.slow_threshold = (
+            Config.TRACKER_SLOW_REQUEST if slow_threshold is None else slow_threshold
+        )
+
+    def records(self):
+        """Return a snapshot of the stored records, oldest first."""
+        return list(self._records)
+
+    def clear(self):
+        self._records.clear()
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Return a ``TraceConfig`` feeding this buffer."""
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_connection_queued_start.append(self._on_queued_start)
+        trace.on_connection_queued_end.append(self._on_queued_end)
+        trace.on_dns_resolvehost_start.append(self._on_dns_start)
+        trace.on_dns_resolvehost_end.append(self._on_dns_end)
+        trace.on_connection_create_start.append(self._on_connect_start)
+        trace.on_connection_create_end.append(self._on_connect_end)
+        trace.on_connection_reuseconn.append(self._on_reuseconn)
+        trace.on_request_headers_sent.append(self._on_headers_sent)
+        trace.on_request_end.append(self._on_request_end)
+        trace.on_response_chunk_received.append(self._on_body_received)
+        trace.on_request_exception.append(self._on_request_exception)
+        return trace
+
+    # ───────────────────────── trace callbacks ─────────────────────────
+
+    async def _on_request_start(self, session, ctx, params):
+        ctx.start = time.perf_counter()
+        ctx.record = {
+            "endpoint": endpoint_label(params.method, params.url),
+            "status": None,
+            "reused": False,
+            **{phase: 0.0 for phase in PHASES},
+        }
+
+    async def _on_queued_start(self, session, ctx, params):
+        ctx.queued = time.perf_counter()
+
+    async def _on_queued_end(self, session, ctx, params):
+        ctx.record["queue"] += time.perf_counter() - ctx.queued
+
+    async def _on_dns_start(self, session, ctx, params):
+        ctx.dns = time.perf_counter()
+
+    async def _on_dns_end(self, session, ctx, params):
+        ctx.record["dns"] += time.perf_counter() - ctx.dns
+
+    async def _on_connect_start(self, session, ctx, params):
+        ctx.connect = time.perf_counter()
+
+    async def _on_connect_end(self, session, ctx, params):
+        # DNS resolution happens inside connection creation
+        ctx.record["connect"] += time.perf_counter() - ctx.connect - ctx.record["dns"]
+
+    async def _on_reuseconn(self, session, ctx, params):
+        ctx.record["reused"] = True
+
+    async def _on_headers_sent(self, session, ctx, params):
+        ctx.sent = time.perf_counter()
+        ctx.record["send"] = ctx.sent - ctx.start
+
+    async def _on_request_end(self, session, ctx, params):
+        ctx.headers_received = time.perf_counter()
+        record = ctx.record
+        record["status"] = params.response.status
+        record["wait"] = ctx.headers_received - getattr(ctx, "sent", ctx.start)
+        record["total"] = ctx.headers_received - ctx.start
+        self._records.append(record)
+        # The body may never be read (e.g. status-only checks), so a request
+        # that is already slow is logged here
+        self._check_slow(ctx)
+
+    async def _on_body_received(self, session, ctx, params):
+        # aiohttp reports the chunk once the whole body has been read
+        now = time.perf_counter()
+        record = ctx.record
+        record["transfer"] = now - ctx.headers_received
+        record["total"] = now - ctx.start
+        self._check_slow(ctx)
+
+    async def _on_request_exception(self, session, ctx, params):
+        record = ctx.record
+        record["status"] = type(params.exception).__name__
+        record["total"] = time.perf_counter() - ctx.start
+        self._records.append(record)
+        self._check_slow(ctx)
+
+    def _check_slow(self, ctx):
+        """Log the request once, the first time it exceeds the threshold."""
+        if getattr(ctx, "slow_logged", False):
+            return
+        if self.slow_threshold and ctx.record["total"] >= self.slow_threshold:
+            ctx.slow_logged = True
+            self._log_slow(ctx.record)
+
+    def _log_slow(self, record):
+        logger.warning(
+            "Slow Tracker request: %s",
+            json_codec.dumps(
+                {k: round(v, 4) if isinstance(v, float) else v for k, v in record.items()}
+            ).decode(),
+        )
+
+    # ──────────────────────────── summary ──────────────────────────────
+
+    def summary(self):
+        """Return per-endpoint request count, reuse ratio and phase stats.
+
+        Every phase is reported as ``{"avg", "p50", "p95", "max"}`` in
+        milliseconds.
+        """
+        by_endpoint = {}
+        for record in self.records():
+            by_endpoint.setdefault(record["endpoint"], []).append(record)
+
+        result = {}
+        for endpoint, records in by_endpoint.items():
+            phases = {}
+            for phase in PHASES:
+                values = [r[phase] * 1000 for r in records]
+                phases[phase] = {
+                    "avg": sum(values) / len(values),
+                    "p50": _percentile(values, 0.5),
+                    "p95": _percentile(values, 0.95),
+                    "max": max(values),
+                }
+            result[endpoint] = {
+                "count": len(records),
+                "reused": sum(1 for r in records if r["reused"]) / len(records),
+                "errors": sum(
+                    1 for r in records
+                    if not isinstance(r["status"], int) or r["status"] >= 400
+                ),
+                "phases": phases,
+            }
+        return result
@@ -9,7 +9,14 @@ from telegram.error import BadRequest
 from messages import WEBHOOK_COMMENT, WEBHOOK_STATUS
 from telegram.ext import Application
 from config import Config
-from tracker_client import TrackerAPI
+from tracker_client import (
+    TrackerAPI,
+    is_closed_status,
+    parse_tracker_timestamp,
+    status_display,
+    tracker_timestamp,
+)
+import json_codec
 import os
 import uuid
 
@@ -79,165 +86,208 @@ def sanitize_comment_text(text: str) -> str:
     text = strip_signature(text)
     return text
 
-def setup_webhook_routes(app, application: Application, tracker: TrackerAPI):
-    """Настраивает маршруты вебхуков"""
-    @router.post("/trackers/comment")
-    async def receive_webhook(
-        request: Request,
-        credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
-    ):
-        if credentials.credentials != Config.API_TOKEN:
-            raise HTTPException(status_code=403, detail="Invalid Bearer token")
-        
-        data = await request.json()
-        logging.info(f"📥 Webhook получен: {data}")
-
-        if data.get("event") != "commentCreated":
-            return {"status": "ignored"}
-
-        issue = data.get("issue") or {}
-        comment_data = data.get("comment", {})
-        issue_key = issue.get("key")
-        comment_id = comment_data.get("id")
-        summary = issue.get("summary", "Нет темы")
-
-        prune_processed_ids()
-
-        if comment_id and str(comment_id) in processed_comment_ids:
-            logging.info("Duplicate comment %s ignored", comment_id)
-            return {"status": "ignored"}
-        if comment_id:
-            processed_comment_ids[str(comment_id)] = time.time()
-
-        telegram_id = issue.get("telegramId")
-
-        comment_author = comment_data.get("createdBy", {}).get("display")
-        if not comment_author and comment_id:
-            try:
-                comment_author = await tracker.get_comment_author(issue_key, comment_id)
-            except Exception as exc:
-                logging.error(f"Не удалось получить автора комментария: {exc}")
-                comment_author = "неизвестен"
-
-        issue_info = None
-        if not telegram_id:
-            try:
-                issue_info = await tracker.get_issue(issue_key)
-            except Exception as exc:
-                logging.error(f"Не удалось получить информацию о задаче: {exc}")
-                return {"status": "error"}
-            telegram_id = issue_info.get("telegramId")
-        if not telegram_id:
-            logging.warning(f"❌ Не найден telegramId для задачи {issue_key}")
-            return {"status": "ignored"}
-
-        chat_id = int(telegram_id)
-        attachments = []
-        if comment_id:
-            try:
-                attachments = await tracker.get_attachments_for_comment(issue_key, comment_id)
-            except Exception as exc:
-                logging.error(f"Не удалось получить вложения комментария: {exc}")
-
-        media_photos = []
-        documents = []
-
-        session = await tracker.get_session()
-
-        async def download_attachment(att):
-            content_url = att.get("content_url")
-            filename = att.get("filename")
-            if not content_url or not filename:
-                logging.warning("Некорректные данные вложения: %s", att)
-                return None
-            async with session.get(content_url, headers=tracker.get_headers()) as resp:
-                if resp.status != 200:
-                    logging.error(f"Ошибка загрузки файла {filename}: {resp.status}")
-                    return None
-                file_bytes = await resp.read()
-                is_large = len(file_bytes) > 10 * 1024 * 1024
-
-            safe_name = os.path.basename(filename)
-            unique_name = f"{uuid.uuid4().hex}_{safe_name}"
-            file_path = os.path.join("/tmp", unique_name)
-            with open(file_path, "wb") as f:
-                f.write(file_bytes)
-
-            file_handle = open(file_path, "rb")
-            telegram_file = InputFile(file_handle, filename=safe_name)
-            if (
-                filename.lower().endswith((".jpg", ".png", ".jpeg"))
-                and not is_large
-            ):
-                return ("photo", telegram_file, file_path, file_handle)
-            return ("document", telegram_file, file_path, file_handle)
-
-        download_results = await asyncio.gather(*(download_attachment(att) for att in attachments))
-        for result in download_results:
-            if not result:
-                continue
-            kind, tg_file, file_path, handle = result
-            if kind == "photo":
-                media_photos.append((tg_file, file_path, handle))
-            else:
-                documents.append((tg_file, file_path, handle))
-        
-        clean_text = sanitize_comment_text(comment_data.get("text", ""))
-        message_text = WEBHOOK_COMMENT.format(
-            issue_key=issue_key,
+async def update_issue_mirror(
+    db, issue_key, telegram_id, summary=None, status=None, updated_at=None
+):
+    """Refresh the local mirror row of an issue from webhook data.
+
+    ``updated_at`` is the Tracker timestamp of the change, if known."""
+    if db is None or not issue_key:
+        return
+    try:
+        await db.upsert_issue(
+            issue_key,
             summary=summary,
-            text=clean_text,
-            author=comment_author,
+            status=status_display(status) if status else None,
+            closed=is_closed_status(status) if status else None,
+            user_id=int(telegram_id) if telegram_id else None,
+            updated_at=parse_tracker_timestamp(updated_at),
         )
-
-        reply_markup = InlineKeyboardMarkup(
-            [[InlineKeyboardButton("💬 Ответить", callback_data=f"issue_{issue_key}")]]
+    except Exception as exc:
+        logging.error("Не удалось обновить задачу %s в БД: %s", issue_key, exc)
+
+
+# sync_state key of the creation time of the last delivered comment
+COMMENT_CURSOR_KEY = "comments_created_at"
+# sync_state keys of comments whose delivery failed: prefix + comment id,
+# the value is the comment's creation time.  The cursor may pass them, the
+# startup catch-up replays them separately.
+FAILED_COMMENT_PREFIX = "comment_failed:"
+
+
+async def remember_processed_comment(db, created_at=None):
+    """Advance the cursor used by the startup catch-up of missed comments."""
+    if db is None:
+        return
+    try:
+        await db.advance_sync_state(COMMENT_CURSOR_KEY, created_at or tracker_timestamp())
+    except Exception as exc:
+        logging.error("Не удалось сохранить курсор комментариев: %s", exc)
+
+
+async def remember_failed_comment(db, comment_id, created_at=None):
+    """Record an undelivered comment for the next startup catch-up."""
+    if db is None or not comment_id:
+        return
+    try:
+        await db.set_sync_state(
+            f"{FAILED_COMMENT_PREFIX}{comment_id}", created_at or tracker_timestamp()
         )
+    except Exception as exc:
+        logging.error("Не удалось сохранить недоставленный комментарий %s: %s", comment_id, exc)
+
+
+async def process_comment_event(
+    application: Application, tracker: TrackerAPI, data: dict, db=None, advance_cursor=True
+):
+    """Deliver a ``commentCreated`` event to the issue author in Telegram.
+
+    Used by the webhook route and by the startup catch-up; duplicates are
+    dropped via ``processed_comment_ids``.  The catch-up cursor is advanced
+    only after a successful delivery, unless ``advance_cursor`` is false
+    (the catch-up moves it itself).  A failed delivery returns
+    ``{"status": "error"}`` and is recorded under ``FAILED_COMMENT_PREFIX``,
+    so a later comment moving the cursor does not hide it from the catch-up.
+    """
+    if data.get("event") != "commentCreated":
+        return {"status": "ignored"}
+
+    issue = data.get("issue") or {}
+    comment_data = data.get("comment", {})
+    issue_key = issue.get("key")
+    comment_id = comment_data.get("id")
+    summary = issue.get("summary", "Нет темы")
+
+    prune_processed_ids()
+
+    if comment_id and str(comment_id) in processed_comment_ids:
+        logging.info("Duplicate comment %s ignored", comment_id)
+        return {"status": "ignored"}
+    if comment_id:
+        processed_comment_ids[str(comment_id)] = time.time()
+
+    telegram_id = issue.get("telegramId")
+
+    comment_author = comment_data.get("createdBy", {}).get("display")
+    if not comment_author and comment_id:
+        try:
+            comment_author = await tracker.get_comment_author(issue_key, comment_id)
+        except Exception as exc:
+            logging.error(f"Не удалось получить автора комментария: {exc}")
+            comment_author = "неизвестен"
 
+    issue_info = None
+    if not telegram_id:
         try:
-            if media_photos:
-                tg_photos = [InputMediaPhoto(media=file) for file, _, _ in media_photos]
-                try:
-                    if len(tg_photos) > 1:
-                        await application.bot.send_media_group(chat_id, tg_photos)
-                    else:
-                        await application.bot.send_photo(chat_id, tg_photos[0].media)
-                except BadRequest as exc:
-
-                    message = getattr(exc, "message", str(exc)).lower()
-                    if "image_process_failed" in message:
-                        logging.warning(
-                            "Image failed to process, sending as documents: %s",
-                            exc,
-                        )
-
-                    if "Image_process_failed" in str(exc):
-                        logging.warning(
-                            "Image failed to process, sending as documents: %s",
-                            exc,
-                        )
-
-                        for doc, path, handle in media_photos:
-                            try:
-                                await application.bot.send_document(chat_id, doc)
-                            finally:
-                                if not handle.closed:
-                                    handle.close()
-                                try:
-                                    os.remove(path)
-                                except OSError as exc:
-                                    logging.error(
-                                        "Не удалось удалить временный файл %s: %s",
-                                        path,
-                                        exc,
-                                    )
-                    else:
-                        raise
-                finally:
-                    for _, path, handle in media_photos:
-                        if not handle.closed:
-                            handle.close()
-                        if os.path.exists(path):
+            issue_info = await tracker.get_issue(issue_key)
+        except Exception as exc:
+            logging.error(f"Не удалось получить информацию о задаче: {exc}")
+            if comment_id:
+                processed_comment_ids.pop(str(comment_id), None)
+            await remember_failed_comment(db, comment_id, comment_data.get("createdAt"))
+            return {"status": "error"}
+        telegram_id = issue_info.get("telegramId")
+    if not telegram_id:
+        logging.warning(f"❌ Не найден telegramId для задачи {issue_key}")
+        return {"status": "ignored"}
+
+    chat_id = int(telegram_id)
+    # A new comment moves the issue's updatedAt in Tracker as well
+    await update_issue_mirror(
+        db, issue_key, telegram_id, issue.get("summary"), issue.get("status"),
+        issue.get("updatedAt") or comment_data.get("createdAt"),
+    )
+    attachments = []
+    if comment_id:
+        try:
+            attachments = await tracker.get_attachments_for_comment(issue_key, comment_id)
+        except Exception as exc:
+            logging.error(f"Не удалось получить вложения комментария: {exc}")
+
+    media_photos = []
+    documents = []
+
+    session = await tracker.get_session()
+
+    async def download_attachment(att):
+        content_url = att.get("content_url")
+        filename = att.get("filename")
+        if not content_url or not filename:
+            logging.warning("Некорректные данные вложения: %s", att)
+            return None
+        async with session.get(content_url, headers=tracker.get_headers()) as resp:
+            if resp.status != 200:
+                logging.error(f"Ошибка загрузки файла {filename}: {resp.status}")
+                return None
+            file_bytes = await resp.read()
+            is_large = len(file_bytes) > 10 * 1024 * 1024
+
+        safe_name = os.path.basename(filename)
+        unique_name = f"{uuid.uuid4().hex}_{safe_name}"
+        file_path = os.path.join("/tmp", unique_name)
+        with open(file_path, "wb") as f:
+            f.write(file_bytes)
+
+        file_handle = open(file_path, "rb")
+        telegram_file = InputFile(file_handle, filename=safe_name)
+        if (
+            filename.lower().endswith((".jpg", ".png", ".jpeg"))
+            and not is_large
+        ):
+            return ("photo", telegram_file, file_path, file_handle)
+        return ("document", telegram_file, file_path, file_handle)
+
+    download_results = await asyncio.gather(*(download_attachment(att) for att in attachments))
+    for result in download_results:
+        if not result:
+            continue
+        kind, tg_file, file_path, handle = result
+        if kind == "photo":
+            media_photos.append((tg_file, file_path, handle))
+        else:
+            documents.append((tg_file, file_path, handle))
+    
+    clean_text = sanitize_comment_text(comment_data.get("text", ""))
+    message_text = WEBHOOK_COMMENT.format(
+        issue_key=issue_key,
+        summary=summary,
+        text=clean_text,
+        author=comment_author,
+    )
+
+    reply_markup = InlineKeyboardMarkup(
+        [[InlineKeyboardButton("💬 Ответить", callback_data=f"issue_{issue_key}")]]
+    )
+
+    try:
+        if media_photos:
+            tg_photos = [InputMediaPhoto(media=file) for file, _, _ in media_photos]
+            try:
+                if len(tg_photos) > 1:
+                    await application.bot.send_media_group(chat_id, tg_photos)
+                else:
+                    await application.bot.send_photo(chat_id, tg_photos[0].media)
+            except BadRequest as exc:
+
+                message = getattr(exc, "message", str(exc)).lower()
+                if "image_process_failed" in message:
+                    logging.warning(
+                        "Image failed to process, sending as documents: %s",
+                        exc,
+                    )
+
+                if "Image_process_failed" in str(exc):
+                    logging.warning(
+                        "Image failed to process, sending as documents: %s",
+                        exc,
+                    )
+
+                    for doc, path, handle in media_photos:
+                        try:
+                            await application.bot.send_document(chat_id, doc)
+                        finally:
+                            if not handle.closed:
+                                handle.close()
                             try:
                                 os.remove(path)
                             except OSError as exc:
@@ -246,34 +296,72 @@ def setup_webhook_routes(app, application: Application, tracker: TrackerAPI):
                                     path,
                                     exc,
                                 )
-
-            for doc, path, handle in documents:
-                try:
-                    await application.bot.send_document(chat_id, doc)
-                finally:
+                else:
+                    raise
+            finally:
+                for _, path, handle in media_photos:
                     if not handle.closed:
                         handle.close()
-                    try:
-                        os.remove(path)
-                    except OSError as exc:
-                        logging.error(
-                            "Не удалось удалить временный файл %s: %s",
-                            path,
-                            exc,
-                        )
+                    if os.path.exists(path):
+                        try:
+                            os.remove(path)
+                        except OSError as exc:
+                            logging.error(
+                                "Не удалось удалить временный файл %s: %s",
+                                path,
+                                exc,
+                            )
+
+        for doc, path, handle in documents:
+            try:
+                await application.bot.send_document(chat_id, doc)
+            finally:
+                if not handle.closed:
+                    handle.close()
+                try:
+                    os.remove(path)
+                except OSError as exc:
+                    logging.error(
+                        "Не удалось удалить временный файл %s: %s",
+                        path,
+                        exc,
+                    )
+
+        await application.bot.send_message(
+            chat_id=chat_id,
+            text=message_text,
+            parse_mode="HTML",
+            reply_markup=reply_markup,
+        )
 
-            await application.bot.send_message(
-                chat_id=chat_id,
-                text=message_text,
-                parse_mode="HTML",
-                reply_markup=reply_markup,
-            )
+    except Exception as e:
+        logging.error(f"❌ Ошибка при отправке сообщений в Telegram: {e}")
+        # Комментарий не доставлен: разрешаем повторную доставку, курсор
+        # не сдвигаем и запоминаем комментарий для catch-up
+        if comment_id:
+            processed_comment_ids.pop(str(comment_id), None)
+        await remember_failed_comment(db, comment_id, comment_data.get("createdAt"))
+        return {"status": "error"}
 
-        except Exception as e:
-            logging.error(f"❌ Ошибка при отправке сообщений в Telegram: {e}")
+    if advance_cursor:
+        await remember_processed_comment(db, comment_data.get("createdAt"))
+    logging.info(f"✅ Комментарий отправлен в Telegram для задачи: {issue_key}")
+    return {"status": "ok"}
+
+
+def setup_webhook_routes(app, application: Application, tracker: TrackerAPI, db=None):
+    """Настраивает маршруты вебхуков"""
+    @router.post("/trackers/comment")
+    async def receive_webhook(
+        request: Request,
+        credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
+    ):
+        if credentials.credentials != Config.API_TOKEN:
+            raise HTTPException(status_code=403, detail="Invalid Bearer token")
         
-        logging.info(f"✅ Комментарий отправлен в Telegram для задачи: {issue_key}")
-        return {"status": "ok"}
+        data = json_codec.loads(await request.body())
+        logging.info(f"📥 Webhook получен: {data}")
+        return await process_comment_event(application, tracker, data, db)
 
     @router.post("/trackers/updateStatus")
     async def receive_status_webhook(
@@ -283,7 +371,7 @@ def setup_webhook_routes(app, application: Application, tracker: TrackerAPI):
         if credentials.credentials != Config.API_TOKEN:
             raise HTTPException(status_code=403, detail="Invalid Bearer token")
 
-        data = await request.json()
+        data = json_codec.loads(await request.body())
         logging.info(f"📥 Status webhook получен: {data}")
 
         if data.get("event") != "issueUpdated":
@@ -318,6 +406,10 @@ def setup_webhook_routes(app, application: Application, tracker: TrackerAPI):
             return {"status": "ignored"}
 
         chat_id = int(telegram_id)
+        await update_issue_mirror(
+            db, issue_key, telegram_id, issue.get("summary"), status_data or None,
+            issue.get("updatedAt"),
+        )
 
         message_text = WEBHOOK_STATUS.format(
             issue_key=issue_key,